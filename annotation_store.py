@@ -0,0 +1,256 @@
+import bisect
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from json_codec import load_json
+
+_STORE_MAGIC = b'ANNST1\0\0'
+# magic, source size, source mtime_ns, file count, row count, range count, name bytes
+_STORE_HEADER = struct.Struct('<8sqqqqqq')
+_NAME_SEPARATOR = '\0'
+
+
+def default_store_path(annotations_file: str) -> str:
+    """Where the binary copy of ``annotations_file`` is kept: next to it, ``.annidx`` suffix."""
+    return os.path.splitext(annotations_file)[0] + '.annidx'
+
+
+def _char_range_pairs(value: Any) -> List[Tuple[int, int]]:
+    """Char ranges of one map.json entry, in either annotation format.
+
+    data_prep writes ``{"char_ranges": [[start, end], ...]}`` and dataset_analyzer
+    ``[{"start": start, "end": end}, ...]``; validated pydantic models of both are accepted too.
+    """
+    if isinstance(value, Mapping):
+        value = value["char_ranges"]
+    elif hasattr(value, "char_ranges"):
+        value = value.char_ranges
+    pairs = []
+    for char_range in value:
+        if isinstance(char_range, Mapping):
+            pairs.append((int(char_range["start"]), int(char_range["end"])))
+        elif hasattr(char_range, "start"):
+            pairs.append((int(char_range.start), int(char_range.end)))
+        else:
+            start, end = char_range
+            pairs.append((int(start), int(end)))
+    return pairs
+
+
+class FileAnnotations:
+    """The annotations of one file (or a line range of it): sorted line numbers and their
+    char ranges as array slices of an ``AnnotationStore``. Cheap to pickle to workers.
+    """
+
+    def __init__(self, filename: str, lines: np.ndarray, range_offsets: np.ndarray, range_starts: np.ndarray, range_ends: np.ndarray):
+        self.filename = filename
+        self.lines = lines
+        self.range_offsets = range_offsets
+        self.range_starts = range_starts
+        self.range_ends = range_ends
+
+    @classmethod
+    def empty(cls, filename: str) -> 'FileAnnotations':
+        none = np.zeros(0, dtype=np.int32)
+        return cls(filename, none, np.zeros(1, dtype=np.int64), none, none)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __iter__(self) -> Iterator[Tuple[int, List[List[int]]]]:
+        """Yield ``(line, [[start, end], ...])`` in line order."""
+        offsets = self.range_offsets.tolist()
+        starts = self.range_starts.tolist()
+        ends = self.range_ends.tolist()
+        for row, line in enumerate(self.lines.tolist()):
+            yield line, [[starts[i], ends[i]] for i in range(offsets[row], offsets[row + 1])]
+
+    def to_dict(self) -> Dict[str, Dict[str, List[List[int]]]]:
+        """The map.json (data_prep) form: ``{"<line>": {"char_ranges": [[start, end], ...]}}``."""
+        return {str(line): {"char_ranges": char_ranges} for line, char_ranges in self}
+
+
+class AnnotationStore:
+    """map.json held as sorted columns instead of nested dicts and models.
+
+    Files are sorted by name and identified by position; ``file_offsets[i]:file_offsets[i + 1]``
+    are the rows of file ``i``, sorted by line number. Row ``r`` has line ``lines[r]`` and
+    char ranges ``range_starts``/``range_ends`` at ``range_offsets[r]:range_offsets[r + 1]``.
+    Lookups are a bisect over the file names plus a ``searchsorted`` for line ranges, and
+    the columns can be saved to a binary file that loads by memory mapping.
+    """
+
+    def __init__(
+        self,
+        filenames: List[str],
+        file_offsets: np.ndarray,
+        lines: np.ndarray,
+        range_offsets: np.ndarray,
+        range_starts: np.ndarray,
+        range_ends: np.ndarray
+    ):
+        self.filenames = filenames
+        self.file_offsets = file_offsets
+        self.lines = lines
+        self.range_offsets = range_offsets
+        self.range_starts = range_starts
+        self.range_ends = range_ends
+
+    @classmethod
+    def from_mapping(cls, annotations: Any) -> 'AnnotationStore':
+        """Build the store from parsed map.json data (either format) or an ``Annotations`` model."""
+        annotations = getattr(annotations, "annotations", annotations)
+        filenames = sorted(annotations)
+        file_offsets = array('q', [0])
+        lines = array('i')
+        range_offsets = array('q', [0])
+        range_starts = array('i')
+        range_ends = array('i')
+        for filename in filenames:
+            for line, pairs in sorted((int(line), _char_range_pairs(value)) for line, value in annotations[filename].items()):
+                lines.append(line)
+                for start, end in pairs:
+                    range_starts.append(start)
+                    range_ends.append(end)
+                range_offsets.append(len(range_starts))
+            file_offsets.append(len(lines))
+        return cls(
+            filenames,
+            np.frombuffer(file_offsets, dtype=np.int64),
+            np.frombuffer(lines, dtype=np.int32),
+            np.frombuffer(range_offsets, dtype=np.int64),
+            np.frombuffer(range_starts, dtype=np.int32),
+            np.frombuffer(range_ends, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_json(cls, annotations_file: str) -> 'AnnotationStore':
+        data = load_json(annotations_file)
+        try:
+            return cls.from_mapping(data)
+        except (AttributeError, KeyError, OverflowError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed annotations in {annotations_file}: {e!r}") from e
+
+    def __len__(self) -> int:
+        """Number of annotated lines."""
+        return len(self.lines)
+
+    def __contains__(self, filename: Any) -> bool:
+        return self.file_id(filename) is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the columns (file names excluded)."""
+        return sum(column.nbytes for column in (
+            self.file_offsets, self.lines, self.range_offsets, self.range_starts, self.range_ends
+        ))
+
+    def file_id(self, filename: str) -> Optional[int]:
+        position = bisect.bisect_left(self.filenames, filename)
+        if position < len(self.filenames) and self.filenames[position] == filename:
+            return position
+        return None
+
+    def file_annotations(self, filename: str, first_line: Optional[int] = None, last_line: Optional[int] = None) -> FileAnnotations:
+        """Annotations of ``filename``, optionally limited to lines ``first_line..last_line`` (inclusive).
+
+        Unknown files get an empty result.
+        """
+        file_id = self.file_id(filename)
+        if file_id is None:
+            return FileAnnotations.empty(filename)
+        start, stop = int(self.file_offsets[file_id]), int(self.file_offsets[file_id + 1])
+        if first_line is not None or last_line is not None:
+            file_lines = self.lines[start:stop]
+            if last_line is not None:
+                stop = start + int(np.searchsorted(file_lines, last_line, side='right'))
+            if first_line is not None:
+                start += int(np.searchsorted(file_lines, first_line, side='left'))
+            stop = max(start, stop)
+        range_offsets = self.range_offsets[start:stop + 1]
+        first_range, last_range = int(range_offsets[0]), int(range_offsets[-1])
+        return FileAnnotations(
+            filename,
+            self.lines[start:stop],
+            range_offsets - first_range,
+            self.range_starts[first_range:last_range],
+            self.range_ends[first_range:last_range],
+        )
+
+    def save(self, filepath: str, source_stamp: Tuple[int, int] = (0, 0)) -> None:
+        """Write the columns to ``filepath``; ``source_stamp`` is the (size, mtime_ns) of the
+        JSON it was built from, checked by ``load``."""
+        names = _NAME_SEPARATOR.join(self.filenames).encode('utf-8')
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filepath)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(_STORE_HEADER.pack(
+                    _STORE_MAGIC, source_stamp[0], source_stamp[1],
+                    len(self.filenames), len(self.lines), len(self.range_starts), len(names)
+                ))
+                # 64-bit columns first, then 32-bit ones, so every column stays aligned.
+                for column, dtype in (
+                    (self.file_offsets, np.int64), (self.range_offsets, np.int64),
+                    (self.lines, np.int32), (self.range_starts, np.int32), (self.range_ends, np.int32)
+                ):
+                    file.write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+                file.write(names)
+            os.replace(temp_path, filepath)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, filepath: str, source_stamp: Optional[Tuple[int, int]] = None) -> Optional['AnnotationStore']:
+        """Memory-map a saved store; None if it is missing, corrupt or (when ``source_stamp``
+        is given) was built from a different version of the JSON."""
+        try:
+            with open(filepath, 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            magic, size, mtime_ns, files, rows, ranges, name_bytes = _STORE_HEADER.unpack_from(buffer)
+        except struct.error:
+            return None
+        if magic != _STORE_MAGIC or (source_stamp is not None and (size, mtime_ns) != tuple(source_stamp)):
+            return None
+        expected = _STORE_HEADER.size + 8 * (files + 1 + rows + 1) + 4 * (rows + 2 * ranges) + name_bytes
+        if len(buffer) != expected:
+            return None
+
+        offset = _STORE_HEADER.size
+        columns = []
+        for count, dtype in ((files + 1, np.int64), (rows + 1, np.int64), (rows, np.int32), (ranges, np.int32), (ranges, np.int32)):
+            columns.append(np.frombuffer(buffer, dtype=dtype, count=count, offset=offset))
+            offset += count * np.dtype(dtype).itemsize
+        names = buffer[offset:offset + name_bytes].decode('utf-8')
+        file_offsets, range_offsets, lines, range_starts, range_ends = columns
+        return cls(names.split(_NAME_SEPARATOR) if files else [], file_offsets, lines, range_offsets, range_starts, range_ends)
+
+
+def load_annotation_store(annotations_file: str, store_file: Optional[str] = None) -> AnnotationStore:
+    """Load the annotation store for ``annotations_file``.
+
+    The binary copy at ``store_file`` (default: ``default_store_path``) is used while it
+    matches the JSON's size and mtime; otherwise the JSON is parsed once and the binary
+    copy rewritten.
+    """
+    store_file = store_file or default_store_path(annotations_file)
+    stat = os.stat(annotations_file)
+    source_stamp = (stat.st_size, stat.st_mtime_ns)
+    store = AnnotationStore.load(store_file, source_stamp)
+    if store is None:
+        store = AnnotationStore.from_json(annotations_file)
+        try:
+            store.save(store_file, source_stamp)
+        except OSError as e:
+            logger.warning(f"Could not save the annotation store to {store_file}: {e}")
+    return store
@@ -0,0 +1,331 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+# Constants
+BASELINE_FILE = "benchmark_baseline.json"
+REGRESSION_TOLERANCE = 0.15
+BENCHMARKS = ("load", "load_store", "enhance", "enhance_parallel", "save", "dedup", "preprocess", "api")
+VULNERABILITY_TYPES = ("Buffer Overflow", "SQL Injection", "Use After Free", "Integer Overflow", "NULL Pointer Dereference")
+_IDENTIFIERS = ("buf", "len", "ptr", "count", "input", "result", "node", "size", "index", "data")
+_STATEMENTS = (
+    "int {0} = {1} + {2};",
+    "{0} = malloc({1} * sizeof(char));",
+    "strcpy({0}, {1});",
+    "if ({0} > {1}) {{ return {2}; }}",
+    "for (int i = 0; i < {0}; i++) {{ {1}[i] = {2}; }}",
+    "free({0});",
+    "printf(\"%d\\n\", {0});",
+)
+
+class BenchmarkConfig(BaseModel):
+    files: int = 50
+    lines_per_file: int = 500
+    annotations_per_file: int = 5
+    csv_rows: int = 2000
+    repeat: int = 3
+    workers: int = os.cpu_count() or 1
+    concurrency: int = 8
+    requests: int = 64
+    seed: int = 0
+
+class BenchmarkResult(BaseModel):
+    name: str
+    seconds: float
+    items: int
+    throughput: float
+    peak_rss_mb: float
+    details: Dict[str, float] = {}
+
+class SyntheticDataset(BaseModel):
+    dataset_directory: str
+    annotations_file: str
+    csv_file: str
+
+def _source_line(rng: random.Random) -> str:
+    return rng.choice(_STATEMENTS).format(*(rng.choice(_IDENTIFIERS) for _ in range(3)))
+
+def generate_synthetic_dataset(directory: str, config: BenchmarkConfig) -> SyntheticDataset:
+    """Write C-like source files, a map.json-style annotations file and a FormAI-style CSV."""
+    rng = random.Random(config.seed)
+    dataset_directory = os.path.join(directory, "dataset")
+    os.makedirs(dataset_directory, exist_ok=True)
+    annotations = {}
+    for file_number in range(config.files):
+        filename = f"synthetic_{file_number:05d}.c"
+        lines = [_source_line(rng) for _ in range(config.lines_per_file)]
+        with open(os.path.join(dataset_directory, filename), 'w') as file:
+            file.write('\n'.join(lines))
+        annotated = rng.sample(range(1, config.lines_per_file + 1), min(config.annotations_per_file, config.lines_per_file))
+        annotations[filename] = {
+            str(line): {"char_ranges": [[0, len(lines[line - 1])]]} for line in sorted(annotated)
+        }
+    annotations_file = os.path.join(directory, "map.json")
+    with open(annotations_file, 'w') as file:
+        json.dump(annotations, file)
+
+    import pandas as pd
+    csv_file = os.path.join(directory, "FormAI_dataset.csv.gz")
+    rows = pd.DataFrame({
+        'Source code': ['\n'.join(_source_line(rng) for _ in range(rng.randint(3, 60))) for _ in range(config.csv_rows)],
+        'Vulnerability type': [rng.choice(VULNERABILITY_TYPES) for _ in range(config.csv_rows)],
+    })
+    with gzip.open(csv_file, 'wt') as file:
+        rows.to_csv(file, index=False)
+    return SyntheticDataset(dataset_directory=dataset_directory, annotations_file=annotations_file, csv_file=csv_file)
+
+def peak_rss_mb() -> float:
+    """High-water RSS of this process and its finished workers, in MiB (Linux reports KiB)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+def time_stage(name: str, fn: Callable[[], int], repeat: int = 3) -> BenchmarkResult:
+    """Run ``fn`` (returning the number of items it processed) and keep the fastest run."""
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    return BenchmarkResult(
+        name=name, seconds=seconds, items=items, throughput=items / seconds if seconds else 0.0, peak_rss_mb=peak_rss_mb()
+    )
+
+def _annotation_models(raw: Dict) -> Dict:
+    from data_prep import Annotation
+    return {filename: {line: Annotation(**value) for line, value in lines.items()} for filename, lines in raw.items()}
+
+def bench_load(dataset: SyntheticDataset, config: BenchmarkConfig) -> BenchmarkResult:
+    from data_prep import load_json_annotations
+    return time_stage(
+        "load", lambda: sum(map(len, load_json_annotations(dataset.annotations_file).values())), config.repeat
+    )
+
+def bench_load_store(dataset: SyntheticDataset, config: BenchmarkConfig) -> BenchmarkResult:
+    """Reload the columnar annotation store from its binary copy; building it is reported in details."""
+    from annotation_store import default_store_path, load_annotation_store
+    store_file = default_store_path(dataset.annotations_file)
+    if os.path.exists(store_file):
+        os.remove(store_file)
+    start = time.perf_counter()
+    store = load_annotation_store(dataset.annotations_file)
+    build_seconds = time.perf_counter() - start
+    result = time_stage("load_store", lambda: len(load_annotation_store(dataset.annotations_file)), config.repeat)
+    result.details.update({"build_ms": build_seconds * 1000, "columns_kb": store.nbytes / 1024})
+    return result
+
+def bench_enhance(dataset: SyntheticDataset, config: BenchmarkConfig, workers: int = 1, name: str = "enhance") -> BenchmarkResult:
+    from data_prep import enhance_annotations_with_negatives, load_json_annotations
+    annotations = _annotation_models(load_json_annotations(dataset.annotations_file))
+
+    def enhance() -> int:
+        enhanced = enhance_annotations_with_negatives(
+            annotations, dataset.dataset_directory, seed=config.seed, workers=workers
+        )
+        return sum(map(len, enhanced.annotations.values()))
+
+    return time_stage(name, enhance, config.repeat)
+
+def bench_save(dataset: SyntheticDataset, config: BenchmarkConfig) -> BenchmarkResult:
+    from data_prep import enhance_annotations_with_negatives, load_json_annotations, save_enhanced_annotations
+    annotations = _annotation_models(load_json_annotations(dataset.annotations_file))
+    enhanced = enhance_annotations_with_negatives(annotations, dataset.dataset_directory, seed=config.seed)
+    output_file = os.path.join(os.path.dirname(dataset.annotations_file), "enhanced_annotations.json")
+
+    def save() -> int:
+        save_enhanced_annotations(enhanced, output_file)
+        return sum(map(len, enhanced.annotations.values()))
+
+    result = time_stage("save", save, config.repeat)
+    result.details["output_mb"] = os.path.getsize(output_file) / 2 ** 20
+    return result
+
+def bench_dedup(dataset: SyntheticDataset, config: BenchmarkConfig) -> BenchmarkResult:
+    from simple_preprocesing import clean_data, load_and_inspect_data
+    data = load_and_inspect_data(dataset.csv_file)
+    kept = []
+
+    def dedup() -> int:
+        kept.append(len(clean_data(data, near_duplicates=True, workers=config.workers)))
+        return len(data)
+
+    result = time_stage("dedup", dedup, config.repeat)
+    result.details["kept_pct"] = 100 * kept[-1] / len(data) if len(data) else 0.0
+    return result
+
+def bench_preprocess(dataset: SyntheticDataset, config: BenchmarkConfig) -> BenchmarkResult:
+    from simple_preprocesing import clean_data, load_and_inspect_data, preprocess_data
+    data = clean_data(load_and_inspect_data(dataset.csv_file))
+    return time_stage("preprocess", lambda: len(preprocess_data(data.copy(), pad=False)[0]), config.repeat)
+
+def _percentile(values: Sequence[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def bench_api(dataset: SyntheticDataset, config: BenchmarkConfig) -> BenchmarkResult:
+    """Drive /enhance_annotations/ and /load_annotations/ from ``concurrency`` client threads."""
+    from fastapi.testclient import TestClient
+    import data_prep
+
+    with open(dataset.annotations_file) as file:
+        annotations = json.load(file)
+    payloads = [{filename: lines} for filename, lines in annotations.items()]
+    app = data_prep.create_app(dataset.dataset_directory, dataset.annotations_file)
+    clients = threading.local()
+    latencies = []
+    statuses = []
+
+    def request(number: int) -> None:
+        if not hasattr(clients, "client"):
+            clients.client = TestClient(app)
+        start = time.perf_counter()
+        if number % 4 == 3:
+            response = clients.client.get('/load_annotations/')
+        else:
+            response = clients.client.post('/enhance_annotations/', json=payloads[number % len(payloads)])
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status_code)
+
+    def run() -> int:
+        latencies.clear()
+        statuses.clear()
+        with ThreadPoolExecutor(max_workers=config.concurrency) as executor:
+            list(executor.map(request, range(config.requests)))
+        return config.requests
+
+    data_prep.ANNOTATIONS_CACHE.clear()
+    data_prep.ANNOTATIONS_RESPONSE_CACHE.clear()
+    data_prep.DATASET_CACHE.clear()
+    result = time_stage("api", run, config.repeat)
+    data_prep.ANNOTATIONS_CACHE.clear()
+    data_prep.ANNOTATIONS_RESPONSE_CACHE.clear()
+    data_prep.DATASET_CACHE.clear()
+    result.details.update({
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "errors": float(sum(status != 200 for status in statuses)),
+    })
+    return result
+
+def run_benchmarks(config: BenchmarkConfig, only: Optional[Sequence[str]] = None, directory: Optional[str] = None) -> List[BenchmarkResult]:
+    """Generate the synthetic dataset and run the selected benchmarks, lightest first."""
+    selected = [name for name in BENCHMARKS if only is None or name in only]
+    owned_directory = directory is None
+    directory = tempfile.mkdtemp(prefix="benchmarks-") if owned_directory else directory
+    try:
+        dataset = generate_synthetic_dataset(directory, config)
+        runners = {
+            "load": lambda: bench_load(dataset, config),
+            "load_store": lambda: bench_load_store(dataset, config),
+            "enhance": lambda: bench_enhance(dataset, config),
+            "enhance_parallel": lambda: bench_enhance(dataset, config, config.workers, "enhance_parallel"),
+            "save": lambda: bench_save(dataset, config),
+            "dedup": lambda: bench_dedup(dataset, config),
+            "preprocess": lambda: bench_preprocess(dataset, config),
+            "api": lambda: bench_api(dataset, config),
+        }
+        return [runners[name]() for name in selected]
+    finally:
+        if owned_directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def load_baseline(filepath: str) -> Optional[Dict]:
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath) as file:
+        return json.load(file)
+
+def save_baseline(results: List[BenchmarkResult], config: BenchmarkConfig, filepath: str) -> None:
+    with open(filepath, 'w') as file:
+        json.dump({"config": config.dict(), "results": {result.name: result.dict() for result in results}}, file, indent=4)
+
+def find_regressions(
+    results: List[BenchmarkResult],
+    baseline: Dict,
+    config: BenchmarkConfig,
+    tolerance: float = REGRESSION_TOLERANCE
+) -> List[str]:
+    """Describe every benchmark whose throughput fell more than ``tolerance`` below the baseline."""
+    if baseline.get("config") != config.dict():
+        raise ValueError("Baseline was recorded with a different benchmark configuration")
+    regressions = []
+    for result in results:
+        previous = baseline["results"].get(result.name)
+        if previous is None or not previous["throughput"]:
+            continue
+        change = result.throughput / previous["throughput"] - 1
+        if change < -tolerance:
+            regressions.append(
+                f"{result.name}: {result.throughput:.1f}/s vs baseline {previous['throughput']:.1f}/s ({change:+.1%})"
+            )
+    return regressions
+
+def format_results(results: List[BenchmarkResult], baseline: Optional[Dict] = None) -> str:
+    previous = baseline["results"] if baseline else {}
+    lines = [f"{'benchmark':<18}{'seconds':>10}{'items':>10}{'items/s':>12}{'vs base':>10}{'peak MiB':>10}  details"]
+    for result in results:
+        base = previous.get(result.name, {}).get("throughput")
+        change = f"{result.throughput / base - 1:+.1%}" if base else "-"
+        details = ", ".join(f"{key}={value:.1f}" for key, value in result.details.items())
+        lines.append(
+            f"{result.name:<18}{result.seconds:>10.3f}{result.items:>10}{result.throughput:>12.1f}"
+            f"{change:>10}{result.peak_rss_mb:>10.1f}  {details}"
+        )
+    return "\n".join(lines)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    defaults = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description="Benchmark the data prep and preprocessing hot paths.")
+    parser.add_argument("--files", type=int, default=defaults.files)
+    parser.add_argument("--lines-per-file", type=int, default=defaults.lines_per_file)
+    parser.add_argument("--annotations-per-file", type=int, default=defaults.annotations_per_file)
+    parser.add_argument("--csv-rows", type=int, default=defaults.csv_rows)
+    parser.add_argument("--repeat", type=int, default=defaults.repeat)
+    parser.add_argument("--workers", type=int, default=defaults.workers)
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency)
+    parser.add_argument("--requests", type=int, default=defaults.requests)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(
+        files=args.files, lines_per_file=args.lines_per_file, annotations_per_file=args.annotations_per_file,
+        csv_rows=args.csv_rows, repeat=args.repeat, workers=args.workers, concurrency=args.concurrency,
+        requests=args.requests
+    )
+    results = run_benchmarks(config, args.only)
+    baseline = load_baseline(args.baseline)
+    print(format_results(results, baseline))
+    if args.save_baseline:
+        save_baseline(results, config, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if baseline is None:
+        return 0
+    try:
+        regressions = find_regressions(results, baseline, config, args.tolerance)
+    except ValueError as e:
+        print(f"Skipping regression check: {e}")
+        return 0
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
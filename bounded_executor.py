@@ -0,0 +1,35 @@
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a BoundedExecutor already holds its maximum number of pending tasks."""
+
+
+class BoundedExecutor:
+    """Executor wrapper that rejects new work once ``max_pending`` tasks are queued or running.
+
+    Rejecting instead of queueing without bound gives callers (e.g. the API) a signal to
+    shed load, rather than letting latency grow with an invisible backlog.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, executor: Optional[Executor] = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending > 0 else None
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        if self._slots is None or not self._slots.acquire(blocking=False):
+            raise QueueFullError(f"{self.max_pending} tasks already pending")
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,62 @@
+import numpy as np
+from keras.utils import Sequence
+
+
+def sequence_lengths(sequences, max_length=None):
+    """
+    Lengths of the given token sequences, optionally capped at ``max_length``.
+    """
+    lengths = sequences.lengths if hasattr(sequences, 'lengths') else np.fromiter(
+        (len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences)
+    )
+    return np.minimum(lengths, max_length) if max_length is not None else np.asarray(lengths)
+
+
+def pad_batch(sequences, indices, max_length=None):
+    """
+    Post-pad the selected sequences to the longest one in the batch (at least 1), keeping
+    at most ``max_length`` leading tokens of each.
+    """
+    lengths = sequence_lengths([sequences[i] for i in indices], max_length)
+    batch = np.zeros((len(indices), max(1, int(lengths.max(initial=0)))), dtype=np.int32)
+    for row, (index, length) in enumerate(zip(indices, lengths)):
+        batch[row, :length] = sequences[index][:length]
+    return batch
+
+
+class BucketedBatches(Sequence):
+    """
+    Keras input Sequence that groups similarly long sequences into the same batch and pads
+    each batch only to its own longest member.
+
+    Every epoch the rows are shuffled, stably sorted by length and cut into batches, and
+    the batch order is shuffled, so a few very long sources only inflate their own batch
+    and the dense padded matrix for the whole dataset is never built.
+    """
+
+    def __init__(self, sequences, labels, batch_size=64, max_length=None, indices=None, shuffle=True, seed=None):
+        super().__init__()
+        self.sequences = sequences
+        self.labels = labels
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.indices = np.arange(len(sequences)) if indices is None else np.asarray(indices)
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.lengths = sequence_lengths(sequences, max_length)[self.indices]
+        self.on_epoch_end()
+
+    def on_epoch_end(self):
+        order = self.rng.permutation(len(self.indices)) if self.shuffle else np.arange(len(self.indices))
+        order = order[np.argsort(self.lengths[order], kind='stable')]
+        self.batches = [self.indices[order[start:start + self.batch_size]]
+                        for start in range(0, len(order), self.batch_size)]
+        if self.shuffle:
+            self.rng.shuffle(self.batches)
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __getitem__(self, index):
+        batch = self.batches[index]
+        return pad_batch(self.sequences, batch, self.max_length), self.labels[batch]
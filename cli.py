@@ -0,0 +1,107 @@
+import argparse
+from typing import Optional, Sequence
+
+# Every subcommand imports its module inside its handler: `prep` and `analyze` never
+# load pandas or TensorFlow, `preprocess` never loads TensorFlow, and only `serve`
+# loads FastAPI, so short batch runs start in milliseconds.
+SERVE_PORTS = {"prep": 8001, "predict": 8002}
+
+
+def start_metrics_server(port: Optional[int]) -> None:
+    if port:
+        from prometheus_client import start_http_server
+        from prep_metrics import REGISTRY
+        start_http_server(port, registry=REGISTRY)
+
+
+def run_prep(args: argparse.Namespace) -> int:
+    import data_prep
+    start_metrics_server(args.metrics_port)
+    data_prep.run_enhancement(args.annotations, args.dataset, args.output, args.seed, args.workers, args.profile)
+    return 0
+
+
+def run_analyze(args: argparse.Namespace) -> int:
+    import dataset_analyzer
+    start_metrics_server(args.metrics_port)
+    dataset_analyzer.run_analysis(args.annotations, args.dataset, args.output, args.seed, args.workers, args.profile)
+    return 0
+
+
+def run_preprocess(args: argparse.Namespace) -> int:
+    import simple_preprocesing
+    simple_preprocesing.run_preprocessing(args.csv, args.store, args.workers, not args.keep_near_duplicates)
+    return 0
+
+
+def run_train(args: argparse.Namespace) -> int:
+    import simple_preprocesing
+    simple_preprocesing.run_training(args.store, args.model, args.epochs, args.max_length)
+    return 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    import uvicorn
+    port = args.port or SERVE_PORTS[args.app]
+    start_metrics_server(args.metrics_port)
+    if args.app == "prep":
+        import data_prep
+        app = data_prep.get_app()
+    else:
+        import inference_service
+        app = inference_service.app
+    uvicorn.run(app, host=args.host, port=port)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    # Defaults mirror the stage modules' constants; importing them would defeat the point.
+    parser = argparse.ArgumentParser(prog="cli", description="Data preparation, training and serving.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    for name, handler, help_text in (
+        ("prep", run_prep, "enhance map.json annotations with context and negative samples"),
+        ("analyze", run_analyze, "enhance annotations with the validated dataset_analyzer pipeline"),
+    ):
+        command = subcommands.add_parser(name, help=help_text)
+        command.add_argument("--annotations", default="map.json")
+        command.add_argument("--dataset", default="./Dataset_1")
+        command.add_argument("--output", default="enhanced_annotations.jsonl.gz")
+        command.add_argument("--seed", type=int, default=42)
+        command.add_argument("--workers", type=int, default=1)
+        command.add_argument("--profile", metavar="DIR", help="profile the run into DIR (or set DATA_PREP_PROFILE)")
+        command.add_argument("--metrics-port", type=int, default=0, help="serve Prometheus metrics on this port")
+        command.set_defaults(handler=handler)
+
+    preprocess = subcommands.add_parser("preprocess", help="clean and tokenize the CSV into a feature store")
+    preprocess.add_argument("--csv", default="FormAI_dataset.csv")
+    preprocess.add_argument("--store", default="feature_store")
+    preprocess.add_argument("--workers", type=int, help="dedup and tokenizer processes (default: CPU count)")
+    preprocess.add_argument(
+        "--keep-near-duplicates", action="store_true", help="skip collapsing near-duplicate programs"
+    )
+    preprocess.set_defaults(handler=run_preprocess)
+
+    train = subcommands.add_parser("train", help="train the classifier from a feature store")
+    train.add_argument("--store", default="feature_store")
+    train.add_argument("--model", default="vulnerability_model.keras")
+    train.add_argument("--epochs", type=int, default=10)
+    train.add_argument("--max-length", type=int, help="truncate sequences to this many tokens")
+    train.set_defaults(handler=run_train)
+
+    serve = subcommands.add_parser("serve", help="serve the enhancement or prediction API")
+    serve.add_argument("--app", choices=sorted(SERVE_PORTS), default="prep")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, help="default: 8001 for prep, 8002 for predict")
+    serve.add_argument("--metrics-port", type=int, default=0, help="serve Prometheus metrics on this port")
+    serve.set_defaults(handler=run_serve)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
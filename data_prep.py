@@ -1,24 +1,47 @@
-import os
 import json
-import random
-from typing import Dict, List, Optional
-from fastapi import FastAPI, HTTPException
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+import contextvars
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Union
 from pydantic import BaseModel, Field
 from loguru import logger
-from prometheus_client import Counter, Histogram, start_http_server, CollectorRegistry
+from prometheus_client import start_http_server
+from json_codec import dumps, load_json
+from enhancement_pipeline import EnhancementPipeline, get_context_lines
+from line_index import LineIndex
+from annotation_store import AnnotationStore
+from dataset_files import is_dataset_filename
+from bounded_executor import BoundedExecutor, QueueFullError
+from memory_cache import FileCache
+from prep_metrics import REGISTRY, API_REQUEST_DURATION, API_REQUESTS_IN_FLIGHT
+from profiling import PROFILE_ENV, ACTIVE_PROFILER, install_request_profiling, profile_directory
 
 # Constants
 DATASET_DIRECTORY = "./Dataset_1"
 ANNOTATIONS_FILE = "map.json"
+ENHANCED_ANNOTATIONS_FILE = "enhanced_annotations.jsonl.gz"
+ENHANCEMENT_CACHE_DIRECTORY = ".enhancement_cache"
+ENHANCEMENT_SEED = 42
 VULNERABILITY_MARKER = "VULNERABLE LINES"
+API_MAX_WORKERS = 4
+API_MAX_PENDING = 32
+API_JOB_TTL_SECONDS = 600
+# Per-file results a job buffers before its worker waits for the client to read them,
+# and how long the worker (an API executor thread) waits before abandoning the job.
+API_JOB_MAX_BUFFERED = 64
+API_JOB_PUT_TIMEOUT_SECONDS = 30
+DATASET_CACHE_MAX_BYTES = 512 * 1024 * 1024
 
-# Prometheus metrics
-REGISTRY = CollectorRegistry()
-PREP_COUNTER = Counter('data_prep_total', 'Total number of data preparation operations', registry=REGISTRY)
-PREP_DURATION = Histogram('data_prep_duration_seconds', 'Duration of data preparation operations', registry=REGISTRY)
-
-# FastAPI app
-app = FastAPI()
+# FastAPI app, built on first access to ``data_prep.app`` (see get_app) so batch runs
+# and their worker processes never import FastAPI.
+_APP = None
+# Requests sending "X-Profile: 1" are profiled only when DATA_PREP_PROFILE names a directory.
+API_PROFILE_DIRECTORY = profile_directory()
 
 # Pydantic models
 class Annotation(BaseModel):
@@ -32,15 +55,36 @@ class EnhancedAnnotation(BaseModel):
 class EnhancedAnnotations(BaseModel):
     annotations: Dict[str, Dict[str, EnhancedAnnotation]]
 
-@PREP_DURATION.time()
+class DataPrepPipeline(EnhancementPipeline):
+    """Enhancement pipeline for ``EnhancedAnnotation``, whose char ranges are plain ``[start, end]`` lists."""
+
+    sample_model = EnhancedAnnotation
+    enhanced_model = EnhancedAnnotations
+
+    def annotation_char_ranges(self, annotation: Annotation) -> List[List[int]]:
+        return annotation.char_ranges
+
+PIPELINE = DataPrepPipeline("data_prep")
+# Prometheus metrics
+METRICS = PIPELINE.metrics
+
+sample_record = PIPELINE.sample_record
+enhanced_annotations_payload = PIPELINE.enhanced_annotations_payload
+load_stored_annotations = PIPELINE.load_stored_annotations
+annotated_lines = PIPELINE.annotated_lines
+enhance_file_annotations = PIPELINE.enhance_file_annotations
+iter_enhanced_annotations = PIPELINE.iter_enhanced_annotations
+enhance_annotations_with_negatives = PIPELINE.enhance_annotations_with_negatives
+save_enhanced_annotations = PIPELINE.save_enhanced_annotations
+stream_enhanced_annotations = PIPELINE.stream_enhanced_annotations
+iter_saved_enhanced_annotations = PIPELINE.iter_saved_enhanced_annotations
+
+@METRICS.stage("load")
 def load_json_annotations(filepath: str) -> Dict:
     """Load annotations from a JSON file."""
     logger.info(f"Loading annotations from {filepath}")
     try:
-        with open(filepath, 'r') as file:
-            annotations = json.load(file)
-        PREP_COUNTER.inc()
-        return annotations
+        return load_json(filepath)
     except FileNotFoundError:
         logger.error(f"Annotations file not found: {filepath}")
         raise
@@ -48,113 +92,308 @@ def load_json_annotations(filepath: str) -> Dict:
         logger.error(f"Invalid JSON in annotations file: {filepath}")
         raise
 
-@PREP_DURATION.time()
-def get_context_lines(file_content: List[str], line_number: int, context_range: int = 5) -> List[str]:
-    """Extract context lines around a specific line in a file."""
-    start = max(0, line_number - context_range - 1)
-    end = min(len(file_content), line_number + context_range)
-    return [' '.join(line.strip().split()) for line in file_content[start:end]]
-
-@PREP_DURATION.time()
-def enhance_annotations_with_negatives(
-    annotations: Dict[str, Dict[str, Annotation]],
-    dataset_directory: str,
-    context_range: int = 5,
-    neg_samples_per_positive: int = 1
-) -> EnhancedAnnotations:
-    """Enhance annotations with context lines and add negative samples."""
-    logger.info("Enhancing annotations with negatives")
-    enhanced_annotations = {}
-    for filename in os.listdir(dataset_directory):
-        file_path = os.path.join(dataset_directory, filename)
+# API endpoints
+# Blocking work runs on a bounded thread pool so the event loop stays responsive;
+# requests beyond API_MAX_PENDING get a 503 instead of an unbounded backlog.
+API_EXECUTOR = BoundedExecutor(max_workers=API_MAX_WORKERS, max_pending=API_MAX_PENDING)
+ENHANCEMENT_JOBS: Dict[str, "EnhancementJob"] = {}
+# Parsed map.json and per-file line data are kept in memory across requests and reloaded
+# when the underlying file changes; /reload/ drops everything explicitly.
+ANNOTATIONS_CACHE: FileCache[Dict] = FileCache(load_json_annotations)
+ANNOTATIONS_RESPONSE_CACHE: FileCache[bytes] = FileCache(lambda filepath: dumps(ANNOTATIONS_CACHE.get(filepath)))
+# Per-file and line-range queries go through the columnar store instead of the parsed JSON.
+ANNOTATION_STORE_CACHE: FileCache[AnnotationStore] = FileCache(load_stored_annotations)
+DATASET_CACHE: FileCache[LineIndex] = FileCache(
+    LineIndex.read, max_bytes=DATASET_CACHE_MAX_BYTES, weigher=lambda line_index: line_index.nbytes
+)
+_JOB_DONE = object()
+
+class EnhancementJob:
+    """Batched enhancement request whose per-file results are streamed back as they complete."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.results: asyncio.Queue = asyncio.Queue(maxsize=API_JOB_MAX_BUFFERED)
+        self.abandoned = threading.Event()
+        self.created = time.monotonic()
+        self.future: Optional[Future] = None
+
+    def publish(self, item) -> bool:
+        """Queue ``item`` for the stream (worker thread), waiting while the buffer is full.
+
+        Returns False once the job is abandoned: its client went away, or nobody made
+        room in the buffer for API_JOB_PUT_TIMEOUT_SECONDS.
+        """
+        if self.abandoned.is_set():
+            return False
+        put = asyncio.run_coroutine_threadsafe(self.results.put(item), self.loop)
         try:
-            with open(file_path, 'r') as file:
-                file_lines = file.readlines()
-        except FileNotFoundError:
-            logger.warning(f"File not found: {file_path}")
-            continue
-        except IOError:
-            logger.warning(f"Error reading file: {file_path}")
-            continue
-
-        file_annotations = annotations.get(filename, {})
-        enhanced_annotations[filename] = {}
-
-        for line_num, char_ranges in file_annotations.items():
-            line_num_int = int(line_num)
-            context = get_context_lines(file_lines, line_num_int, context_range)
-            enhanced_annotations[filename][line_num] = EnhancedAnnotation(
-                context=context,
-                char_ranges=char_ranges.char_ranges,
-                is_vulnerable=1
+            put.result(timeout=API_JOB_PUT_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            put.cancel()
+            # Set here, not only in abandon(), so this worker stops publishing right away.
+            self.abandoned.set()
+            self.loop.call_soon_threadsafe(self.abandon)
+            return False
+        return not self.abandoned.is_set()
+
+    def abandon(self) -> None:
+        """Stop the job's worker and drop its unread results (event loop thread)."""
+        self.abandoned.set()
+        # Draining also releases a worker blocked on a full buffer, so it sees the flag;
+        # the end marker then finishes a stream that is still attached.
+        while not self.results.empty():
+            self.results.get_nowait()
+        self.results.put_nowait(_JOB_DONE)
+
+    def run(
+        self,
+        annotations: Dict[str, Dict[str, Annotation]],
+        files: Optional[List[str]] = None,
+        pattern: Optional[str] = None,
+        dataset_directory: Optional[str] = None
+    ) -> None:
+        try:
+            enhanced = iter_enhanced_annotations(
+                annotations, dataset_directory or DATASET_DIRECTORY, line_cache=DATASET_CACHE, files=files, pattern=pattern
             )
+            with METRICS.jobs_in_flight.track_inprogress():
+                for filename, samples in enhanced:
+                    if not self.publish({"file": filename, "annotations": {k: sample_record(v) for k, v in samples.items()}}):
+                        logger.info("Enhancement job abandoned, dropping its remaining results")
+                        return
+        except Exception as e:
+            logger.exception("Error in enhancement job")
+            self.publish({"error": str(e)})
+        finally:
+            if not self.abandoned.is_set():
+                self.publish(_JOB_DONE)
 
-            all_line_nums = set(range(len(file_lines)))
-            non_vul_lines = all_line_nums - set(range(max(0, line_num_int - context_range), 
-                                                      min(len(file_lines), line_num_int + context_range + 1)))
-
-            for _ in range(neg_samples_per_positive):
-                if not non_vul_lines:
-                    break
-                non_vul_line_num = random.choice(list(non_vul_lines))
-                non_vul_context = get_context_lines(file_lines, non_vul_line_num, context_range)
-                enhanced_annotations[filename][str(non_vul_line_num)] = EnhancedAnnotation(
-                    context=non_vul_context,
-                    char_ranges=[],
-                    is_vulnerable=0
-                )
-                non_vul_lines.remove(non_vul_line_num)
-
-    PREP_COUNTER.inc()
-    return EnhancedAnnotations(annotations=enhanced_annotations)
-
-@PREP_DURATION.time()
-def save_enhanced_annotations(annotations: EnhancedAnnotations, filepath: str) -> None:
-    """Save the enhanced annotations to a JSON file."""
-    logger.info(f"Saving enhanced annotations to {filepath}")
+def submit_blocking(fn, *args, **kwargs) -> Future:
+    """Submit ``fn`` to the API executor, raising a 503 when the executor is saturated."""
+    profiler = ACTIVE_PROFILER.get()
+    if profiler is not None:
+        # Carry the request's profiler into the worker thread and cProfile the call there.
+        fn, args = contextvars.copy_context().run, (profiler.call, fn, *args)
     try:
-        with open(filepath, 'w') as file:
-            json.dump(annotations.dict(), file, indent=4)
-        PREP_COUNTER.inc()
-    except IOError:
-        logger.error(f"Error writing enhanced annotations to file: {filepath}")
-        raise
+        return API_EXECUTOR.submit(fn, *args, **kwargs)
+    except QueueFullError:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
 
-# API endpoints
-@app.post("/enhance_annotations/", response_model=EnhancedAnnotations)
-async def api_enhance_annotations(annotations: Dict[str, Dict[str, Annotation]]):
-    try:
-        enhanced = enhance_annotations_with_negatives(annotations, DATASET_DIRECTORY)
-        return enhanced
-    except Exception as e:
-        logger.exception("Error in API call to enhance annotations")
-        raise HTTPException(status_code=500, detail=str(e))
+async def run_blocking(fn, *args, **kwargs):
+    """Run ``fn`` on the API executor without blocking the event loop."""
+    return await asyncio.wrap_future(submit_blocking(fn, *args, **kwargs))
 
-@app.get("/load_annotations/")
-async def api_load_annotations():
-    try:
-        annotations = load_json_annotations(ANNOTATIONS_FILE)
-        return annotations
-    except Exception as e:
-        logger.exception("Error in API call to load annotations")
-        raise HTTPException(status_code=500, detail=str(e))
+def _expire_enhancement_jobs() -> None:
+    now = time.monotonic()
+    for job_id, job in list(ENHANCEMENT_JOBS.items()):
+        if now - job.created > API_JOB_TTL_SECONDS:
+            del ENHANCEMENT_JOBS[job_id]
+            job.abandon()
+
+def validate_dataset_files(filenames: Iterable[str]) -> None:
+    """Reject client-supplied file names that would escape DATASET_DIRECTORY."""
+    invalid = [filename for filename in filenames if not is_dataset_filename(filename)]
+    if invalid:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=400, detail=f"Invalid dataset file names: {invalid}")
+
+def enhance_annotations_response(
+    annotations: Union[Dict[str, Dict[str, Annotation]], AnnotationStore],
+    files: Optional[List[str]] = None,
+    pattern: Optional[str] = None,
+    dataset_directory: Optional[str] = None
+) -> bytes:
+    """Enhance annotations and encode the response body, both off the event loop."""
+    enhanced = enhance_annotations_with_negatives(
+        annotations, dataset_directory or DATASET_DIRECTORY, line_cache=DATASET_CACHE, files=files, pattern=pattern
+    )
+    with METRICS.stage("serialize"):
+        return dumps(enhanced_annotations_payload(enhanced))
+
+def create_app(dataset_directory: Optional[str] = None, annotations_file: Optional[str] = None):
+    """Build the FastAPI app serving the enhancement endpoints.
+
+    ``dataset_directory`` and ``annotations_file`` default to DATASET_DIRECTORY and
+    ANNOTATIONS_FILE, looked up on each request.
+    """
+    from fastapi import FastAPI, HTTPException, Query, Request
+    from fastapi.responses import Response, StreamingResponse
+
+    def annotations_path() -> str:
+        return annotations_file or ANNOTATIONS_FILE
+
+    app = FastAPI()
+    if API_PROFILE_DIRECTORY is not None:
+        install_request_profiling(app, API_PROFILE_DIRECTORY)
+
+    @app.middleware("http")
+    async def record_api_metrics(request: Request, call_next):
+        """Time every request, labelled by endpoint function rather than raw path (job ids)."""
+        start = time.perf_counter()
+        status = 500
+        API_REQUESTS_IN_FLIGHT.inc()
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            API_REQUESTS_IN_FLIGHT.dec()
+            endpoint = getattr(request.scope.get("endpoint"), "__name__", "unmatched")
+            API_REQUEST_DURATION.labels(endpoint, request.method, str(status)).observe(time.perf_counter() - start)
+
+    @app.post("/enhance_annotations/", response_model=EnhancedAnnotations)
+    async def api_enhance_annotations(
+        annotations: Dict[str, Dict[str, Annotation]],
+        files: Optional[List[str]] = Query(None),
+        pattern: Optional[str] = None
+    ):
+        validate_dataset_files(annotations if files is None else files)
+        try:
+            body = await run_blocking(enhance_annotations_response, annotations, files, pattern, dataset_directory)
+            return Response(content=body, media_type="application/json")
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("Error in API call to enhance annotations")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.post("/enhance_annotations/jobs/", status_code=202)
+    async def api_submit_enhancement_job(
+        annotations: Dict[str, Dict[str, Annotation]],
+        files: Optional[List[str]] = Query(None),
+        pattern: Optional[str] = None
+    ):
+        validate_dataset_files(annotations if files is None else files)
+        _expire_enhancement_jobs()
+        job = EnhancementJob(asyncio.get_running_loop())
+        job.future = submit_blocking(job.run, annotations, files, pattern, dataset_directory)
+        job_id = uuid.uuid4().hex
+        ENHANCEMENT_JOBS[job_id] = job
+        return {"job_id": job_id}
+
+    @app.get("/enhance_annotations/jobs/{job_id}")
+    async def api_stream_enhancement_job(job_id: str):
+        job = ENHANCEMENT_JOBS.pop(job_id, None)
+        if job is None or job.abandoned.is_set():
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+        async def stream_results():
+            try:
+                while True:
+                    item = await job.results.get()
+                    if item is _JOB_DONE:
+                        break
+                    yield dumps(item) + b"\n"
+            finally:
+                # Also runs when the client disconnects mid-stream.
+                job.abandon()
+
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+    @app.get("/load_annotations/")
+    async def api_load_annotations():
+        try:
+            body = await run_blocking(ANNOTATIONS_RESPONSE_CACHE.get, annotations_path())
+            return Response(content=body, media_type="application/json")
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("Error in API call to load annotations")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/annotations/{filename}")
+    async def api_file_annotations(
+        filename: str,
+        first_line: Optional[int] = Query(None, ge=1),
+        last_line: Optional[int] = Query(None, ge=1)
+    ):
+        try:
+            store = await run_blocking(ANNOTATION_STORE_CACHE.get, annotations_path())
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("Error in API call to query annotations")
+            raise HTTPException(status_code=500, detail=str(e))
+        if filename not in store:
+            raise HTTPException(status_code=404, detail=f"No annotations for {filename}")
+        return Response(
+            content=dumps(store.file_annotations(filename, first_line, last_line).to_dict()), media_type="application/json"
+        )
+
+    @app.post("/enhance_annotations/stored/", response_model=EnhancedAnnotations)
+    async def api_enhance_stored_annotations(files: Optional[List[str]] = Query(None), pattern: Optional[str] = None):
+        if files is not None:
+            validate_dataset_files(files)
+        try:
+            store = await run_blocking(ANNOTATION_STORE_CACHE.get, annotations_path())
+            body = await run_blocking(enhance_annotations_response, store, files, pattern, dataset_directory)
+            return Response(content=body, media_type="application/json")
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("Error in API call to enhance stored annotations")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.post("/reload/")
+    async def api_reload():
+        ANNOTATIONS_CACHE.clear()
+        ANNOTATIONS_RESPONSE_CACHE.clear()
+        ANNOTATION_STORE_CACHE.clear()
+        DATASET_CACHE.clear()
+        logger.info("Cleared annotation and dataset caches")
+        return {"status": "reloaded"}
+
+    return app
+
+def get_app():
+    """The module's shared app, created on first use."""
+    global _APP
+    if _APP is None:
+        _APP = create_app()
+    return _APP
+
+def __getattr__(name: str):
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def run_enhancement(
+    annotations_file: str = ANNOTATIONS_FILE,
+    dataset_directory: str = DATASET_DIRECTORY,
+    output_file: str = ENHANCED_ANNOTATIONS_FILE,
+    seed: Optional[int] = ENHANCEMENT_SEED,
+    workers: int = 1,
+    profile: Optional[str] = None
+) -> int:
+    """Enhance every annotated file and stream the samples to ``output_file``; returns the sample count."""
+    return PIPELINE.run(
+        annotations_file, dataset_directory, output_file, seed, workers, profile, cache_directory=ENHANCEMENT_CACHE_DIRECTORY
+    )
+
+def serve(host: str = "0.0.0.0", port: int = 8001) -> None:
+    """Run the enhancement API with uvicorn."""
+    import uvicorn
+    uvicorn.run(get_app(), host=host, port=port)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enhance annotations, then serve the API.")
+    parser.add_argument("--profile", metavar="DIR", help=f"profile the prep run into DIR (or set {PROFILE_ENV})")
+    args = parser.parse_args()
+
     # Start Prometheus metrics server
     start_http_server(8000, registry=REGISTRY)
 
     # Main script execution
     try:
-        annotations = load_json_annotations(ANNOTATIONS_FILE)
-        enhanced_annotations = enhance_annotations_with_negatives(annotations, DATASET_DIRECTORY)
-        save_enhanced_annotations(enhanced_annotations, 'enhanced_annotations.json')
+        run_enhancement(profile=args.profile)
 
         # Print a sample of the enhanced annotations for demonstration
-        for key, value in list(enhanced_annotations.annotations.items())[:1]:
-            print(key, "\n\t", json.dumps(value, indent=4))
+        for filename, line_num, sample in islice(iter_saved_enhanced_annotations(ENHANCED_ANNOTATIONS_FILE), 1):
+            print(filename, line_num, "\n\t", json.dumps(sample.dict(), indent=4))
     except Exception as e:
         logger.exception(f"An error occurred during data preparation: {str(e)}")
 
     # Run the FastAPI app
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    serve()
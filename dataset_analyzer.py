@@ -1,20 +1,23 @@
-import os
+import argparse
 import json
-import random
-from typing import Dict, List, Any
+from itertools import islice
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 from loguru import logger
-from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client import start_http_server
+from json_codec import load_json
+from enhancement_pipeline import EnhancementPipeline, get_context_lines
+from prep_metrics import REGISTRY
+from profiling import PROFILE_ENV
 
 # Constants
 DATASET_DIRECTORY = "./Dataset_1"
 ANNOTATIONS_FILE = "map.json"
+ENHANCED_ANNOTATIONS_FILE = "enhanced_annotations.jsonl.gz"
+ENHANCEMENT_CACHE_DIRECTORY = ".enhancement_cache"
+ENHANCEMENT_SEED = 42
 VULNERABILITY_MARKER = "VULNERABLE LINES"
 
-# Prometheus metrics
-PREP_COUNTER = Counter('data_prep_total', 'Total number of data preparation operations')
-PREP_DURATION = Histogram('data_prep_duration_seconds', 'Duration of data preparation operations')
-
 # Pydantic models for data validation
 class CharRange(BaseModel):
     start: int
@@ -31,15 +34,52 @@ class Annotations(BaseModel):
 class EnhancedAnnotations(BaseModel):
     annotations: Dict[str, Dict[str, AnnotationSample]]
 
-@PREP_DURATION.time()
-def load_json_annotations(filepath: str) -> Annotations:
-    """Load annotations from a JSON file."""
+class AnalyzerPipeline(EnhancementPipeline):
+    """Enhancement pipeline for ``AnnotationSample``, whose char ranges are ``CharRange`` models."""
+
+    sample_model = AnnotationSample
+    enhanced_model = EnhancedAnnotations
+    annotations_model = Annotations
+
+    def stored_char_ranges(self, char_ranges: List[List[int]]) -> List[CharRange]:
+        return [CharRange.construct(start=start, end=end) for start, end in char_ranges]
+
+    def char_ranges_record(self, char_ranges: List[CharRange]) -> List[Dict[str, int]]:
+        return [dict(char_range.__dict__) for char_range in char_ranges]
+
+    def char_ranges_from_record(self, records: List[Dict[str, int]]) -> List[CharRange]:
+        return [CharRange.construct(**char_range) for char_range in records]
+
+PIPELINE = AnalyzerPipeline("dataset_analyzer")
+# Prometheus metrics
+METRICS = PIPELINE.metrics
+
+sample_record = PIPELINE.sample_record
+sample_from_record = PIPELINE.sample_from_record
+load_stored_annotations = PIPELINE.load_stored_annotations
+annotated_lines = PIPELINE.annotated_lines
+enhance_file_annotations = PIPELINE.enhance_file_annotations
+iter_enhanced_annotations = PIPELINE.iter_enhanced_annotations
+enhance_annotations_with_negatives = PIPELINE.enhance_annotations_with_negatives
+save_enhanced_annotations = PIPELINE.save_enhanced_annotations
+stream_enhanced_annotations = PIPELINE.stream_enhanced_annotations
+iter_saved_enhanced_annotations = PIPELINE.iter_saved_enhanced_annotations
+
+@METRICS.stage("load")
+def load_json_annotations(filepath: str, validate: bool = True) -> Annotations:
+    """Load annotations from a JSON file; pass ``validate=False`` for trusted files."""
     logger.info(f"Loading annotations from {filepath}")
     try:
-        with open(filepath, 'r') as file:
-            data = json.load(file)
-        PREP_COUNTER.inc()
-        return Annotations(annotations=data)
+        data = load_json(filepath)
+        if validate:
+            return Annotations(annotations=data)
+        return Annotations.construct(annotations={
+            filename: {
+                line_num: [CharRange.construct(**char_range) for char_range in ranges]
+                for line_num, ranges in lines.items()
+            }
+            for filename, lines in data.items()
+        })
     except FileNotFoundError:
         logger.error(f"Annotations file not found: {filepath}")
         raise
@@ -47,89 +87,32 @@ def load_json_annotations(filepath: str) -> Annotations:
         logger.error(f"Invalid JSON in annotations file: {filepath}")
         raise
 
-@PREP_DURATION.time()
-def get_context_lines(file_content: List[str], line_number: int, context_range: int = 5) -> List[str]:
-    """Extract context lines around a specific line in a file."""
-    start = max(0, line_number - context_range - 1)
-    end = min(len(file_content), line_number + context_range)
-    return [' '.join(line.strip().split()) for line in file_content[start:end]]
-
-@PREP_DURATION.time()
-def enhance_annotations_with_negatives(
-    annotations: Annotations,
-    dataset_directory: str,
-    context_range: int = 5,
-    neg_samples_per_positive: int = 1
-) -> EnhancedAnnotations:
-    """Enhance annotations with context lines and add negative samples."""
-    logger.info("Enhancing annotations with negatives")
-    enhanced_annotations: Dict[str, Dict[str, AnnotationSample]] = {}
-    for filename in os.listdir(dataset_directory):
-        file_path = os.path.join(dataset_directory, filename)
-        try:
-            with open(file_path, 'r') as file:
-                file_lines = file.readlines()
-        except FileNotFoundError:
-            logger.warning(f"File not found: {file_path}")
-            continue
-        except IOError:
-            logger.warning(f"Error reading file: {file_path}")
-            continue
-
-        file_annotations = annotations.annotations.get(filename, {})
-        enhanced_annotations[filename] = {}
-
-        for line_num, char_ranges in file_annotations.items():
-            line_num_int = int(line_num)
-            context = get_context_lines(file_lines, line_num_int, context_range)
-            enhanced_annotations[filename][line_num] = AnnotationSample(
-                context=context,
-                char_ranges=char_ranges,
-                is_vulnerable=1
-            )
-
-            all_line_nums = set(range(len(file_lines)))
-            non_vul_lines = all_line_nums - set(range(max(0, line_num_int - context_range), 
-                                                      min(len(file_lines), line_num_int + context_range + 1)))
-
-            for _ in range(neg_samples_per_positive):
-                if not non_vul_lines:
-                    break
-                non_vul_line_num = random.choice(list(non_vul_lines))
-                non_vul_context = get_context_lines(file_lines, non_vul_line_num, context_range)
-                enhanced_annotations[filename][str(non_vul_line_num)] = AnnotationSample(
-                    context=non_vul_context,
-                    char_ranges=[],
-                    is_vulnerable=0
-                )
-                non_vul_lines.remove(non_vul_line_num)
-
-    PREP_COUNTER.inc()
-    return EnhancedAnnotations(annotations=enhanced_annotations)
-
-@PREP_DURATION.time()
-def save_enhanced_annotations(annotations: EnhancedAnnotations, filepath: str) -> None:
-    """Save the enhanced annotations to a JSON file."""
-    logger.info(f"Saving enhanced annotations to {filepath}")
-    try:
-        with open(filepath, 'w') as file:
-            json.dump(annotations.dict(), file, indent=4)
-        PREP_COUNTER.inc()
-    except IOError:
-        logger.error(f"Error writing enhanced annotations to file: {filepath}")
-        raise
+def run_analysis(
+    annotations_file: str = ANNOTATIONS_FILE,
+    dataset_directory: str = DATASET_DIRECTORY,
+    output_file: str = ENHANCED_ANNOTATIONS_FILE,
+    seed: Optional[int] = ENHANCEMENT_SEED,
+    workers: int = 1,
+    profile: Optional[str] = None
+) -> int:
+    """Enhance every annotated file and stream the samples to ``output_file``; returns the sample count."""
+    return PIPELINE.run(
+        annotations_file, dataset_directory, output_file, seed, workers, profile, cache_directory=ENHANCEMENT_CACHE_DIRECTORY
+    )
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enhance annotations with context and negative samples.")
+    parser.add_argument("--profile", metavar="DIR", help=f"profile the run into DIR (or set {PROFILE_ENV})")
+    args = parser.parse_args()
+
     # Start Prometheus metrics server
-    start_http_server(8000)
+    start_http_server(8000, registry=REGISTRY)
 
     try:
-        annotations = load_json_annotations(ANNOTATIONS_FILE)
-        enhanced_annotations = enhance_annotations_with_negatives(annotations, DATASET_DIRECTORY)
-        save_enhanced_annotations(enhanced_annotations, 'enhanced_annotations.json')
+        run_analysis(profile=args.profile)
 
         # Print a sample of the enhanced annotations for demonstration
-        for key, value in list(enhanced_annotations.annotations.items())[:1]:
-            print(key, "\n\t", json.dumps(value, indent=4))
+        for filename, line_num, sample in islice(iter_saved_enhanced_annotations(ENHANCED_ANNOTATIONS_FILE), 1):
+            print(filename, line_num, "\n\t", json.dumps(sample.dict(), indent=4))
     except Exception as e:
-        logger.exception(f"An error occurred during data preparation: {str(e)}")
\ No newline at end of file
+        logger.exception(f"An error occurred during data preparation: {str(e)}")
@@ -0,0 +1,38 @@
+import fnmatch
+import os
+from typing import Iterable, List, Optional
+
+
+def is_dataset_filename(filename: str) -> bool:
+    """True if ``filename`` names an entry directly inside the (flat) dataset directory."""
+    return (
+        bool(filename)
+        and filename not in ('.', '..')
+        and os.path.basename(filename) == filename
+        and (os.altsep is None or os.altsep not in filename)
+    )
+
+
+def select_dataset_files(
+    dataset_directory: str,
+    annotated_files: Iterable[str],
+    files: Optional[Iterable[str]] = None,
+    pattern: Optional[str] = None
+) -> List[str]:
+    """Choose which dataset files to enhance.
+
+    By default only the annotated files are visited, so the cost scales with the
+    annotations rather than the directory size. An explicit ``files`` list takes
+    precedence; otherwise ``pattern`` (a glob) selects from the directory listing.
+    Raises ValueError for names that would escape the dataset directory.
+    """
+    if files is not None:
+        selected = list(dict.fromkeys(files))
+    elif pattern is not None:
+        selected = sorted(fnmatch.filter(os.listdir(dataset_directory), pattern))
+    else:
+        selected = list(annotated_files)
+    invalid = [filename for filename in selected if not is_dataset_filename(filename)]
+    if invalid:
+        raise ValueError(f"Invalid dataset file names: {invalid}")
+    return selected
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from json_codec import dumps, load_json
+
+# Bump when the enhancement output changes for the same inputs, to invalidate old entries.
+CACHE_VERSION = 1
+_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(file_path: str) -> str:
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EnhancementCache:
+    """On-disk cache of per-file enhanced samples.
+
+    Entries are keyed by the file's content hash, its annotation entries and the
+    enhancement parameters, so a file is only re-enhanced when one of those changes.
+    Writes go through a temporary file and ``os.replace``, so concurrent workers never
+    observe a partial entry.
+    """
+
+    def __init__(self, cache_directory: str):
+        self.cache_directory = cache_directory
+        os.makedirs(cache_directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash: str, annotation_entries: Any, **params: Any) -> str:
+        # Always the stdlib encoder with sorted keys, so keys do not depend on the JSON backend.
+        payload = json.dumps(
+            {"version": CACHE_VERSION, "content": content_hash, "annotations": annotation_entries, "params": params},
+            sort_keys=True,
+            separators=(',', ':'),
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_directory, key[:2], key + '.json')
+
+    def get(self, key: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Return the cached samples for ``key``, or None on a miss or unreadable entry."""
+        try:
+            return load_json(self._path(key))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, samples: Dict[str, Dict[str, Any]]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(dumps(samples))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
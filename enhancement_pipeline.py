@@ -0,0 +1,329 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Type, Union
+from pydantic import BaseModel
+from loguru import logger
+from negative_sampler import NegativeSampler, derive_file_seed
+from jsonl_io import read_jsonl, write_jsonl
+from json_codec import dump_json
+from enhancement_cache import EnhancementCache
+from line_index import LineIndex, default_index_directory
+from annotation_store import AnnotationStore, FileAnnotations, load_annotation_store
+from dataset_files import select_dataset_files
+from memory_cache import FileCache
+from prep_metrics import PipelineMetrics
+from profiling import profile_directory, profiled_run
+
+def get_context_lines(file_content: List[str], line_number: int, context_range: int = 5) -> List[str]:
+    """Extract context lines around a specific line in a file."""
+    start = max(0, line_number - context_range - 1)
+    end = min(len(file_content), line_number + context_range)
+    return [' '.join(line.strip().split()) for line in file_content[start:end]]
+
+
+class EnhancementPipeline:
+    """Enhance annotated lines with context and negative samples, for one sample model.
+
+    data_prep and dataset_analyzer share this pipeline and differ only in their pydantic
+    models: a script subclasses it, sets ``sample_model`` and ``enhanced_model`` (and
+    ``annotations_model`` when annotations arrive wrapped in a model), and overrides the
+    char range hooks when its ranges are not plain ``[start, end]`` lists. Samples are
+    built from data the pipeline produced or already validated, so they are created with
+    pydantic's ``construct`` (no validation) and converted to and from plain records by
+    hand rather than through ``.dict()`` and re-validation.
+
+    Instances pickle as their class and module name, so bound methods can be sent to
+    ProcessPoolExecutor workers; each worker binds its own metrics.
+    """
+
+    sample_model: Type[BaseModel]
+    enhanced_model: Type[BaseModel]
+    annotations_model: Optional[Type[BaseModel]] = None
+
+    def __init__(self, module: str):
+        self.module = module
+        self.metrics = PipelineMetrics(module)
+
+    def __reduce__(self):
+        return type(self), (self.module,)
+
+    def annotation_char_ranges(self, annotation: Any) -> List[Any]:
+        """Char ranges of one annotated line as given by callers."""
+        return annotation
+
+    def stored_char_ranges(self, char_ranges: List[List[int]]) -> List[Any]:
+        """Char ranges of one line of an ``AnnotationStore``."""
+        return char_ranges
+
+    def char_ranges_record(self, char_ranges: List[Any]) -> List[Any]:
+        """JSON-ready form of a sample's char ranges."""
+        return char_ranges
+
+    def char_ranges_from_record(self, records: List[Any]) -> List[Any]:
+        """Char ranges rebuilt from ``char_ranges_record`` output."""
+        return records
+
+    def sample_record(self, sample: BaseModel) -> Dict[str, Any]:
+        """JSON-ready fields of a sample."""
+        return {
+            "context": sample.context,
+            "char_ranges": self.char_ranges_record(sample.char_ranges),
+            "is_vulnerable": sample.is_vulnerable,
+        }
+
+    def sample_from_record(self, record: Dict[str, Any]) -> BaseModel:
+        """Rebuild a sample from ``sample_record`` output without validating it."""
+        return self.sample_model.construct(
+            context=record["context"],
+            char_ranges=self.char_ranges_from_record(record["char_ranges"]),
+            is_vulnerable=record["is_vulnerable"],
+        )
+
+    def enhanced_annotations_payload(self, annotations: BaseModel) -> Dict:
+        """JSON-ready form of ``annotations``."""
+        return {"annotations": {
+            filename: {line_num: self.sample_record(sample) for line_num, sample in samples.items()}
+            for filename, samples in annotations.annotations.items()
+        }}
+
+    def load_stored_annotations(self, filepath: str) -> AnnotationStore:
+        """Load annotations into a columnar store, reusing its binary copy while the JSON is unchanged."""
+        logger.info(f"Loading annotation store for {filepath}")
+        with self.metrics.stage("load"):
+            try:
+                return load_annotation_store(filepath)
+            except FileNotFoundError:
+                logger.error(f"Annotations file not found: {filepath}")
+                raise
+            except ValueError:
+                logger.error(f"Invalid annotations file: {filepath}")
+                raise
+
+    def annotated_lines(self, file_annotations: Union[Mapping[str, Any], FileAnnotations]) -> List[Tuple[int, List[Any]]]:
+        """``(line, char_ranges)`` pairs of one file, from the annotation store or from models."""
+        if isinstance(file_annotations, FileAnnotations):
+            return [(line, self.stored_char_ranges(char_ranges)) for line, char_ranges in file_annotations]
+        return [
+            (int(line_num), self.annotation_char_ranges(annotation))
+            for line_num, annotation in file_annotations.items()
+        ]
+
+    def enhance_file_annotations(
+        self,
+        file_path: str,
+        file_annotations: Union[Mapping[str, Any], FileAnnotations],
+        context_range: int = 5,
+        neg_samples_per_positive: int = 1,
+        seed: Optional[int] = None,
+        cache_directory: Optional[str] = None,
+        index_directory: Optional[str] = None,
+        line_cache: Optional[FileCache[LineIndex]] = None
+    ) -> Optional[Dict[str, BaseModel]]:
+        """Enhance the annotations of a single file, or return None if it cannot be read.
+
+        With ``cache_directory`` set, samples are reused from an earlier run when the file
+        content, its annotations and the enhancement parameters are all unchanged. The file
+        is read through a memory-mapped ``LineIndex``, persisted under ``index_directory``
+        when given, or taken from ``line_cache`` when the caller keeps files in memory.
+        """
+        try:
+            with self.metrics.stage("read_file"):
+                if line_cache is not None:
+                    line_index = line_cache.get(file_path)
+                else:
+                    line_index = LineIndex(file_path, index_directory)
+        except FileNotFoundError:
+            logger.warning(f"File not found: {file_path}")
+            return None
+        except IOError:
+            logger.warning(f"Error reading file: {file_path}")
+            return None
+
+        annotated = self.annotated_lines(file_annotations)
+        with line_index:
+            cache_key = None
+            if cache_directory is not None:
+                cache = EnhancementCache(cache_directory)
+                cache_key = cache.make_key(
+                    line_index.content_hash(),
+                    {str(line): self.char_ranges_record(char_ranges) for line, char_ranges in annotated},
+                    context_range=context_range,
+                    neg_samples_per_positive=neg_samples_per_positive,
+                    seed=seed,
+                )
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    return {line_num: self.sample_from_record(sample) for line_num, sample in cached.items()}
+
+            enhanced: Dict[str, BaseModel] = {}
+            with self.metrics.stage("enhance"):
+                for line, char_ranges in annotated:
+                    context = line_index.context_lines(line, context_range)
+                    enhanced[str(line)] = self.sample_model.construct(
+                        context=context,
+                        char_ranges=char_ranges,
+                        is_vulnerable=1
+                    )
+
+            with self.metrics.stage("sample_negatives"):
+                sampler = NegativeSampler(len(line_index), (line for line, _ in annotated), context_range)
+                rng = random.Random(seed)
+                for non_vul_line_num in sampler.sample(len(annotated) * neg_samples_per_positive, rng):
+                    non_vul_context = line_index.context_lines(non_vul_line_num, context_range)
+                    enhanced[str(non_vul_line_num)] = self.sample_model.construct(
+                        context=non_vul_context,
+                        char_ranges=[],
+                        is_vulnerable=0
+                    )
+
+        if cache_key is not None:
+            cache.put(cache_key, {line_num: self.sample_record(sample) for line_num, sample in enhanced.items()})
+        return enhanced
+
+    def iter_enhanced_annotations(
+        self,
+        annotations: Union[Mapping[str, Mapping[str, Any]], BaseModel, AnnotationStore],
+        dataset_directory: str,
+        context_range: int = 5,
+        neg_samples_per_positive: int = 1,
+        seed: Optional[int] = None,
+        workers: int = 1,
+        cache_directory: Optional[str] = None,
+        index_directory: Optional[str] = None,
+        line_cache: Optional[FileCache[LineIndex]] = None,
+        files: Optional[Iterable[str]] = None,
+        pattern: Optional[str] = None
+    ) -> Iterator[Tuple[str, Dict[str, BaseModel]]]:
+        """Yield ``(filename, samples)`` for each readable selected file in the dataset directory.
+
+        Only the annotated files are visited unless an explicit ``files`` list or a glob
+        ``pattern`` is given (see ``select_dataset_files``), so the cost is proportional to
+        the annotations rather than to the size of the directory.
+
+        Each file is sampled with its own seed derived from ``seed`` and its filename, so
+        the result is the same whether files are processed serially or across ``workers``
+        processes. Parallel work is submitted in bounded batches to keep memory flat. Pass a
+        fixed ``seed`` together with ``cache_directory`` so unchanged files hit the cache.
+        With an ``AnnotationStore``, workers are sent only each file's column slices.
+        """
+        if workers > 1 and line_cache is not None:
+            raise ValueError("line_cache is process-local and cannot be combined with workers > 1")
+        base_seed = random.getrandbits(32) if seed is None else seed
+        if self.annotations_model is not None and isinstance(annotations, self.annotations_model):
+            annotations = annotations.annotations
+        if isinstance(annotations, AnnotationStore):
+            annotated_files, file_annotations = annotations.filenames, annotations.file_annotations
+        else:
+            annotated_files, file_annotations = annotations, lambda filename: annotations.get(filename, {})
+        filenames = select_dataset_files(dataset_directory, annotated_files, files, pattern)
+
+        def file_args(batch: List[str]):
+            return (
+                [os.path.join(dataset_directory, filename) for filename in batch],
+                [file_annotations(filename) for filename in batch],
+                repeat(context_range),
+                repeat(neg_samples_per_positive),
+                [derive_file_seed(base_seed, filename) for filename in batch],
+                repeat(cache_directory),
+                repeat(index_directory),
+                repeat(line_cache),
+            )
+
+        if workers > 1:
+            chunksize = max(1, min(64, len(filenames) // (workers * 4)))
+            batch_size = workers * chunksize * 4
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for offset in range(0, len(filenames), batch_size):
+                    batch = filenames[offset:offset + batch_size]
+                    results = executor.map(self.enhance_file_annotations, *file_args(batch), chunksize=chunksize)
+                    for filename, enhanced in zip(batch, results):
+                        if enhanced is not None:
+                            self.metrics.record_file(os.path.join(dataset_directory, filename), enhanced)
+                            yield filename, enhanced
+        else:
+            for filename, enhanced in zip(filenames, map(self.enhance_file_annotations, *file_args(filenames))):
+                if enhanced is not None:
+                    self.metrics.record_file(os.path.join(dataset_directory, filename), enhanced)
+                    yield filename, enhanced
+
+    def enhance_annotations_with_negatives(
+        self,
+        annotations: Union[Mapping[str, Mapping[str, Any]], BaseModel, AnnotationStore],
+        dataset_directory: str,
+        context_range: int = 5,
+        neg_samples_per_positive: int = 1,
+        seed: Optional[int] = None,
+        workers: int = 1,
+        cache_directory: Optional[str] = None,
+        index_directory: Optional[str] = None,
+        line_cache: Optional[FileCache[LineIndex]] = None,
+        files: Optional[Iterable[str]] = None,
+        pattern: Optional[str] = None
+    ) -> BaseModel:
+        """Enhance annotations with context lines and add negative samples."""
+        logger.info("Enhancing annotations with negatives")
+        with self.metrics.jobs_in_flight.track_inprogress():
+            enhanced_annotations = dict(self.iter_enhanced_annotations(
+                annotations, dataset_directory, context_range, neg_samples_per_positive, seed=seed, workers=workers,
+                cache_directory=cache_directory, index_directory=index_directory, line_cache=line_cache,
+                files=files, pattern=pattern
+            ))
+        return self.enhanced_model.construct(annotations=enhanced_annotations)
+
+    def save_enhanced_annotations(self, annotations: BaseModel, filepath: str, pretty: bool = False) -> None:
+        """Save the enhanced annotations to a JSON file, compact unless ``pretty``."""
+        logger.info(f"Saving enhanced annotations to {filepath}")
+        with self.metrics.stage("serialize"):
+            try:
+                dump_json(self.enhanced_annotations_payload(annotations), filepath, pretty)
+            except IOError:
+                logger.error(f"Error writing enhanced annotations to file: {filepath}")
+                raise
+
+    def stream_enhanced_annotations(self, enhanced: Iterable[Tuple[str, Dict[str, BaseModel]]], filepath: str) -> int:
+        """Stream enhanced samples to a JSON lines file (``.gz``/``.zst`` compressed by suffix).
+
+        Each sample is written as one compact record as soon as its file is enhanced, so
+        peak memory does not grow with the dataset. Returns the number of samples written.
+        """
+        logger.info(f"Streaming enhanced annotations to {filepath}")
+        records = (
+            {"file": filename, "line": line_num, **self.sample_record(sample)}
+            for filename, samples in enhanced
+            for line_num, sample in samples.items()
+        )
+        try:
+            count = write_jsonl(records, filepath)
+            return count
+        except IOError:
+            logger.error(f"Error writing enhanced annotations to file: {filepath}")
+            raise
+
+    def iter_saved_enhanced_annotations(self, filepath: str) -> Iterator[Tuple[str, str, BaseModel]]:
+        """Lazily read back ``(filename, line_num, sample)`` from a streamed JSON lines file."""
+        for record in read_jsonl(filepath):
+            filename = record.pop("file")
+            line_num = record.pop("line")
+            yield filename, line_num, self.sample_from_record(record)
+
+    def run(
+        self,
+        annotations_file: str,
+        dataset_directory: str,
+        output_file: str,
+        seed: Optional[int],
+        workers: int = 1,
+        profile: Optional[str] = None,
+        cache_directory: Optional[str] = None
+    ) -> int:
+        """Enhance every annotated file and stream the samples to ``output_file``; returns the sample count."""
+        with profiled_run(profile_directory(profile), self.module):
+            enhanced_annotations = self.iter_enhanced_annotations(
+                self.load_stored_annotations(annotations_file), dataset_directory, seed=seed, workers=workers,
+                cache_directory=cache_directory, index_directory=default_index_directory(dataset_directory)
+            )
+            sample_count = self.stream_enhanced_annotations(enhanced_annotations, output_file)
+        logger.info(f"Wrote {sample_count} enhanced samples to {output_file}")
+        return sample_count
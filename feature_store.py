@@ -0,0 +1,207 @@
+import bisect
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from tokenization import RaggedSequences
+
+MANIFEST_FILE = 'manifest.json'
+FEATURE_STORE_VERSION = 1
+SPLITS = ('train', 'val', 'test')
+ROWS_PER_SHARD = 10000
+# Same proportions as the in-memory path: 20% test, then 20% of the rest for validation.
+VAL_FRACTION = 0.16
+TEST_FRACTION = 0.2
+_SHARD_ARRAYS = ('values', 'offsets', 'labels', 'splits')
+
+
+def stable_row_hash(text):
+    """
+    64-bit content hash of a row, stable across runs and processes.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def assign_splits(row_hashes, val_fraction=VAL_FRACTION, test_fraction=TEST_FRACTION):
+    """
+    Map row hashes to split ids (indices into SPLITS). A row always lands in the same
+    split, no matter how the data is ordered or sharded.
+    """
+    position = (np.asarray(row_hashes, dtype=np.uint64) % np.uint64(10000)).astype(np.float64) / 10000
+    return np.where(position < test_fraction, 2, np.where(position < test_fraction + val_fraction, 1, 0)).astype(np.int8)
+
+
+def source_stamp(paths):
+    """
+    ``[path, size, mtime_ns]`` of each source file (size and mtime None when it is missing),
+    recorded in the manifest so a store can be checked against the inputs it was built from.
+    """
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamp.append([path, stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            stamp.append([path, None, None])
+    return stamp
+
+
+def _shard_array_path(directory, shard_name, array_name):
+    return os.path.join(directory, f'{shard_name}.{array_name}.npy')
+
+
+def write_feature_store(
+    directory,
+    sequences,
+    label_ids,
+    row_hashes,
+    class_names=None,
+    vocabulary_path=None,
+    rows_per_shard=ROWS_PER_SHARD,
+    source_stamp=None
+):
+    """
+    Write tokenized rows to ``directory`` as uncompressed ``.npy`` shards (flat int32
+    token values, int64 row offsets, int32 label ids, int8 split ids) plus a manifest.
+
+    The manifest of an existing store is removed before any shard is overwritten and
+    the new one is written last, so a store is only visible once it is complete. The
+    vocabulary path is stored relative to ``directory``. Returns the opened FeatureStore.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.unlink(manifest_path)
+    label_ids = np.asarray(label_ids, dtype=np.int32)
+    splits = assign_splits(row_hashes)
+    shards = []
+    for shard, start in enumerate(range(0, len(sequences), rows_per_shard)):
+        stop = min(start + rows_per_shard, len(sequences))
+        tokens = [np.asarray(sequences[row], dtype=np.int32) for row in range(start, stop)]
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum([len(row_tokens) for row_tokens in tokens], out=offsets[1:])
+        arrays = {
+            'values': np.concatenate(tokens) if tokens else np.zeros(0, dtype=np.int32),
+            'offsets': offsets,
+            'labels': label_ids[start:stop],
+            'splits': splits[start:stop],
+        }
+        name = f'shard-{shard:05d}'
+        for array_name, array in arrays.items():
+            np.save(_shard_array_path(directory, name, array_name), array)
+        shards.append({'name': name, 'rows': stop - start, 'tokens': int(offsets[-1])})
+
+    manifest = {
+        'version': FEATURE_STORE_VERSION,
+        'num_rows': len(sequences),
+        'num_classes': len(class_names) if class_names is not None else int(label_ids.max(initial=-1)) + 1,
+        'class_names': list(class_names) if class_names is not None else None,
+        'vocabulary': os.path.relpath(vocabulary_path, directory) if vocabulary_path is not None else None,
+        'source_stamp': source_stamp,
+        'shards': shards,
+    }
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, manifest_path)
+    return FeatureStore(directory)
+
+
+def feature_store_exists(directory, source_stamp=None):
+    """
+    Whether a complete store exists in ``directory`` and, when ``source_stamp`` is given,
+    was built from the same source files.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return source_stamp is None or manifest.get('source_stamp') == source_stamp
+
+
+class StoreSequences:
+    """
+    Row-addressable view over the token shards of a FeatureStore. Rows are sliced from
+    the memory-mapped shard arrays, so nothing is copied until a row is used.
+    """
+
+    def __init__(self, shards):
+        self._shards = shards
+        self._starts = [0]
+        for shard in shards:
+            self._starts.append(self._starts[-1] + len(shard))
+        self.lengths = np.concatenate([shard.lengths for shard in shards]) if shards else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return self._starts[-1]
+
+    def __getitem__(self, index):
+        shard = bisect.bisect_right(self._starts, index) - 1
+        return self._shards[shard][index - self._starts[shard]]
+
+
+class FeatureStore:
+    """
+    Read side of the on-disk feature store. Shard arrays are opened with
+    ``np.load(mmap_mode='r')``, so training and evaluation read them zero-copy.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+            self.manifest = json.load(file)
+        if self.manifest.get('version') != FEATURE_STORE_VERSION:
+            raise ValueError(f"Unsupported feature store version in {directory}: {self.manifest.get('version')}")
+
+    @property
+    def num_rows(self):
+        return self.manifest['num_rows']
+
+    @property
+    def num_classes(self):
+        return self.manifest['num_classes']
+
+    @property
+    def class_names(self):
+        return self.manifest['class_names']
+
+    @property
+    def vocabulary_path(self):
+        vocabulary = self.manifest['vocabulary']
+        return os.path.normpath(os.path.join(self.directory, vocabulary)) if vocabulary is not None else None
+
+    @property
+    def shard_names(self):
+        return [shard['name'] for shard in self.manifest['shards']]
+
+    def shard(self, name):
+        """
+        Memory-mapped arrays of one shard, keyed by 'values', 'offsets', 'labels', 'splits'.
+        """
+        return {
+            array_name: np.load(_shard_array_path(self.directory, name, array_name), mmap_mode='r')
+            for array_name in _SHARD_ARRAYS
+        }
+
+    def sequences(self):
+        shards = []
+        for name in self.shard_names:
+            arrays = self.shard(name)
+            shards.append(RaggedSequences(arrays['values'], arrays['offsets']))
+        return StoreSequences(shards)
+
+    def labels(self):
+        return self._concatenate('labels', np.int32)
+
+    def splits(self):
+        return self._concatenate('splits', np.int8)
+
+    def split_indices(self, split):
+        return np.flatnonzero(self.splits() == SPLITS.index(split))
+
+    def _concatenate(self, array_name, dtype):
+        arrays = [self.shard(name)[array_name] for name in self.shard_names]
+        return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
@@ -0,0 +1,113 @@
+import json
+from typing import List, Optional
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+from loguru import logger
+
+from bounded_executor import QueueFullError
+from bucketing import pad_batch
+from micro_batcher import MicroBatcher
+from simple_preprocesing import CLASS_MAP_FILE, MAX_SEQUENCE_LENGTH, MODEL_FILE, VOCABULARY_FILE
+from tokenization import Vocabulary
+
+# Constants
+PREDICT_MAX_BATCH_SIZE = 128
+PREDICT_MAX_DELAY_MS = 5.0
+PREDICT_MAX_PENDING = 8192
+# Serving truncates exactly like training when training caps sequences. Training on whole
+# files (MAX_SEQUENCE_LENGTH = None) still needs a cap here to bound per-request memory, so
+# snippets longer than 1000 tokens are scored on their first 1000 tokens only.
+PREDICT_MAX_LENGTH = MAX_SEQUENCE_LENGTH or 1000
+PREDICT_MAX_SOURCES = 256
+
+# FastAPI app
+app = FastAPI()
+
+# Pydantic models
+class PredictRequest(BaseModel):
+    sources: List[str] = Field(..., min_items=1, max_items=PREDICT_MAX_SOURCES)
+
+class Prediction(BaseModel):
+    label: str
+    score: float
+
+class PredictResponse(BaseModel):
+    predictions: List[Prediction]
+
+class VulnerabilityClassifier:
+    """Saved model, vocabulary and class names, scoring source snippets one padded batch at a time."""
+
+    def __init__(self, model, vocabulary: Vocabulary, class_names: List[str], max_length: Optional[int] = PREDICT_MAX_LENGTH):
+        self.model = model
+        self.vocabulary = vocabulary
+        self.class_names = class_names
+        # Models built with a fixed input_length need exactly that width; variable-length
+        # models get each batch padded only to its own longest snippet.
+        self.input_length = model.input_shape[1]
+        self.max_length = self.input_length or max_length
+
+    @classmethod
+    def load(cls, model_path: str, vocabulary_path: str, class_map_path: str) -> "VulnerabilityClassifier":
+        """Load the classifier artifacts written by simple_preprocesing.main."""
+        from keras.models import load_model
+        logger.info(f"Loading model from {model_path}")
+        with open(class_map_path, 'r', encoding='utf-8') as file:
+            class_names = json.load(file)
+        return cls(load_model(model_path), Vocabulary.load(vocabulary_path), class_names)
+
+    def encode(self, sources: List[str]) -> np.ndarray:
+        """Tokenize and post-pad ``sources`` into one int32 batch."""
+        sequences = self.vocabulary.encode(sources)
+        batch = pad_batch(sequences, range(len(sequences)), self.max_length)
+        if self.input_length is not None and batch.shape[1] < self.input_length:
+            batch = np.pad(batch, ((0, 0), (0, self.input_length - batch.shape[1])))
+        return batch
+
+    def predict(self, sources: List[str]) -> List[Prediction]:
+        """Score a batch of snippets; one Prediction per source."""
+        # predict_on_batch skips the per-call dataset setup of model.predict, which
+        # dominates latency for the small batches a micro-batcher produces.
+        probabilities = np.asarray(self.model.predict_on_batch(self.encode(sources)))
+        class_ids = probabilities.argmax(axis=1)
+        return [
+            Prediction(label=self.class_names[class_id], score=float(row[class_id]))
+            for class_id, row in zip(class_ids, probabilities)
+        ]
+
+CLASSIFIER: Optional[VulnerabilityClassifier] = None
+BATCHER: Optional[MicroBatcher] = None
+
+@app.on_event("startup")
+async def load_classifier():
+    global CLASSIFIER, BATCHER
+    CLASSIFIER = VulnerabilityClassifier.load(MODEL_FILE, VOCABULARY_FILE, CLASS_MAP_FILE)
+    BATCHER = MicroBatcher(
+        CLASSIFIER.predict,
+        max_batch_size=PREDICT_MAX_BATCH_SIZE,
+        max_delay_ms=PREDICT_MAX_DELAY_MS,
+        max_pending=PREDICT_MAX_PENDING
+    )
+    BATCHER.start()
+
+@app.on_event("shutdown")
+async def stop_classifier():
+    if BATCHER is not None:
+        await BATCHER.stop()
+
+@app.post("/predict", response_model=PredictResponse)
+async def api_predict(request: PredictRequest):
+    if BATCHER is None or not BATCHER.running:
+        raise HTTPException(status_code=503, detail="Model not loaded", headers={"Retry-After": "1"})
+    try:
+        return PredictResponse(predictions=await BATCHER.submit(request.sources))
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.exception("Error in predict endpoint")
+        raise HTTPException(status_code=500, detail=str(e))
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -0,0 +1,100 @@
+import json
+import os
+from typing import Any, Callable, Optional
+
+# "auto" picks the fastest installed backend: orjson, then msgspec, then the stdlib.
+JSON_BACKEND_ENV = "DATA_PREP_JSON_BACKEND"
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+class JsonCodec:
+    """A JSON backend behind one interface: ``loads`` accepts bytes or str, ``dumps``
+    returns compact UTF-8 bytes (``pretty=True`` indents), and decode errors are always
+    raised as ``json.JSONDecodeError`` so callers need not know the backend.
+    """
+
+    def __init__(self, name: str, loads: Callable[[Any], Any], dumps: Callable[[Any], bytes], dumps_pretty: Callable[[Any], bytes]):
+        self.name = name
+        self.loads = loads
+        self._dumps = dumps
+        self._dumps_pretty = dumps_pretty
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        return self._dumps_pretty(obj) if pretty else self._dumps(obj)
+
+    def __repr__(self) -> str:
+        return f"JsonCodec({self.name!r})"
+
+
+def _stdlib_codec() -> JsonCodec:
+    return JsonCodec(
+        "json",
+        json.loads,
+        lambda obj: json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8'),
+        lambda obj: json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8'),
+    )
+
+
+def _orjson_codec() -> JsonCodec:
+    import orjson
+    # orjson.JSONDecodeError already subclasses json.JSONDecodeError.
+    return JsonCodec("orjson", orjson.loads, orjson.dumps, lambda obj: orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+
+
+def _msgspec_codec() -> JsonCodec:
+    import msgspec
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def loads(data: Any) -> Any:
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), data if isinstance(data, str) else '', 0) from e
+
+    return JsonCodec(
+        "msgspec", loads, encoder.encode, lambda obj: msgspec.json.format(encoder.encode(obj), indent=2)
+    )
+
+
+_FACTORIES = {"orjson": _orjson_codec, "msgspec": _msgspec_codec, "json": _stdlib_codec}
+
+
+def get_codec(backend: Optional[str] = None) -> JsonCodec:
+    """Return the codec for ``backend`` ("auto" or None for the fastest installed one).
+
+    Asking for a specific backend that is not installed raises ImportError.
+    """
+    backend = backend or "auto"
+    if backend != "auto":
+        if backend not in _FACTORIES:
+            raise ValueError(f"Unknown JSON backend {backend!r}; expected one of {BACKENDS} or 'auto'")
+        return _FACTORIES[backend]()
+    for name in ("orjson", "msgspec"):
+        try:
+            return _FACTORIES[name]()
+        except ImportError:
+            continue
+    return _stdlib_codec()
+
+
+CODEC = get_codec(os.environ.get(JSON_BACKEND_ENV))
+
+
+def loads(data: Any) -> Any:
+    return CODEC.loads(data)
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    return CODEC.dumps(obj, pretty)
+
+
+def load_json(filepath: str) -> Any:
+    """Parse a JSON file in one read, without going through a text stream."""
+    with open(filepath, 'rb') as file:
+        return CODEC.loads(file.read())
+
+
+def dump_json(obj: Any, filepath: str, pretty: bool = False) -> None:
+    with open(filepath, 'wb') as file:
+        file.write(CODEC.dumps(obj, pretty))
@@ -0,0 +1,47 @@
+import gzip
+import io
+from typing import IO, Any, Dict, Iterable, Iterator
+
+from json_codec import CODEC
+
+GZIP_SUFFIX = ".gz"
+ZSTD_SUFFIX = ".zst"
+
+
+def _require_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("Reading or writing .zst files requires the 'zstandard' package") from e
+    return zstandard
+
+
+def open_binary(filepath: str, mode: str = 'r') -> IO[bytes]:
+    """Open a file in binary mode, transparently (de)compressing ``.gz`` and ``.zst`` paths."""
+    if filepath.endswith(GZIP_SUFFIX):
+        return gzip.open(filepath, mode + 'b')
+    if filepath.endswith(ZSTD_SUFFIX):
+        zstandard = _require_zstandard()
+        raw = open(filepath, mode + 'b')
+        if mode == 'w':
+            return zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(filepath, mode + 'b')
+
+
+def write_jsonl(records: Iterable[Dict[str, Any]], filepath: str) -> int:
+    """Write records as compact JSON lines as they are produced; returns the record count."""
+    count = 0
+    with open_binary(filepath, 'w') as file:
+        for record in records:
+            file.write(CODEC.dumps(record) + b'\n')
+            count += 1
+    return count
+
+
+def read_jsonl(filepath: str) -> Iterator[Dict[str, Any]]:
+    """Lazily yield the records of a JSON lines file."""
+    with open_binary(filepath, 'r') as file:
+        for line in file:
+            if line.strip():
+                yield CODEC.loads(line)
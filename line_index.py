@@ -0,0 +1,170 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+_INDEX_MAGIC = b'LIDX1\0\0\0'
+_INDEX_HEADER = struct.Struct('<8sqqq')  # magic, file size, file mtime_ns, offset count
+# Rough cost of one entry in the normalized-line dict (hash slot, key and index), on top
+# of the line string itself.
+_NORMALIZED_ENTRY_BYTES = 64
+
+
+def build_line_offsets(buffer) -> array:
+    """Return the byte offset of every line start plus a final end-of-buffer sentinel.
+
+    Lines are split on ``\\n`` only and a trailing newline does not start a new line, so
+    the line count matches ``readlines()`` on the file opened in binary mode. Unlike text
+    mode, a bare ``\\r`` is not a line break; the ``\\r`` of ``\\r\\n`` endings is dropped
+    when lines are normalized.
+    """
+    size = len(buffer)
+    offsets = array('q', [0] if size else [])
+    position = buffer.find(b'\n')
+    while position != -1 and position + 1 < size:
+        offsets.append(position + 1)
+        position = buffer.find(b'\n', position + 1)
+    offsets.append(size)
+    return offsets
+
+
+def default_index_directory(dataset_directory: str) -> str:
+    """Directory next to (not inside) the dataset where line indexes are persisted."""
+    return os.path.normpath(dataset_directory) + '.lineidx'
+
+
+class LineIndex:
+    """Memory-mapped, line-addressable view of a source file.
+
+    The line-offset index is built once per file (or loaded from ``index_directory`` when
+    the persisted copy still matches the file's size and mtime), and context windows are
+    sliced from the mapping by byte offsets. Normalized lines are cached so overlapping
+    windows only normalize each line once.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        index_directory: Optional[str] = None,
+        encoding: str = 'utf-8',
+        data: Optional[bytes] = None
+    ):
+        self.file_path = file_path
+        self.index_directory = index_directory
+        self.encoding = encoding
+        self._normalized: Dict[int, str] = {}
+        self._normalized_bytes = 0
+        self._offsets: Optional[array] = None
+        if data is not None:
+            # In-memory content (e.g. held by a cache); the index is never persisted.
+            self.index_directory = None
+            self._size = len(data)
+            self._mtime_ns = None
+            self.buffer = data
+            return
+        with open(file_path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            self._size = stat.st_size
+            self._mtime_ns = stat.st_mtime_ns
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else b''
+
+    def __enter__(self) -> 'LineIndex':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @classmethod
+    def read(cls, file_path: str, encoding: str = 'utf-8') -> 'LineIndex':
+        """Read the whole file into memory, for callers that keep the index around."""
+        with open(file_path, 'rb') as file:
+            return cls(file_path, encoding=encoding, data=file.read())
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held: the content, the line offsets (once built) and the
+        normalized lines cached so far."""
+        offsets = self._offsets
+        offset_bytes = len(offsets) * offsets.itemsize if offsets is not None else 0
+        return len(self.buffer) + offset_bytes + self._normalized_bytes
+
+    @property
+    def offsets(self) -> array:
+        if self._offsets is None:
+            self._offsets = self._load_offsets()
+            if self._offsets is None:
+                self._offsets = build_line_offsets(self.buffer)
+                self._save_offsets()
+        return self._offsets
+
+    def _index_path(self) -> Optional[str]:
+        if self.index_directory is None:
+            return None
+        return os.path.join(self.index_directory, os.path.basename(self.file_path) + '.idx')
+
+    def _load_offsets(self) -> Optional[array]:
+        index_path = self._index_path()
+        if index_path is None:
+            return None
+        try:
+            with open(index_path, 'rb') as file:
+                magic, size, mtime_ns, count = _INDEX_HEADER.unpack(file.read(_INDEX_HEADER.size))
+                if (magic, size, mtime_ns) != (_INDEX_MAGIC, self._size, self._mtime_ns):
+                    return None
+                offsets = array('q')
+                offsets.fromfile(file, count)
+                return offsets
+        except (FileNotFoundError, struct.error, EOFError):
+            return None
+
+    def _save_offsets(self) -> None:
+        index_path = self._index_path()
+        if index_path is None:
+            return
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        # Persisting is only an optimization: on a read-only or full volume the offsets
+        # stay in memory and the run carries on.
+        try:
+            os.makedirs(self.index_directory, exist_ok=True)
+            with open(temp_path, 'wb') as file:
+                file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, self._size, self._mtime_ns, len(self._offsets)))
+                self._offsets.tofile(file)
+            os.replace(temp_path, index_path)
+        except OSError as e:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            logger.warning(f"Could not persist line index {index_path}: {e}")
+
+    def content_hash(self) -> str:
+        """sha256 hex digest of the mapped content."""
+        return hashlib.sha256(self.buffer).hexdigest()
+
+    def normalized_line(self, index: int) -> str:
+        """Return the 0-based line ``index`` with whitespace runs collapsed, as in ``get_context_lines``."""
+        line = self._normalized.get(index)
+        if line is None:
+            offsets = self.offsets
+            raw = self.buffer[offsets[index]:offsets[index + 1]].decode(self.encoding, errors='replace')
+            line = self._normalized[index] = ' '.join(raw.split())
+            self._normalized_bytes += sys.getsizeof(line) + _NORMALIZED_ENTRY_BYTES
+        return line
+
+    def context_lines(self, line_number: int, context_range: int = 5) -> List[str]:
+        """Extract normalized context lines around a 1-based line, like ``get_context_lines``."""
+        start = max(0, line_number - context_range - 1)
+        end = min(len(self), line_number + context_range)
+        return [self.normalized_line(index) for index in range(start, end)]
@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+FileStamp = Tuple[int, int, int]
+
+
+def file_stamp(path: str) -> FileStamp:
+    """Identify a file version by inode, size and mtime."""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class FileCache(Generic[T]):
+    """Thread-safe, process-level cache of ``loader(path)`` results.
+
+    Every ``get`` re-stats the file and reloads it when its inode, size or mtime changed.
+    With ``max_bytes`` set, entries are weighed by ``weigher(value)`` (default: the file
+    size) and the least recently used ones are evicted once the total exceeds the bound;
+    values heavier than the bound are loaded but not cached. Values that grow while
+    cached are re-weighed on every hit.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], T],
+        max_bytes: Optional[int] = None,
+        weigher: Optional[Callable[[T], int]] = None
+    ):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.weigher = weigher
+        self.current_bytes = 0
+        self._entries: 'OrderedDict[str, Tuple[FileStamp, T, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: Any) -> bool:
+        return path in self._entries
+
+    def get(self, path: str) -> T:
+        stamp = file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                if self.weigher is not None:
+                    self._store(path, stamp, entry[1], self.weigher(entry[1]))
+                return entry[1]
+
+        value = self.loader(path)
+        size = self.weigher(value) if self.weigher is not None else stamp[1]
+        with self._lock:
+            self._store(path, stamp, value, size)
+        return value
+
+    def _store(self, path: str, stamp: FileStamp, value: T, size: int) -> None:
+        self._discard(path)
+        if self.max_bytes is None or size <= self.max_bytes:
+            self._entries[path] = (stamp, value, size)
+            self.current_bytes += size
+            while self.max_bytes is not None and self.current_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
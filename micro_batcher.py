@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from bounded_executor import QueueFullError
+
+
+class MicroBatcher:
+    """Collects concurrent asyncio requests into batches for one blocking batch function.
+
+    A batch is dispatched once ``max_batch_size`` items are waiting or ``max_delay_ms``
+    has passed since its first item arrived. ``batch_fn`` maps a list of items to a list
+    of results and runs on ``executor``, so the event loop keeps accepting requests
+    (and filling the next batch) while a batch is being computed.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 64,
+        max_delay_ms: float = 5.0,
+        max_pending: int = 4096,
+        executor: Optional[Executor] = None
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.max_pending = max_pending
+        self._executor = executor or ThreadPoolExecutor(max_workers=1)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the batching loop and fail requests that were still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _fail([self._queue.get_nowait()], RuntimeError("Micro-batcher stopped"))
+
+    async def submit(self, items: Sequence[Any]) -> List[Any]:
+        """Queue ``items`` and wait for their results, in order."""
+        if not self.running:
+            raise RuntimeError("Micro-batcher is not running")
+        if self._queue.qsize() + len(items) > self.max_pending:
+            raise QueueFullError(f"{self.max_pending} items already pending")
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        for item, future in zip(items, futures):
+            self._queue.put_nowait((item, future))
+        return list(await asyncio.gather(*futures))
+
+    async def _next_batch(self) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        try:
+            while len(batch) < self.max_batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+        except asyncio.CancelledError:
+            # Already taken off the queue, so stop() would never see these requests.
+            _fail(batch, RuntimeError("Micro-batcher stopped"))
+            raise
+        # Requests whose client went away are dropped before doing any work for them.
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            computing = loop.run_in_executor(self._executor, self.batch_fn, [item for item, _ in batch])
+            try:
+                # Wait without awaiting the result: a batch_fn error is handed to callers as
+                # is, and never re-raised here, so its traceback holds no frame of this loop.
+                await asyncio.wait([computing])
+            except asyncio.CancelledError:
+                _fail(batch, RuntimeError("Micro-batcher stopped"))
+                raise
+            if computing.exception() is not None:
+                _fail(batch, computing.exception())
+                continue
+            results = list(computing.result())
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            if len(results) < len(batch):
+                _fail(batch[len(results):], RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(batch)} items"
+                ))
+
+
+def _fail(batch: List[Tuple[Any, asyncio.Future]], error: BaseException) -> None:
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(error)
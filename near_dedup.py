@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs become candidates from a Jaccard similarity of about
+# (1/16) ** (1/8) ~= 0.71, just under the default threshold, and are then verified.
+NUM_BANDS = 16
+SHINGLE_SIZE = 5
+SIMILARITY_THRESHOLD = 0.8
+DEDUP_CHUNKSIZE = 1000
+DEDUP_SEED = 1
+REPORT_TOP_CLUSTERS = 20
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SHINGLE_MULTIPLIER = np.uint64(1000003)
+
+# Comments match the unnamed alternative, so findall returns '' for them; everything
+# else is returned verbatim. String literals are matched before comments can start
+# inside them.
+_TOKEN_PATTERN = re.compile(r"""
+      //[^\n]*|/\*.*?\*/
+    | ("(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|[A-Za-z_]\w*|\d[\w.]*|\S)
+""", re.S | re.X)
+_TOKEN_CACHE_LIMIT = 1000000
+_COMMENT = -1
+
+# Identifiers kept verbatim: C keywords and the library calls that decide whether a
+# program is vulnerable (strcpy vs strncpy). Renaming variables therefore leaves the
+# normalized tokens unchanged, while swapping a bounded call for an unbounded one
+# changes them, so the exact-hash stage never collapses such programs. The MinHash
+# stage still can: a few swapped calls in an otherwise identical program keep the
+# Jaccard similarity above the threshold (see find_near_duplicates).
+PRESERVED_IDENTIFIERS = frozenset('''
+    auto break case char const continue default do double else enum extern float for goto
+    if inline int long register restrict return short signed sizeof static struct switch
+    typedef union unsigned void volatile while bool true false NULL size_t main
+    malloc calloc realloc free memcpy memmove memset memcmp strcpy strncpy strcat strncat
+    strcmp strncmp strlen strdup strtok sprintf snprintf vsprintf printf fprintf scanf
+    sscanf fscanf gets fgets puts fputs getchar fopen fclose fread fwrite atoi atol exit
+'''.split())
+
+
+def _normalize_token(token):
+    first = token[0]
+    if first in '"\'':
+        return 'STR'
+    if first.isdigit():
+        return 'NUM'
+    if first.isalpha() or first == '_':
+        return token if token in PRESERVED_IDENTIFIERS else 'ID'
+    return token
+
+
+def normalize_tokens(source):
+    """
+    Lex C source into whitespace- and comment-free tokens with string literals mapped
+    to STR, numbers to NUM and identifiers outside PRESERVED_IDENTIFIERS to ID.
+    """
+    return [_normalize_token(token) for token in _TOKEN_PATTERN.findall(source) if token]
+
+
+# Raw token -> 32-bit hash of its normalized form. Identifiers and literals repeat a
+# lot across a generated corpus, so nearly every token is a single dict lookup.
+_token_ids = {'': _COMMENT}
+
+
+def token_ids(source):
+    """
+    The normalized tokens of ``source`` as 32-bit hashes (uint64 array).
+    """
+    tokens = _TOKEN_PATTERN.findall(source)
+    try:
+        ids = [_token_ids[token] for token in tokens]
+    except KeyError:
+        if len(_token_ids) > _TOKEN_CACHE_LIMIT:
+            _token_ids.clear()
+            _token_ids[''] = _COMMENT
+        for token in set(tokens).difference(_token_ids):
+            normalized = _normalize_token(token).encode('utf-8')
+            _token_ids[token] = int.from_bytes(hashlib.blake2b(normalized, digest_size=4).digest(), 'little')
+        ids = [_token_ids[token] for token in tokens]
+    ids = np.array(ids, dtype=np.int64)
+    return ids[ids != _COMMENT].astype(np.uint64)
+
+
+def shingle_hashes(ids, shingle_size=SHINGLE_SIZE):
+    """
+    32-bit hashes of the distinct ``shingle_size``-token windows of the token hashes
+    ``ids``; shorter inputs form a single shingle.
+    """
+    if len(ids) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    width = min(shingle_size, len(ids))
+    hashes = np.zeros(len(ids) - width + 1, dtype=np.uint64)
+    for offset in range(width):
+        hashes = hashes * _SHINGLE_MULTIPLIER + ids[offset:offset + len(hashes)]
+    return np.unique(hashes & _MAX_HASH)
+
+
+def permutations(num_perm=NUM_PERM, seed=DEDUP_SEED):
+    """
+    The ``(a, b)`` coefficients of the universal hash functions ``(a * x + b) mod p``
+    that stand in for random permutations.
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+    b = rng.randint(0, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+    return a, b
+
+
+def minhash_signature(shingles, a, b):
+    """
+    MinHash signature (uint32, one value per permutation) of a set of shingle hashes.
+    """
+    if len(shingles) == 0:
+        return np.full(len(a), _MAX_HASH, dtype=np.uint32)
+    return (((a * shingles[np.newaxis, :] + b) % _MERSENNE_PRIME) & _MAX_HASH).min(axis=1).astype(np.uint32)
+
+
+# Permutations are sent to each worker once through the pool initializer, like the
+# vocabulary in tokenization.py.
+_worker_params = None
+
+
+def _set_worker_params(a, b, shingle_size):
+    global _worker_params
+    _worker_params = (a, b, shingle_size)
+
+
+def _signature_chunk(texts):
+    a, b, shingle_size = _worker_params
+    exact_hashes = np.zeros(len(texts), dtype=np.uint64)
+    signatures = np.zeros((len(texts), len(a)), dtype=np.uint32)
+    for row, text in enumerate(texts):
+        ids = token_ids(text)
+        exact_hashes[row] = int.from_bytes(hashlib.blake2b(ids.tobytes(), digest_size=8).digest(), 'little')
+        signatures[row] = minhash_signature(shingle_hashes(ids, shingle_size), a, b)
+    return exact_hashes, signatures
+
+
+def compute_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=DEDUP_SEED, workers=1, chunksize=DEDUP_CHUNKSIZE):
+    """
+    Normalized-token hashes (uint64) and MinHash signatures (rows x ``num_perm`` uint32)
+    of ``texts``, computed in chunks across ``workers`` processes.
+    """
+    texts = list(texts)
+    a, b = permutations(num_perm, seed)
+    chunks = [texts[start:start + chunksize] for start in range(0, len(texts), chunksize)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_params, initargs=(a, b, shingle_size)) as executor:
+            results = list(executor.map(_signature_chunk, chunks))
+    else:
+        _set_worker_params(a, b, shingle_size)
+        results = [_signature_chunk(chunk) for chunk in chunks]
+    if not results:
+        return np.zeros(0, dtype=np.uint64), np.zeros((0, num_perm), dtype=np.uint32)
+    return np.concatenate([hashes for hashes, _ in results]), np.concatenate([signatures for _, signatures in results])
+
+
+class _DisjointSet:
+    """
+    Union-find whose roots are always the lowest row index, i.e. the first occurrence.
+    """
+
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, row):
+        root = row
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[row] != root:
+            self.parent[row], row = root, self.parent[row]
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+    def roots(self):
+        return np.array([self.find(row) for row in range(len(self.parent))], dtype=np.int64)
+
+
+def _band_keys(signatures, num_bands, group_ids):
+    rows_per_band = signatures.shape[1] // num_bands
+    multipliers = np.random.RandomState(0).randint(1, 1 << 62, size=rows_per_band, dtype=np.uint64) | np.uint64(1)
+    for band in range(num_bands):
+        values = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        # Wrapping multiply-add folds a band into one uint64; collisions only cost a
+        # verification, since every candidate pair is checked against the signatures.
+        yield (values * multipliers).sum(axis=1) + group_ids.astype(np.uint64) * _SHINGLE_MULTIPLIER
+
+
+class DedupReport:
+    """
+    Summary of a deduplication run: row counts, the largest clusters (row ids, first
+    one kept) and the parameters used.
+    """
+
+    def __init__(self, rows, kept, exact_duplicates, near_duplicates, clusters, seconds, params):
+        self.rows = rows
+        self.kept = kept
+        self.exact_duplicates = exact_duplicates
+        self.near_duplicates = near_duplicates
+        self.clusters = clusters
+        self.seconds = seconds
+        self.params = params
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'kept': self.kept,
+            'removed': self.rows - self.kept,
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates,
+            'seconds': self.seconds,
+            'params': self.params,
+            'largest_clusters': self.clusters,
+        }
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+def find_near_duplicates(
+    texts,
+    groups=None,
+    row_ids=None,
+    threshold=SIMILARITY_THRESHOLD,
+    num_perm=NUM_PERM,
+    num_bands=NUM_BANDS,
+    shingle_size=SHINGLE_SIZE,
+    seed=DEDUP_SEED,
+    workers=1,
+    chunksize=DEDUP_CHUNKSIZE
+):
+    """
+    Return ``(keep, report)``: a boolean mask keeping the first row of every cluster of
+    near-duplicate texts, and a DedupReport.
+
+    Rows with identical normalized tokens are collapsed first. The rest go through
+    MinHash/LSH: rows sharing any band bucket are compared with the bucket's first row
+    only and merged when their estimated Jaccard similarity reaches ``threshold``, so the
+    cost grows linearly with the number of rows. Two rows that are similar to each other
+    but not to the first row of the buckets they share stay apart, so some near-duplicate
+    pairs are missed. Similarity is over shingles, so programs that
+    differ only in a few PRESERVED_IDENTIFIERS calls (strcpy vs strncpy) can be merged.
+    Rows are only merged within the same ``groups`` value (e.g. the label), so no
+    label's examples are dropped in favour of another's. The report names rows by
+    ``row_ids`` (e.g. the DataFrame index), or by position.
+    """
+    if num_perm % num_bands:
+        raise ValueError(f"num_perm ({num_perm}) must be a multiple of num_bands ({num_bands})")
+    start = time.perf_counter()
+    exact_hashes, signatures = compute_signatures(texts, num_perm, shingle_size, seed, workers, chunksize)
+    rows = len(exact_hashes)
+    group_codes = {}
+    group_ids = np.fromiter(
+        (group_codes.setdefault(group, len(group_codes)) for group in (groups if groups is not None else [None] * rows)),
+        dtype=np.int64, count=rows
+    )
+    clusters = _DisjointSet(rows)
+
+    first_seen = {}
+    exact_duplicates = 0
+    for row, key in enumerate(zip(group_ids.tolist(), exact_hashes.tolist())):
+        first = first_seen.setdefault(key, row)
+        if first != row:
+            clusters.union(first, row)
+            exact_duplicates += 1
+
+    for keys in _band_keys(signatures, num_bands, group_ids):
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        run_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        run_lengths = np.diff(np.r_[run_starts, rows])
+        firsts = np.repeat(order[run_starts], run_lengths)
+        candidates = firsts != order
+        firsts, others = firsts[candidates], order[candidates]
+        similar = (signatures[firsts] == signatures[others]).mean(axis=1) >= threshold
+        similar &= group_ids[firsts] == group_ids[others]
+        for first, other in zip(firsts[similar].tolist(), others[similar].tolist()):
+            clusters.union(first, other)
+
+    roots = clusters.roots()
+    keep = roots == np.arange(rows)
+    kept = int(keep.sum())
+    sizes = np.bincount(roots, minlength=rows)
+    largest = [root for root in np.argsort(-sizes, kind='stable')[:REPORT_TOP_CLUSTERS] if sizes[root] > 1]
+    row_ids = list(row_ids) if row_ids is not None else list(range(rows))
+    report = DedupReport(
+        rows=rows,
+        kept=kept,
+        exact_duplicates=exact_duplicates,
+        near_duplicates=rows - kept - exact_duplicates,
+        clusters=[
+            {'size': int(sizes[root]), 'rows': [row_ids[row] for row in np.flatnonzero(roots == root).tolist()]}
+            for root in largest
+        ],
+        seconds=time.perf_counter() - start,
+        params={'threshold': threshold, 'num_perm': num_perm, 'num_bands': num_bands, 'shingle_size': shingle_size, 'seed': seed},
+    )
+    return keep, report
@@ -0,0 +1,76 @@
+import bisect
+import hashlib
+import random
+from typing import Iterable, List, Optional, Tuple
+
+
+def derive_file_seed(base_seed: int, filename: str) -> int:
+    """Derive a stable per-file seed, independent of processing order and ``PYTHONHASHSEED``."""
+    digest = hashlib.blake2b(f"{base_seed}:{filename}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def merge_windows(line_numbers: Iterable[int], context_range: int, num_lines: int) -> List[Tuple[int, int]]:
+    """Merge the context windows around the given lines into sorted, disjoint intervals.
+
+    Lines are 1-based, matching the annotation keys, and each interval is inclusive.
+    """
+    windows = sorted(
+        (max(1, line - context_range), min(num_lines, line + context_range))
+        for line in line_numbers
+    )
+    merged: List[Tuple[int, int]] = []
+    for start, end in windows:
+        if start > end:
+            continue
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class NegativeSampler:
+    """Draw negative line numbers from the lines outside every positive window of a file.
+
+    The exclusion intervals are built once per file, so each draw is a binary search
+    over the allowed intervals instead of a set difference over all the file's lines.
+    """
+
+    def __init__(self, num_lines: int, positive_lines: Iterable[int], context_range: int = 5):
+        self.num_lines = num_lines
+        self._starts: List[int] = []
+        self._offsets: List[int] = []
+        total = 0
+        cursor = 1
+        for start, end in merge_windows(positive_lines, context_range, num_lines) + [(num_lines + 1, num_lines)]:
+            if start > cursor:
+                self._starts.append(cursor)
+                self._offsets.append(total)
+                total += start - cursor
+            cursor = end + 1
+        self.available = total
+
+    def line_at(self, rank: int) -> int:
+        """Return the ``rank``-th (0-based) allowed line number."""
+        if not 0 <= rank < self.available:
+            raise IndexError(f"rank {rank} out of range for {self.available} available lines")
+        index = bisect.bisect_right(self._offsets, rank) - 1
+        return self._starts[index] + rank - self._offsets[index]
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[int]:
+        """Sample up to ``k`` distinct allowed line numbers.
+
+        Uses Floyd's algorithm over interval ranks, so no per-line state is materialized.
+        """
+        rng = rng or random
+        k = min(k, self.available)
+        chosen = set()
+        ranks: List[int] = []
+        for upper in range(self.available - k, self.available):
+            rank = rng.randint(0, upper)
+            if rank in chosen:
+                rank = upper
+            chosen.add(rank)
+            ranks.append(rank)
+        return [self.line_at(rank) for rank in ranks]
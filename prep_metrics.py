@@ -0,0 +1,116 @@
+import os
+from typing import Dict
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+from profiling import ACTIVE_PROFILER
+
+# One registry for data_prep and dataset_analyzer; series are told apart by the
+# ``module`` label. Stage timings recorded inside ProcessPoolExecutor workers stay in
+# those processes unless prometheus_client's multiprocess mode (PROMETHEUS_MULTIPROC_DIR)
+# is enabled; the file, sample and byte counters are updated by the parent process, so
+# they are complete either way.
+REGISTRY = CollectorRegistry()
+
+STAGES = ("load", "read_file", "enhance", "sample_negatives", "serialize")
+# Per-file stages take microseconds to milliseconds; whole-dataset stages take seconds.
+STAGE_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300)
+
+STAGE_DURATION = Histogram(
+    'data_prep_stage_duration_seconds', 'Duration of one data preparation stage',
+    ['module', 'stage'], buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+STAGE_ERRORS = Counter(
+    'data_prep_stage_errors_total', 'Data preparation stages that raised', ['module', 'stage'], registry=REGISTRY
+)
+FILES_PROCESSED = Counter(
+    'data_prep_files_processed_total', 'Dataset files enhanced', ['module'], registry=REGISTRY
+)
+SAMPLES_EMITTED = Counter(
+    'data_prep_samples_emitted_total', 'Enhanced samples produced', ['module', 'is_vulnerable'], registry=REGISTRY
+)
+BYTES_READ = Counter(
+    'data_prep_bytes_read_total', 'Size of the dataset files enhanced, in bytes', ['module'], registry=REGISTRY
+)
+JOBS_IN_FLIGHT = Gauge(
+    'data_prep_jobs_in_flight', 'Enhancement runs currently executing', ['module'], registry=REGISTRY
+)
+API_REQUEST_DURATION = Histogram(
+    'data_prep_api_request_duration_seconds', 'Duration of API requests',
+    ['endpoint', 'method', 'status'], buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+API_REQUESTS_IN_FLIGHT = Gauge(
+    'data_prep_api_requests_in_flight', 'API requests currently being handled', registry=REGISTRY
+)
+
+
+class StageTimer:
+    """Context manager and decorator that times one stage and counts its failures.
+
+    While a profiler is active (see profiling.py) the stage is also recorded as a span.
+    """
+
+    def __init__(self, module, stage, duration, errors):
+        self._module = module
+        self._stage = stage
+        self._duration = duration
+        self._errors = errors
+        self._span = None
+
+    def __enter__(self):
+        profiler = ACTIVE_PROFILER.get()
+        if profiler is not None:
+            self._span = profiler.span(self._stage, self._module)
+            self._span.__enter__()
+        self._timer = self._duration.time()
+        self._timer.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._timer.__exit__(exc_type, exc, tb)
+        if exc_type is not None:
+            self._errors.inc()
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, tb)
+        return False
+
+    def __call__(self, fn):
+        timer = self
+
+        def wrapped(*args, **kwargs):
+            with StageTimer(timer._module, timer._stage, timer._duration, timer._errors):
+                return fn(*args, **kwargs)
+
+        wrapped.__name__ = fn.__name__
+        wrapped.__qualname__ = fn.__qualname__
+        wrapped.__doc__ = fn.__doc__
+        wrapped.__wrapped__ = fn
+        return wrapped
+
+
+class PipelineMetrics:
+    """Metric children pre-bound to one module's label, so hot paths skip label lookups."""
+
+    def __init__(self, module: str):
+        self.module = module
+        self.files_processed = FILES_PROCESSED.labels(module)
+        self.bytes_read = BYTES_READ.labels(module)
+        self.jobs_in_flight = JOBS_IN_FLIGHT.labels(module)
+        self._samples = {flag: SAMPLES_EMITTED.labels(module, str(flag)) for flag in (0, 1)}
+        self._durations = {stage: STAGE_DURATION.labels(module, stage) for stage in STAGES}
+        self._errors = {stage: STAGE_ERRORS.labels(module, stage) for stage in STAGES}
+
+    def stage(self, name: str) -> StageTimer:
+        """Time a stage: ``with metrics.stage("load"):`` or ``@metrics.stage("load")``."""
+        return StageTimer(self.module, name, self._durations[name], self._errors[name])
+
+    def record_file(self, file_path: str, samples: Dict) -> None:
+        """Count one enhanced file, its samples and its size."""
+        self.files_processed.inc()
+        vulnerable = sum(sample.is_vulnerable for sample in samples.values())
+        self._samples[1].inc(vulnerable)
+        self._samples[0].inc(len(samples) - vulnerable)
+        try:
+            self.bytes_read.inc(os.path.getsize(file_path))
+        except OSError:
+            pass
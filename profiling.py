@@ -0,0 +1,185 @@
+import asyncio
+import contextvars
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+# Setting this to a directory turns on profiling of batch runs (and allows per-request
+# profiling on the API); the --profile flag of the prep scripts does the same.
+PROFILE_ENV = "DATA_PREP_PROFILE"
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 25
+
+# The profiler of the current run or request. Stage timers check it with a single
+# ContextVar lookup, which is all profiling costs when it is off.
+ACTIVE_PROFILER: contextvars.ContextVar[Optional["RunProfiler"]] = contextvars.ContextVar(
+    "active_profiler", default=None
+)
+
+
+# tracemalloc is process-wide, so overlapping profiles (concurrent API requests) share
+# one tracing session: the first profiler starts it, the last one to finish stops it.
+# Tracing that was already on before any profiler started is left running.
+_TRACEMALLOC_LOCK = threading.Lock()
+_TRACEMALLOC_USERS = 0
+_TRACEMALLOC_OWNED = False
+
+
+def _acquire_tracemalloc() -> None:
+    global _TRACEMALLOC_USERS, _TRACEMALLOC_OWNED
+    with _TRACEMALLOC_LOCK:
+        if _TRACEMALLOC_USERS == 0:
+            _TRACEMALLOC_OWNED = not tracemalloc.is_tracing()
+            if _TRACEMALLOC_OWNED:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+        _TRACEMALLOC_USERS += 1
+
+
+def _release_tracemalloc() -> None:
+    global _TRACEMALLOC_USERS
+    with _TRACEMALLOC_LOCK:
+        _TRACEMALLOC_USERS -= 1
+        if _TRACEMALLOC_USERS == 0 and _TRACEMALLOC_OWNED:
+            tracemalloc.stop()
+
+
+def profile_directory(cli_value: Optional[str] = None) -> Optional[str]:
+    """The profile output directory from the CLI flag, falling back to DATA_PREP_PROFILE."""
+    return cli_value or os.environ.get(PROFILE_ENV) or None
+
+
+class RunProfiler:
+    """Collects a span trace, a cProfile dump and the top tracemalloc allocations for one run.
+
+    Use it as a context manager around the run; on exit it writes ``<name>.trace.json``
+    (Chrome trace events, open in chrome://tracing or Perfetto), ``<name>.pstats`` and
+    ``<name>.allocations.txt`` to ``output_directory``. cProfile only sees the thread
+    that entered the profiler and threads running ``profiler.call``; work done in
+    worker processes shows up only as the parent's spans.
+    """
+
+    def __init__(self, output_directory: str, name: Optional[str] = None, profile_thread: bool = True):
+        self.output_directory = output_directory
+        self.name = name or time.strftime("run-%Y%m%d-%H%M%S")
+        self.profile_thread = profile_thread
+        self.events: List[Dict[str, Any]] = []
+        self.profile = cProfile.Profile()
+        self._profile_lock = threading.Lock()
+        self._tracing = False
+        self._token = None
+        self._origin = time.perf_counter_ns()
+
+    def __enter__(self) -> "RunProfiler":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.stop()
+        self.write()
+        return False
+
+    def start(self) -> "RunProfiler":
+        """Start tracing allocations and make this the active profiler of the current context."""
+        _acquire_tracemalloc()
+        self._tracing = True
+        self._token = ACTIVE_PROFILER.set(self)
+        if self.profile_thread:
+            self.profile.enable()
+        return self
+
+    def stop(self) -> None:
+        """Stop collecting; must run in the context that called ``start``. ``write`` follows."""
+        if self.profile_thread:
+            self.profile.disable()
+        ACTIVE_PROFILER.reset(self._token)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run ``fn`` under this profiler's cProfile on the current (worker) thread."""
+        # A cProfile.Profile can only be enabled on one thread at a time.
+        with self._profile_lock:
+            self.profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.profile.disable()
+
+    @contextmanager
+    def span(self, name: str, category: str = "stage", **args):
+        """Record a complete ("X") trace event around the block."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.events.append({
+                "name": name, "cat": category, "ph": "X",
+                "ts": (start - self._origin) / 1000, "dur": (end - start) / 1000,
+                "pid": os.getpid(), "tid": threading.get_ident(), "args": args,
+            })
+
+    def write(self) -> Dict[str, str]:
+        """Write the trace, stats and top allocations, then release tracemalloc."""
+        base = os.path.join(self.output_directory, self.name)
+        paths = {"trace": base + ".trace.json", "pstats": base + ".pstats", "allocations": base + ".allocations.txt"}
+        try:
+            os.makedirs(self.output_directory, exist_ok=True)
+            with open(paths["trace"], 'w') as file:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
+            self.profile.dump_stats(paths["pstats"])
+            with open(paths["allocations"], 'w') as file:
+                if tracemalloc.is_tracing():
+                    for stat in tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]:
+                        file.write(f"{stat}\n")
+        finally:
+            if self._tracing:
+                self._tracing = False
+                _release_tracemalloc()
+        logger.info(f"Wrote profile {self.name} to {self.output_directory}")
+        return paths
+
+
+@contextmanager
+def profiled_run(output_directory: Optional[str], prefix: str = "run"):
+    """Profile the block when ``output_directory`` is set; otherwise do nothing."""
+    if output_directory is None:
+        yield None
+        return
+    with RunProfiler(output_directory, time.strftime(f"{prefix}-%Y%m%d-%H%M%S")) as profiler:
+        yield profiler
+
+
+def new_request_profiler(output_directory: str) -> RunProfiler:
+    """Profiler for one API request; the event loop thread itself is not cProfiled, only
+    the blocking work the request hands to ``RunProfiler.call``."""
+    return RunProfiler(output_directory, f"request-{uuid.uuid4().hex}", profile_thread=False)
+
+
+def install_request_profiling(app, output_directory: str) -> None:
+    """Profile FastAPI requests that send ``X-Profile: 1``; the profile name is returned
+    in ``X-Profile-Id``. Install it only when profiling is configured, so the middleware
+    is not even in the request path otherwise. Streaming responses are profiled until
+    their headers are sent.
+    """
+    @app.middleware("http")
+    async def profile_requests(request, call_next):
+        if request.headers.get(PROFILE_HEADER) != "1":
+            return await call_next(request)
+        profiler = new_request_profiler(output_directory).start()
+        try:
+            with profiler.span(request.url.path, "api_request", method=request.method):
+                response = await call_next(request)
+        finally:
+            profiler.stop()
+            # Dumping the trace, stats and allocation snapshot is blocking file I/O.
+            await asyncio.get_running_loop().run_in_executor(None, profiler.write)
+        response.headers[PROFILE_ID_HEADER] = profiler.name
+        return response
@@ -1,48 +1,155 @@
-import pandas as pd
-from sklearn.preprocessing import OneHotEncoder
-from keras.models import Sequential
-from keras.layers import Embedding, LSTM, Dense
-from keras.preprocessing.text import Tokenizer
-from keras.preprocessing.sequence import pad_sequences
+import os
+import json
 import numpy as np
-from sklearn.model_selection import train_test_split
+from tokenization import Vocabulary, load_or_build_vocabulary
+from near_dedup import find_near_duplicates
+from feature_store import (ROWS_PER_SHARD, FeatureStore, feature_store_exists, source_stamp, stable_row_hash,
+                           write_feature_store)
 
-def load_and_inspect_data(file_path):
+# pandas, scikit-learn, Keras and TensorFlow are imported inside the functions that need
+# them, so importing this module (for clean_data, the constants, or in a worker process)
+# does not pay for loading them.
+
+SOURCE_COLUMN = 'Source code'
+LABEL_COLUMN = 'Vulnerability type'
+CSV_FILE = 'FormAI_dataset.csv'
+CSV_CHUNKSIZE = 10000
+NUM_WORDS = 10000
+VOCABULARY_FILE = 'vocabulary.json'
+CLASS_MAP_FILE = 'class_map.json'
+DEDUP_REPORT_FILE = 'dedup_report.json'
+MODEL_FILE = 'vulnerability_model.keras'
+# Optional cap on tokens per source file for bucketed training; None keeps whole files.
+MAX_SEQUENCE_LENGTH = None
+FEATURE_STORE_DIRECTORY = 'feature_store'
+
+def iter_data_chunks(file_path, chunksize=CSV_CHUNKSIZE, columns=(SOURCE_COLUMN, LABEL_COLUMN)):
+    """
+    Stream the dataset in chunks, parsing only the needed columns as strings.
+
+    Each chunk has NaNs dropped and rows already seen (in this or an earlier chunk)
+    removed by content hash, so the result matches clean_data without the whole CSV
+    ever being held in memory.
+    """
+    import pandas as pd
+    columns = list(columns)
+    seen = set()
+    for chunk in pd.read_csv(file_path, usecols=columns, dtype={column: str for column in columns}, chunksize=chunksize):
+        chunk = chunk.dropna()
+        hashes = pd.util.hash_pandas_object(chunk, index=False)
+        keep = ~hashes.duplicated() & ~hashes.isin(seen)
+        seen.update(hashes[keep].tolist())
+        yield chunk[keep.to_numpy()]
+
+def load_and_inspect_data(file_path, chunksize=None):
     """
     Load and inspect the initial dataset.
+
+    With ``chunksize`` set, the CSV is parsed through ``iter_data_chunks``: only the two
+    used columns, as strings, with NaNs and exact duplicates dropped chunk by chunk. The
+    cleaned chunks are still concatenated into one frame, since near-duplicate detection
+    and the vocabulary both need every row; peak memory is that frame, not the raw CSV.
     """
-    dataset = pd.read_csv(file_path)
+    import pandas as pd
+    if chunksize is None:
+        dataset = pd.read_csv(file_path)
+    else:
+        dataset = pd.concat(iter_data_chunks(file_path, chunksize), ignore_index=True)
     print(dataset.info())
     print(dataset.head())
     return dataset
 
-def clean_data(dataset):
+def clean_data(dataset, near_duplicates=False, workers=1, report_path=None):
     """
     Perform data cleaning, including removing duplicates and handling missing values.
+
+    With ``near_duplicates`` set, programs of the same vulnerability type that differ
+    only in whitespace, comments, literals or identifier names are also collapsed to
+    their first occurrence (see near_dedup.py); the dedup report is written to
+    ``report_path`` when given.
     """
     dataset_cleaned = dataset.dropna().drop_duplicates()
+    if near_duplicates:
+        keep, report = find_near_duplicates(
+            dataset_cleaned[SOURCE_COLUMN], dataset_cleaned[LABEL_COLUMN], row_ids=dataset_cleaned.index.tolist(), workers=workers
+        )
+        if report_path is not None:
+            report.save(report_path)
+        dataset_cleaned = dataset_cleaned[keep]
     return dataset_cleaned
 
-def preprocess_data(dataset):
+def tokenize_source_code(source_code, vocabulary_path=None, workers=1):
+    """
+    Build (or load) the vocabulary and encode the source code into ragged int32 sequences.
+    """
+    vocabulary = load_or_build_vocabulary(source_code, vocabulary_path, num_words=NUM_WORDS, workers=workers)
+    return vocabulary, vocabulary.encode(source_code, workers=workers)
+
+def load_or_build_class_map(labels, class_map_path=None, rebuild=False):
+    """
+    Load the persisted list of class names, or build it (sorted, like OneHotEncoder's
+    categories) and save it to ``class_map_path``. With ``rebuild`` set, any saved map
+    is replaced by one built from ``labels``.
+    """
+    if not rebuild and class_map_path is not None and os.path.exists(class_map_path):
+        with open(class_map_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    class_names = sorted(set(labels))
+    if class_map_path is not None:
+        with open(class_map_path, 'w', encoding='utf-8') as file:
+            json.dump(class_names, file)
+    return class_names
+
+def encode_labels(labels, class_names):
+    """
+    Map label strings to int32 class ids; raises KeyError for labels missing from the class map.
+    """
+    class_ids = {name: class_id for class_id, name in enumerate(class_names)}
+    return np.fromiter((class_ids[label] for label in labels), dtype=np.int32, count=len(labels))
+
+def preprocess_data(dataset, vocabulary_path=None, workers=1, pad=True, integer_labels=False, class_map_path=None):
     """
     Tokenize source code and apply one-hot encoding to the vulnerability type.
+
+    With ``integer_labels`` set, the vulnerability type is stored as an int32 class id
+    in ``Vulnerability_Label`` (class map persisted at ``class_map_path``) instead of a
+    dense ``Vulnerability_OHE`` vector per row; train with ``sparse_labels=True``.
+
+    The vocabulary is counted across ``workers`` processes and, with
+    ``vocabulary_path`` set, saved there and reloaded instead of being refitted while
+    the source code and NUM_WORDS are unchanged. Tokens are encoded into one flat int32 array, and
+    ``Code_Tokens`` holds views into it rather than per-row lists. Pass ``pad=False``
+    to skip building ``Code_Tokens_Padded`` when training on bucketed batches.
     """
-    tokenizer = Tokenizer(num_words=10000)
-    tokenizer.fit_on_texts(dataset['Source code'])
-    dataset['Code_Tokens'] = tokenizer.texts_to_sequences(dataset['Source code'])
+    tokenizer, code_tokens = tokenize_source_code(dataset['Source code'], vocabulary_path, workers)
+    dataset['Code_Tokens'] = list(code_tokens)
 
-    max_length = max([len(seq) for seq in dataset['Code_Tokens']])
-    dataset['Code_Tokens_Padded'] = pad_sequences(dataset['Code_Tokens'], maxlen=max_length, padding='post').tolist()
+    if pad:
+        from keras.preprocessing.sequence import pad_sequences
+        max_length = int(code_tokens.lengths.max())
+        dataset['Code_Tokens_Padded'] = pad_sequences(dataset['Code_Tokens'], maxlen=max_length, padding='post').tolist()
 
-    ohe = OneHotEncoder(sparse=False)
-    dataset['Vulnerability_OHE'] = list(ohe.fit_transform(dataset[['Vulnerability type']]))
+    if integer_labels:
+        class_names = load_or_build_class_map(dataset['Vulnerability type'], class_map_path)
+        dataset['Vulnerability_Label'] = encode_labels(dataset['Vulnerability type'], class_names)
+    else:
+        from sklearn.preprocessing import OneHotEncoder
+        ohe = OneHotEncoder(sparse=False)
+        dataset['Vulnerability_OHE'] = list(ohe.fit_transform(dataset[['Vulnerability type']]))
 
     return dataset, tokenizer
 
-def build_model(tokenizer, max_length, output_dim):
+def build_model(tokenizer, max_length, output_dim, sparse_labels=False):
     """
     Build and compile the LSTM model.
+
+    Pass ``max_length=None`` to accept variable-length batches, e.g. from BucketedBatches.
+    With ``sparse_labels`` the model is trained on integer class ids
+    (sparse_categorical_crossentropy) instead of one-hot vectors.
     """
+    from keras.models import Sequential
+    from keras.layers import Embedding, LSTM, Dense
+
     vocab_size = len(tokenizer.word_index) + 1
     embedding_dim = 50
 
@@ -51,17 +158,48 @@ def build_model(tokenizer, max_length, output_dim):
     model.add(LSTM(128, return_sequences=False))
     model.add(Dense(output_dim, activation='softmax'))
 
-    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    loss = 'sparse_categorical_crossentropy' if sparse_labels else 'categorical_crossentropy'
+    model.compile(optimizer='adam', loss=loss, metrics=['accuracy'])
     print(model.summary())
 
     return model
 
-def train_and_evaluate_model(model, dataset):
+def training_labels(dataset):
+    """
+    Integer class ids when preprocessed with ``integer_labels``, else the one-hot matrix.
+    """
+    if 'Vulnerability_Label' in dataset.columns:
+        return dataset['Vulnerability_Label'].to_numpy()
+    return np.stack(dataset['Vulnerability_OHE'].tolist())
+
+def train_and_evaluate_model(model, dataset, bucketed=False, max_length=None, batch_size=64):
     """
     Train the model and evaluate its performance.
+
+    With ``bucketed`` set, batches are drawn from ``Code_Tokens`` by BucketedBatches and
+    padded per batch (keeping at most ``max_length`` tokens per row), so the padded
+    matrix for the whole dataset is never materialized.
     """
+    from sklearn.model_selection import train_test_split
+
+    if bucketed:
+        from bucketing import BucketedBatches
+        sequences = dataset['Code_Tokens'].tolist()
+        y = training_labels(dataset)
+        train_indices, test_indices = train_test_split(np.arange(len(sequences)), test_size=0.2, random_state=42)
+        train_indices, val_indices = train_test_split(train_indices, test_size=0.2, random_state=42)
+
+        train_batches = BucketedBatches(sequences, y, batch_size, max_length, train_indices, seed=42)
+        val_batches = BucketedBatches(sequences, y, batch_size, max_length, val_indices, shuffle=False)
+        test_batches = BucketedBatches(sequences, y, batch_size, max_length, test_indices, shuffle=False)
+        model.fit(train_batches, epochs=10, validation_data=val_batches)
+
+        loss, accuracy = model.evaluate(test_batches)
+        print(f'Test Accuracy: {accuracy}')
+        return
+
     X = np.array(dataset['Code_Tokens_Padded'].tolist())
-    y = np.array(dataset['Vulnerability_OHE'].tolist())
+    y = training_labels(dataset)
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
@@ -70,16 +208,80 @@ def train_and_evaluate_model(model, dataset):
     loss, accuracy = model.evaluate(X_test, y_test)
     print(f'Test Accuracy: {accuracy}')
 
+def build_feature_store(dataset, directory, vocabulary_path=None, workers=1, rows_per_shard=ROWS_PER_SHARD, class_map_path=None, source_files=None):
+    """
+    Tokenize the cleaned dataset once and persist it as a feature store: int32 token
+    shards, integer label ids and a manifest with the class names and vocabulary path.
+
+    Training and evaluation then memory-map the store instead of preprocessing again.
+    The class map is rebuilt from the dataset's labels, since the model is retrained
+    from the new store anyway and a saved map may lack labels the dataset now has.
+    With ``source_files`` set, their size and mtime are stamped into the manifest (after
+    the vocabulary is saved) so feature_store_exists can tell when the store is stale.
+    """
+    vocabulary, code_tokens = tokenize_source_code(dataset['Source code'], vocabulary_path, workers)
+    class_names = load_or_build_class_map(dataset['Vulnerability type'], class_map_path, rebuild=True)
+    label_ids = encode_labels(dataset['Vulnerability type'], class_names)
+    row_hashes = [stable_row_hash(text) for text in dataset['Source code']]
+    return write_feature_store(
+        directory, code_tokens, label_ids, row_hashes, class_names, vocabulary_path, rows_per_shard,
+        source_stamp(source_files) if source_files is not None else None
+    )
+
+def train_and_evaluate_model_from_shards(model, store_directory, num_classes=None, max_length=None, batch_size=64, epochs=10, sparse_labels=False):
+    """
+    Train and evaluate from a feature store through a streaming tf.data pipeline.
+
+    Rows are split into train/validation/test by a stable content hash instead of
+    in-memory copies, so the dataset never has to fit in RAM.
+    """
+    from token_shards import make_tf_dataset
+
+    train_data = make_tf_dataset(store_directory, 'train', num_classes, batch_size, max_length, seed=42, sparse_labels=sparse_labels)
+    val_data = make_tf_dataset(store_directory, 'val', num_classes, batch_size, max_length, sparse_labels=sparse_labels)
+    test_data = make_tf_dataset(store_directory, 'test', num_classes, batch_size, max_length, sparse_labels=sparse_labels)
+
+    model.fit(train_data, epochs=epochs, validation_data=val_data)
+
+    loss, accuracy = model.evaluate(test_data)
+    print(f'Test Accuracy: {accuracy}')
+
+def run_preprocessing(csv_file=CSV_FILE, store_directory=FEATURE_STORE_DIRECTORY, workers=None, near_duplicates=True):
+    """
+    Load, clean (collapsing near-duplicate programs unless ``near_duplicates`` is off)
+    and tokenize the CSV into a feature store (with its vocabulary and class map).
+    """
+    workers = workers or os.cpu_count() or 1
+    dataset = load_and_inspect_data(csv_file, chunksize=CSV_CHUNKSIZE)
+    dataset_cleaned = clean_data(dataset, near_duplicates=near_duplicates, workers=workers, report_path=DEDUP_REPORT_FILE)
+    return build_feature_store(
+        dataset_cleaned, store_directory, VOCABULARY_FILE, workers=workers, class_map_path=CLASS_MAP_FILE,
+        source_files=(csv_file, VOCABULARY_FILE, CLASS_MAP_FILE)
+    )
+
+def run_training(store_directory=FEATURE_STORE_DIRECTORY, model_file=MODEL_FILE, epochs=10, max_length=MAX_SEQUENCE_LENGTH):
+    """
+    Train on an existing feature store and save the model.
+    """
+    store = FeatureStore(store_directory)
+    tokenizer = Vocabulary.load(store.vocabulary_path)
+    model = build_model(tokenizer, max_length=None, output_dim=store.num_classes, sparse_labels=True)
+    train_and_evaluate_model_from_shards(model, store_directory, max_length=max_length, epochs=epochs, sparse_labels=True)
+    # Served by inference_service together with VOCABULARY_FILE and CLASS_MAP_FILE.
+    model.save(model_file)
+    return model
+
 def main():
     """
     Main function to execute the steps.
+
+    Preprocessing runs only when there is no feature store built from the current CSV,
+    vocabulary and class map files; repeat runs go straight from the stored shards to
+    training.
     """
-    file_path = 'FormAI_dataset.csv'
-    dataset = load_and_inspect_data(file_path)
-    dataset_cleaned = clean_data(dataset)
-    dataset_preprocessed, tokenizer = preprocess_data(dataset_cleaned)
-    model = build_model(tokenizer, max_length=max([len(seq) for seq in dataset_preprocessed['Code_Tokens']]), output_dim=len(dataset_preprocessed['Vulnerability_OHE'][0]))
-    train_and_evaluate_model(model, dataset_preprocessed)
+    if not feature_store_exists(FEATURE_STORE_DIRECTORY, source_stamp([CSV_FILE, VOCABULARY_FILE, CLASS_MAP_FILE])):
+        run_preprocessing()
+    run_training()
 
 if __name__ == "__main__":
     main()
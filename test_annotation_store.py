@@ -0,0 +1,127 @@
+import unittest
+import json
+import os
+import tempfile
+from unittest import mock
+from fastapi.testclient import TestClient
+import data_prep
+import dataset_analyzer
+from annotation_store import AnnotationStore, default_store_path, load_annotation_store
+
+class TestAnnotationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.annotations = {
+            'b.c': {'30': {'char_ranges': [[0, 4]]}, '12': {'char_ranges': [[1, 2], [5, 9]]}},
+            'a.c': {'7': {'char_ranges': []}},
+        }
+        self.annotations_file = os.path.join(self.temp_dir.name, 'map.json')
+        with open(self.annotations_file, 'w') as f:
+            json.dump(self.annotations, f)
+        self.dataset_dir = os.path.join(self.temp_dir.name, 'dataset')
+        os.makedirs(self.dataset_dir)
+        for filename in ('a.c', 'b.c'):
+            with open(os.path.join(self.dataset_dir, filename), 'w') as f:
+                f.write('\n'.join(f'line{n}' for n in range(1, 61)))
+
+    def test_columns_and_queries(self):
+        store = AnnotationStore.from_mapping(self.annotations)
+        self.assertEqual(store.filenames, ['a.c', 'b.c'])
+        self.assertEqual(store.file_offsets.tolist(), [0, 1, 3])
+        self.assertEqual(store.lines.tolist(), [7, 12, 30])
+        self.assertEqual(len(store), 3)
+        self.assertIn('b.c', store)
+        self.assertNotIn('c.c', store)
+
+        self.assertEqual(list(store.file_annotations('b.c')), [(12, [[1, 2], [5, 9]]), (30, [[0, 4]])])
+        self.assertEqual(list(store.file_annotations('b.c', first_line=13)), [(30, [[0, 4]])])
+        self.assertEqual(list(store.file_annotations('b.c', last_line=12)), [(12, [[1, 2], [5, 9]])])
+        self.assertEqual(len(store.file_annotations('b.c', first_line=13, last_line=29)), 0)
+        self.assertEqual(len(store.file_annotations('c.c')), 0)
+        self.assertEqual(store.file_annotations('a.c').to_dict(), self.annotations['a.c'])
+
+    def test_accepts_dataset_analyzer_format(self):
+        raw = {'b.c': {'12': [{'start': 1, 'end': 2}, {'start': 5, 'end': 9}], '30': [{'start': 0, 'end': 4}]}}
+        expected = list(AnnotationStore.from_mapping(self.annotations).file_annotations('b.c'))
+        self.assertEqual(list(AnnotationStore.from_mapping(raw).file_annotations('b.c')), expected)
+        models = dataset_analyzer.Annotations(annotations=raw)
+        self.assertEqual(list(AnnotationStore.from_mapping(models).file_annotations('b.c')), expected)
+        with self.assertRaises(ValueError):
+            with open(self.annotations_file, 'w') as f:
+                json.dump({'a.c': {'x': {'char_ranges': []}}}, f)
+            AnnotationStore.from_json(self.annotations_file)
+        with self.assertRaises(ValueError):
+            with open(self.annotations_file, 'w') as f:
+                json.dump({'a.c': {'7': {'char_ranges': [[0, 2 ** 40]]}}}, f)
+            AnnotationStore.from_json(self.annotations_file)
+
+    def test_binary_copy_is_reused_until_json_changes(self):
+        store = load_annotation_store(self.annotations_file)
+        store_file = default_store_path(self.annotations_file)
+        self.assertTrue(os.path.exists(store_file))
+        with mock.patch.object(AnnotationStore, 'from_json') as from_json:
+            loaded = load_annotation_store(self.annotations_file)
+            from_json.assert_not_called()
+        self.assertEqual(loaded.filenames, store.filenames)
+        self.assertEqual(list(loaded.file_annotations('b.c')), list(store.file_annotations('b.c')))
+
+        self.annotations['c.c'] = {'3': {'char_ranges': [[0, 1]]}}
+        with open(self.annotations_file, 'w') as f:
+            json.dump(self.annotations, f)
+        os.utime(self.annotations_file, ns=(0, 1))
+        self.assertEqual(load_annotation_store(self.annotations_file).filenames, ['a.c', 'b.c', 'c.c'])
+
+        with open(store_file, 'r+b') as f:
+            f.truncate(20)
+        self.assertIsNone(AnnotationStore.load(store_file))
+
+    def test_unwritable_store_is_not_fatal(self):
+        with mock.patch('annotation_store.os.replace', side_effect=PermissionError('read-only')):
+            store = load_annotation_store(self.annotations_file)
+        self.assertEqual(store.filenames, ['a.c', 'b.c'])
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['dataset', 'map.json'])
+
+    def test_enhancement_matches_models(self):
+        store = AnnotationStore.from_mapping(self.annotations)
+        models = {
+            filename: {line: data_prep.Annotation(**value) for line, value in lines.items()}
+            for filename, lines in self.annotations.items()
+        }
+        from_store = data_prep.enhance_annotations_with_negatives(store, self.dataset_dir, seed=3, workers=2)
+        from_models = data_prep.enhance_annotations_with_negatives(models, self.dataset_dir, seed=3)
+        self.assertEqual(data_prep.enhanced_annotations_payload(from_store), data_prep.enhanced_annotations_payload(from_models))
+
+        analyzer_models = dataset_analyzer.Annotations(annotations={
+            filename: {line: [{'start': s, 'end': e} for s, e in value['char_ranges']] for line, value in lines.items()}
+            for filename, lines in self.annotations.items()
+        })
+        payloads = [
+            {filename: {line: dataset_analyzer.sample_record(sample) for line, sample in samples.items()}
+             for filename, samples in enhanced.annotations.items()}
+            for enhanced in (
+                dataset_analyzer.enhance_annotations_with_negatives(store, self.dataset_dir, seed=3),
+                dataset_analyzer.enhance_annotations_with_negatives(analyzer_models, self.dataset_dir, seed=3),
+            )
+        ]
+        self.assertEqual(payloads[0], payloads[1])
+
+    def test_api_queries_store(self):
+        client = TestClient(data_prep.app)
+        with mock.patch.object(data_prep, 'ANNOTATIONS_FILE', self.annotations_file), \
+                mock.patch.object(data_prep, 'DATASET_DIRECTORY', self.dataset_dir):
+            data_prep.ANNOTATION_STORE_CACHE.clear()
+            response = client.get('/annotations/b.c', params={'first_line': 20})
+            self.assertEqual(response.json(), {'30': {'char_ranges': [[0, 4]]}})
+            self.assertEqual(client.get('/annotations/missing.c').status_code, 404)
+
+            response = client.post('/enhance_annotations/stored/', params={'files': ['b.c']})
+            self.assertEqual(response.status_code, 200)
+            samples = response.json()['annotations']['b.c']
+            self.assertEqual(sorted(line for line, sample in samples.items() if sample['is_vulnerable']), ['12', '30'])
+            self.assertEqual(client.post('/enhance_annotations/stored/', params={'files': ['../x.c']}).status_code, 400)
+            data_prep.ANNOTATION_STORE_CACHE.clear()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import json
+import os
+import tempfile
+from benchmarks import (
+    BenchmarkConfig, BenchmarkResult, find_regressions, generate_synthetic_dataset, run_benchmarks, save_baseline
+)
+
+class TestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.config = BenchmarkConfig(files=3, lines_per_file=40, annotations_per_file=2, csv_rows=10, repeat=1, workers=2)
+
+    def test_generate_synthetic_dataset(self):
+        dataset = generate_synthetic_dataset(self.temp_dir.name, self.config)
+        self.assertEqual(len(os.listdir(dataset.dataset_directory)), 3)
+        with open(dataset.annotations_file) as f:
+            annotations = json.load(f)
+        self.assertEqual(sorted(len(lines) for lines in annotations.values()), [2, 2, 2])
+        self.assertTrue(os.path.exists(dataset.csv_file))
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(self.config, only=["load", "enhance", "save"], directory=self.temp_dir.name)
+        self.assertEqual([result.name for result in results], ["load", "enhance", "save"])
+        self.assertEqual(results[0].items, 6)
+        self.assertEqual(results[1].items, 12)  # one negative per positive
+        for result in results:
+            self.assertGreater(result.throughput, 0)
+            self.assertGreater(result.peak_rss_mb, 0)
+
+    def test_find_regressions(self):
+        baseline_file = os.path.join(self.temp_dir.name, 'baseline.json')
+        baseline = [BenchmarkResult(name=name, seconds=1, items=100, throughput=100, peak_rss_mb=1) for name in ("load", "save")]
+        save_baseline(baseline, self.config, baseline_file)
+        with open(baseline_file) as f:
+            stored = json.load(f)
+        current = [
+            BenchmarkResult(name="load", seconds=1, items=90, throughput=90, peak_rss_mb=1),
+            BenchmarkResult(name="save", seconds=2, items=100, throughput=50, peak_rss_mb=1),
+            BenchmarkResult(name="api", seconds=1, items=1, throughput=1, peak_rss_mb=1),
+        ]
+        regressions = find_regressions(current, stored, self.config, tolerance=0.15)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("save:"))
+        with self.assertRaises(ValueError):
+            find_regressions(current, stored, BenchmarkConfig(files=4))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+import threading
+from bounded_executor import BoundedExecutor, QueueFullError
+
+class TestBoundedExecutor(unittest.TestCase):
+
+    def test_rejects_when_full_and_recovers(self):
+        executor = BoundedExecutor(max_workers=1, max_pending=2)
+        release = threading.Event()
+        first = executor.submit(release.wait)
+        second = executor.submit(release.wait)
+        with self.assertRaises(QueueFullError):
+            executor.submit(release.wait)
+        release.set()
+        first.result(timeout=5)
+        second.result(timeout=5)
+        self.assertEqual(executor.submit(lambda: 42).result(timeout=5), 42)
+        executor.shutdown()
+
+    def test_zero_pending_always_rejects(self):
+        executor = BoundedExecutor(max_workers=1, max_pending=0)
+        with self.assertRaises(QueueFullError):
+            executor.submit(lambda: None)
+        executor.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
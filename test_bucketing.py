@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from keras.models import Sequential
+from keras.layers import Embedding, LSTM, Dense
+from bucketing import BucketedBatches, pad_batch, sequence_lengths
+from tokenization import RaggedSequences
+
+class TestBucketing(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        lengths = [1, 2, 3, 50, 2, 4, 0, 3, 2, 1]
+        cls.sequences = [rng.integers(1, 20, size=length).astype(np.int32) for length in lengths]
+        cls.labels = np.eye(2, dtype=np.float32)[np.arange(len(lengths)) % 2]
+
+    def test_pad_batch(self):
+        batch = pad_batch(self.sequences, [0, 2], max_length=None)
+        self.assertEqual(batch.shape, (2, 3))
+        self.assertEqual(batch[0, 1:].tolist(), [0, 0])
+        self.assertEqual(pad_batch(self.sequences, [3], max_length=5).tolist(), [self.sequences[3][:5].tolist()])
+        self.assertEqual(pad_batch(self.sequences, [6]).shape, (1, 1))
+
+    def test_sequence_lengths_ragged(self):
+        ragged = RaggedSequences.from_lengths(np.arange(6), [1, 2, 3])
+        self.assertEqual(sequence_lengths(ragged, 2).tolist(), [1, 2, 2])
+
+    def test_batches_cover_rows_once_and_pad_per_batch(self):
+        batches = BucketedBatches(self.sequences, self.labels, batch_size=3, seed=1)
+        seen = np.concatenate(batches.batches)
+        self.assertEqual(sorted(seen.tolist()), list(range(len(self.sequences))))
+        widths = [batches[i][0].shape[1] for i in range(len(batches))]
+        self.assertEqual(sorted(widths), [1, 2, 4, 50])
+        for i in range(len(batches)):
+            X, y = batches[i]
+            self.assertEqual(len(X), len(y))
+
+    def test_indices_subset_and_cap(self):
+        batches = BucketedBatches(self.sequences, self.labels, batch_size=4, max_length=4, indices=[3, 5, 7], shuffle=False)
+        self.assertEqual(len(batches), 1)
+        X, y = batches[0]
+        self.assertEqual(X.shape, (3, 4))
+        self.assertEqual(y.tolist(), self.labels[[7, 5, 3]].tolist())
+
+    def test_fits_variable_length_model(self):
+        model = Sequential()
+        model.add(Embedding(input_dim=20, output_dim=4, input_length=None))
+        model.add(LSTM(4))
+        model.add(Dense(2, activation='softmax'))
+        model.compile(optimizer='adam', loss='categorical_crossentropy')
+        history = model.fit(BucketedBatches(self.sequences, self.labels, batch_size=4, seed=0), epochs=1, verbose=0)
+        self.assertEqual(len(history.history['loss']), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+import data_prep
+from cli import build_parser, main
+from jsonl_io import read_jsonl
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def loaded_modules(self, module):
+        code = f"import sys, {module}; print(','.join(sorted(sys.modules)))"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        return set(output.strip().split(','))
+
+    def test_imports_stay_light(self):
+        for module in ('cli', 'simple_preprocesing', 'data_prep'):
+            loaded = self.loaded_modules(module)
+            for heavy in ('tensorflow', 'keras', 'sklearn', 'pandas', 'fastapi'):
+                self.assertNotIn(heavy, loaded, f"importing {module} loaded {heavy}")
+
+    def test_parse_subcommands(self):
+        parser = build_parser()
+        args = parser.parse_args(['prep', '--workers', '2'])
+        self.assertEqual((args.command, args.workers, args.annotations), ('prep', 2, 'map.json'))
+        args = parser.parse_args(['serve', '--app', 'predict'])
+        self.assertEqual((args.app, args.port, args.metrics_port), ('predict', None, 0))
+        args = parser.parse_args(['serve', '--metrics-port', '8000'])
+        uvicorn = mock.Mock()
+        with mock.patch.dict(sys.modules, {'uvicorn': uvicorn}), mock.patch('cli.start_metrics_server') as start_metrics:
+            self.assertEqual(args.handler(args), 0)
+        start_metrics.assert_called_once_with(8000)
+        self.assertEqual(uvicorn.run.call_args.kwargs['port'], 8001)
+        with self.assertRaises(SystemExit):
+            parser.parse_args([])
+
+    def test_prep_writes_enhanced_annotations(self):
+        dataset_dir = os.path.join(self.temp_dir.name, 'dataset')
+        os.makedirs(dataset_dir)
+        with open(os.path.join(dataset_dir, 'a.c'), 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        annotations_file = os.path.join(self.temp_dir.name, 'map.json')
+        with open(annotations_file, 'w') as f:
+            json.dump({'a.c': {'10': {'char_ranges': [[0, 5]]}}}, f)
+        output_file = os.path.join(self.temp_dir.name, 'enhanced.jsonl.gz')
+
+        cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        with mock.patch.object(data_prep, 'ENHANCEMENT_CACHE_DIRECTORY', cache_dir):
+            status = main(['prep', '--annotations', annotations_file, '--dataset', dataset_dir, '--output', output_file])
+        self.assertEqual(status, 0)
+        records = list(read_jsonl(output_file))
+        self.assertEqual(len(records), 2)  # one positive, one negative
+
+if __name__ == '__main__':
+    unittest.main()
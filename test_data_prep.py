@@ -8,7 +8,12 @@ import unittest
 import json
 import os
 import shutil
+import asyncio
+from unittest import mock
+from fastapi.testclient import TestClient
+import data_prep
 from data_prep import load_json_annotations, enhance_annotations_with_negatives, EnhancedAnnotations, Annotation
+from bounded_executor import BoundedExecutor
 
 class TestDataPrep(unittest.TestCase):
 
@@ -46,6 +51,116 @@ class TestDataPrep(unittest.TestCase):
         negative_samples = [sample for sample in enhanced_annotations.annotations['file1.c'].values() if sample.is_vulnerable == 0]
         self.assertGreater(len(negative_samples), 0)
 
+    def test_enhance_annotations_parallel_is_deterministic(self):
+        for i in range(4):
+            with open(f'./temp_dataset/big{i}.c', 'w') as f:
+                f.write('\n'.join(f'line{n}' for n in range(1, 61)))
+        annotations = {f'big{i}.c': {"30": Annotation(char_ranges=[[0, 4]])} for i in range(4)}
+
+        serial = enhance_annotations_with_negatives(annotations, './temp_dataset', neg_samples_per_positive=3, seed=11)
+        parallel = enhance_annotations_with_negatives(annotations, './temp_dataset', neg_samples_per_positive=3, seed=11, workers=2)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(serial.annotations['big0.c']), 4)
+
+    def test_sample_record_is_a_copy(self):
+        sample = data_prep.EnhancedAnnotation(context=['x'], char_ranges=[[0, 1]], is_vulnerable=1)
+        record = data_prep.sample_record(sample)
+        record['is_vulnerable'] = 0
+        self.assertEqual(sample.is_vulnerable, 1)
+
+    def test_api_enhance_annotations(self):
+        with open('./temp_dataset/big.c', 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        with mock.patch.object(data_prep, 'DATASET_DIRECTORY', './temp_dataset'):
+            response = TestClient(data_prep.app).post('/enhance_annotations/', json={"big.c": {"20": {"char_ranges": [[0, 4]]}}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['annotations']['big.c']['20']['is_vulnerable'], 1)
+
+    def test_create_app_with_explicit_paths(self):
+        with open('./temp_dataset/big.c', 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        client = TestClient(data_prep.create_app('./temp_dataset', 'temp_annotations.json'))
+        response = client.post('/enhance_annotations/', json={"big.c": {"20": {"char_ranges": [[0, 4]]}}})
+        self.assertEqual(response.json()['annotations']['big.c']['20']['is_vulnerable'], 1)
+        data_prep.ANNOTATIONS_RESPONSE_CACHE.clear()
+        self.assertEqual(client.get('/load_annotations/').json(), self.sample_annotations)
+        data_prep.ANNOTATIONS_RESPONSE_CACHE.clear()
+
+    def test_api_returns_503_when_busy(self):
+        with mock.patch.object(data_prep, 'API_EXECUTOR', BoundedExecutor(max_workers=1, max_pending=0)):
+            client = TestClient(data_prep.app)
+            self.assertEqual(client.get('/load_annotations/').status_code, 503)
+            self.assertEqual(client.post('/enhance_annotations/jobs/', json={}).status_code, 503)
+
+    def test_api_enhancement_job_streams_results(self):
+        with open('./temp_dataset/big.c', 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        with mock.patch.object(data_prep, 'DATASET_DIRECTORY', './temp_dataset'):
+            client = TestClient(data_prep.app)
+            response = client.post('/enhance_annotations/jobs/', json={"big.c": {"20": {"char_ranges": [[0, 4]]}}})
+            self.assertEqual(response.status_code, 202)
+            job_id = response.json()['job_id']
+            response = client.get(f'/enhance_annotations/jobs/{job_id}')
+            self.assertEqual(response.status_code, 200)
+            results = {item['file']: item['annotations'] for item in map(json.loads, response.text.splitlines())}
+            self.assertEqual(results['big.c']['20']['is_vulnerable'], 1)
+            self.assertEqual(len(results['big.c']), 2)
+            self.assertEqual(client.get(f'/enhance_annotations/jobs/{job_id}').status_code, 404)
+
+    def test_enhancement_job_buffer_is_bounded(self):
+        for i in range(6):
+            with open(f'./temp_dataset/big{i}.c', 'w') as f:
+                f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        annotations = {f'big{i}.c': {"20": Annotation(char_ranges=[[0, 4]])} for i in range(6)}
+
+        async def run():
+            job = data_prep.EnhancementJob(asyncio.get_running_loop())
+            worker = asyncio.get_running_loop().run_in_executor(None, job.run, annotations)
+            await asyncio.sleep(0.5)
+            self.assertFalse(worker.done())
+            self.assertEqual(job.results.qsize(), 2)
+            job.abandon()
+            await asyncio.wait_for(worker, timeout=5)
+            self.assertIs(job.results.get_nowait(), data_prep._JOB_DONE)
+
+            # Nobody reads this one: its worker gives up after the put timeout on its own.
+            job = data_prep.EnhancementJob(asyncio.get_running_loop())
+            with mock.patch.object(data_prep, 'API_JOB_PUT_TIMEOUT_SECONDS', 0.2):
+                worker = asyncio.get_running_loop().run_in_executor(None, job.run, annotations)
+                await asyncio.wait_for(worker, timeout=5)
+            self.assertTrue(job.abandoned.is_set())
+            await asyncio.sleep(0)
+            self.assertIs(job.results.get_nowait(), data_prep._JOB_DONE)
+
+        with mock.patch.object(data_prep, 'DATASET_DIRECTORY', './temp_dataset'), \
+                mock.patch.object(data_prep, 'API_JOB_MAX_BUFFERED', 2):
+            asyncio.run(run())
+
+    def test_api_load_annotations_is_cached_until_reload(self):
+        with mock.patch.object(data_prep, 'ANNOTATIONS_FILE', 'temp_annotations.json'), \
+                mock.patch.object(data_prep.ANNOTATIONS_CACHE, 'loader', wraps=load_json_annotations) as loader:
+            client = TestClient(data_prep.app)
+            data_prep.ANNOTATIONS_CACHE.clear()
+            self.assertEqual(client.get('/load_annotations/').json(), self.sample_annotations)
+            self.assertEqual(client.get('/load_annotations/').json(), self.sample_annotations)
+            self.assertEqual(loader.call_count, 1)
+            self.assertEqual(client.post('/reload/').status_code, 200)
+            client.get('/load_annotations/')
+            self.assertEqual(loader.call_count, 2)
+
+    def test_api_enhance_annotations_scoped_to_files(self):
+        with open('./temp_dataset/big.c', 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        body = {"big.c": {"20": {"char_ranges": [[0, 4]]}}, "file1.c": {"5": {"char_ranges": [[10, 20]]}}}
+        with mock.patch.object(data_prep, 'DATASET_DIRECTORY', './temp_dataset'):
+            client = TestClient(data_prep.app)
+            response = client.post('/enhance_annotations/', params={"files": ["big.c"]}, json=body)
+            self.assertEqual(list(response.json()['annotations']), ['big.c'])
+            response = client.post('/enhance_annotations/', json=body)
+            self.assertEqual(sorted(response.json()['annotations']), ['big.c', 'file1.c'])
+            response = client.post('/enhance_annotations/', json={"../temp_annotations.json": {}})
+            self.assertEqual(response.status_code, 400)
+
     def tearDown(self):
         # Clean up temporary files
         os.remove('temp_annotations.json')
@@ -2,7 +2,8 @@ import unittest
 import json
 import os
 import shutil
-from dataset_analyzer import load_json_annotations, enhance_annotations_with_negatives, Annotations, EnhancedAnnotations
+from dataset_analyzer import (load_json_annotations, enhance_annotations_with_negatives, Annotations, EnhancedAnnotations,
+                              iter_enhanced_annotations, stream_enhanced_annotations, iter_saved_enhanced_annotations)
 
 class TestDatasetAnalyzer(unittest.TestCase):
 
@@ -40,6 +41,62 @@ class TestDatasetAnalyzer(unittest.TestCase):
         negative_samples = [sample for sample in enhanced_annotations.annotations['file1.c'].values() if sample.is_vulnerable == 0]
         self.assertGreater(len(negative_samples), 0)
 
+    def test_enhance_annotations_parallel_is_deterministic(self):
+        os.makedirs('./temp_dataset', exist_ok=True)
+        sample_annotations = {}
+        for i in range(6):
+            with open(f'./temp_dataset/file{i}.c', 'w') as f:
+                f.write('\n'.join(f'line{n}' for n in range(1, 101)))
+            sample_annotations[f'file{i}.c'] = {"20": [{"start": 0, "end": 4}], "70": [{"start": 2, "end": 6}]}
+        annotations = Annotations(annotations=sample_annotations)
+
+        serial = enhance_annotations_with_negatives(annotations, './temp_dataset', seed=7)
+        parallel = enhance_annotations_with_negatives(annotations, './temp_dataset', seed=7, workers=3)
+        self.assertEqual(serial, parallel)
+
+        for samples in serial.annotations.values():
+            negatives = [int(line) for line, sample in samples.items() if sample.is_vulnerable == 0]
+            self.assertEqual(len(negatives), 2)
+            self.assertTrue(all(abs(line - 20) > 5 and abs(line - 70) > 5 for line in negatives))
+
+    def test_stream_enhanced_annotations(self):
+        os.makedirs('./temp_dataset', exist_ok=True)
+        with open('./temp_dataset/file1.c', 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        annotations = Annotations(annotations={"file1.c": {"5": [{"start": 10, "end": 20}]}})
+
+        self.addCleanup(os.remove, 'temp_enhanced.jsonl.gz')
+        count = stream_enhanced_annotations(iter_enhanced_annotations(annotations, './temp_dataset', seed=3),
+                                            'temp_enhanced.jsonl.gz')
+        self.assertEqual(count, 2)
+        expected = enhance_annotations_with_negatives(annotations, './temp_dataset', seed=3)
+        for filename, line_num, sample in iter_saved_enhanced_annotations('temp_enhanced.jsonl.gz'):
+            self.assertEqual(sample, expected.annotations[filename][line_num])
+
+    def test_enhance_annotations_reuses_cache(self):
+        os.makedirs('./temp_dataset', exist_ok=True)
+        self.addCleanup(shutil.rmtree, './temp_cache')
+        for name in ('file1.c', 'file2.c'):
+            with open(f'./temp_dataset/{name}', 'w') as f:
+                f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        annotations = Annotations(annotations={"file1.c": {"5": [{"start": 10, "end": 20}]},
+                                               "file2.c": {"30": [{"start": 0, "end": 2}]}})
+
+        first = enhance_annotations_with_negatives(annotations, './temp_dataset', seed=5, cache_directory='./temp_cache')
+        cached_entries = sum(len(files) for _, _, files in os.walk('./temp_cache'))
+        self.assertEqual(cached_entries, 2)
+
+        second = enhance_annotations_with_negatives(annotations, './temp_dataset', seed=5, cache_directory='./temp_cache')
+        self.assertEqual(first, second)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk('./temp_cache')), cached_entries)
+
+        with open('./temp_dataset/file2.c', 'w') as f:
+            f.write('\n'.join(f'changed{n}' for n in range(1, 41)))
+        third = enhance_annotations_with_negatives(annotations, './temp_dataset', seed=5, cache_directory='./temp_cache')
+        self.assertEqual(third.annotations['file1.c'], first.annotations['file1.c'])
+        self.assertEqual(third.annotations['file2.c']['30'].context[5], 'changed30')
+        self.assertEqual(sum(len(files) for _, _, files in os.walk('./temp_cache')), cached_entries + 1)
+
     def tearDown(self):
         # Clean up temporary files
         os.remove('temp_annotations.json')
@@ -0,0 +1,34 @@
+import unittest
+import os
+import tempfile
+from dataset_files import is_dataset_filename, select_dataset_files
+
+class TestDatasetFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        for name in ('a.c', 'b.c', 'c.h'):
+            open(os.path.join(self.temp_dir.name, name), 'w').close()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_is_dataset_filename(self):
+        self.assertTrue(is_dataset_filename('file1.c'))
+        for name in ('', '.', '..', '../map.json', 'sub/file.c', '/etc/passwd'):
+            self.assertFalse(is_dataset_filename(name), name)
+
+    def test_defaults_to_annotated_files(self):
+        self.assertEqual(select_dataset_files(self.temp_dir.name, {'b.c': {}, 'missing.c': {}}), ['b.c', 'missing.c'])
+
+    def test_explicit_files_and_pattern(self):
+        annotated = {'a.c': {}}
+        self.assertEqual(select_dataset_files(self.temp_dir.name, annotated, files=['c.h', 'c.h']), ['c.h'])
+        self.assertEqual(select_dataset_files(self.temp_dir.name, annotated, pattern='*.c'), ['a.c', 'b.c'])
+
+    def test_rejects_escaping_names(self):
+        with self.assertRaises(ValueError):
+            select_dataset_files(self.temp_dir.name, {'../map.json': {}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import os
+import tempfile
+from enhancement_cache import EnhancementCache, hash_file
+
+class TestEnhancementCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = EnhancementCache(os.path.join(self.temp_dir.name, 'cache'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_hash_file(self):
+        path = os.path.join(self.temp_dir.name, 'file1.c')
+        with open(path, 'w') as f:
+            f.write('int main() {}\n')
+        first = hash_file(path)
+        with open(path, 'a') as f:
+            f.write('\n')
+        self.assertNotEqual(first, hash_file(path))
+
+    def test_make_key_depends_on_all_inputs(self):
+        entries = {"5": [{"start": 10, "end": 20}]}
+        key = EnhancementCache.make_key("abc", entries, context_range=5, neg_samples_per_positive=1, seed=1)
+        self.assertEqual(key, EnhancementCache.make_key("abc", entries, seed=1, neg_samples_per_positive=1, context_range=5))
+        self.assertNotEqual(key, EnhancementCache.make_key("abd", entries, context_range=5, neg_samples_per_positive=1, seed=1))
+        self.assertNotEqual(key, EnhancementCache.make_key("abc", {"6": entries["5"]}, context_range=5, neg_samples_per_positive=1, seed=1))
+        self.assertNotEqual(key, EnhancementCache.make_key("abc", entries, context_range=3, neg_samples_per_positive=1, seed=1))
+        self.assertNotEqual(key, EnhancementCache.make_key("abc", entries, context_range=5, neg_samples_per_positive=1, seed=2))
+
+    def test_get_put(self):
+        key = EnhancementCache.make_key("abc", {})
+        self.assertIsNone(self.cache.get(key))
+        samples = {"5": {"context": ["line5"], "char_ranges": [], "is_vulnerable": 1}}
+        self.cache.put(key, samples)
+        self.assertEqual(self.cache.get(key), samples)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import pickle
+import shutil
+import data_prep
+import dataset_analyzer
+from annotation_store import AnnotationStore
+
+class TestEnhancementPipeline(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs('./temp_dataset', exist_ok=True)
+        with open('./temp_dataset/file1.c', 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+
+    def test_pipeline_pickles_by_module(self):
+        for pipeline in (data_prep.PIPELINE, dataset_analyzer.PIPELINE):
+            restored = pickle.loads(pickle.dumps(pipeline))
+            self.assertIs(type(restored), type(pipeline))
+            self.assertEqual(restored.module, pipeline.module)
+            self.assertEqual(restored.metrics.module, pipeline.module)
+
+    def test_scripts_share_samples_in_their_own_models(self):
+        prep = data_prep.enhance_file_annotations(
+            './temp_dataset/file1.c', {"20": data_prep.Annotation(char_ranges=[[0, 4]])}, seed=3
+        )
+        analyzer = dataset_analyzer.enhance_file_annotations(
+            './temp_dataset/file1.c', {"20": [dataset_analyzer.CharRange(start=0, end=4)]}, seed=3
+        )
+        self.assertEqual(sorted(prep), sorted(analyzer))
+        self.assertIsInstance(prep["20"], data_prep.EnhancedAnnotation)
+        self.assertIsInstance(analyzer["20"], dataset_analyzer.AnnotationSample)
+        self.assertEqual(prep["20"].context, analyzer["20"].context)
+        self.assertEqual(data_prep.sample_record(prep["20"])["char_ranges"], [[0, 4]])
+        self.assertEqual(dataset_analyzer.sample_record(analyzer["20"])["char_ranges"], [{"start": 0, "end": 4}])
+        for sample in analyzer.values():
+            self.assertEqual(dataset_analyzer.sample_from_record(dataset_analyzer.sample_record(sample)), sample)
+
+    def test_annotated_lines_from_store(self):
+        store = AnnotationStore.from_mapping({"file1.c": {"5": {"char_ranges": [[1, 2]]}, "9": [[3, 4], [5, 6]]}})
+        file_annotations = store.file_annotations("file1.c")
+        self.assertEqual(data_prep.annotated_lines(file_annotations), [(5, [[1, 2]]), (9, [[3, 4], [5, 6]])])
+        self.assertEqual(dataset_analyzer.annotated_lines(file_annotations)[1],
+                         (9, [dataset_analyzer.CharRange(start=3, end=4), dataset_analyzer.CharRange(start=5, end=6)]))
+
+    def tearDown(self):
+        shutil.rmtree('./temp_dataset')
+
+if __name__ == '__main__':
+    unittest.main()
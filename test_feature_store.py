@@ -0,0 +1,74 @@
+import unittest
+import json
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+from feature_store import (MANIFEST_FILE, FeatureStore, assign_splits, feature_store_exists, source_stamp,
+                           stable_row_hash, write_feature_store)
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.temp_dir.name, 'store')
+        self.sequences = [np.arange(i % 5, dtype=np.int32) + 1 for i in range(23)]
+        self.hashes = [stable_row_hash(f'program {i}') for i in range(23)]
+        self.labels = np.arange(23) % 2
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_stable_hash_and_splits(self):
+        self.assertEqual(stable_row_hash('abc'), stable_row_hash('abc'))
+        self.assertNotEqual(stable_row_hash('abc'), stable_row_hash('abd'))
+        splits = assign_splits(self.hashes)
+        self.assertEqual(splits.tolist(), assign_splits(self.hashes[::-1])[::-1].tolist())
+
+    def test_round_trip_is_memory_mapped(self):
+        self.assertFalse(feature_store_exists(self.directory))
+        vocabulary_path = os.path.join(self.temp_dir.name, 'vocab.json')
+        store = write_feature_store(self.directory, self.sequences, self.labels, self.hashes,
+                                    class_names=['a', 'b'], vocabulary_path=vocabulary_path, rows_per_shard=10)
+        self.assertTrue(feature_store_exists(self.directory))
+        self.assertEqual(store.shard_names, ['shard-00000', 'shard-00001', 'shard-00002'])
+        self.assertEqual((store.num_rows, store.num_classes, store.class_names), (23, 2, ['a', 'b']))
+        self.assertEqual(store.manifest['vocabulary'], os.path.join(os.pardir, 'vocab.json'))
+        self.assertEqual(store.vocabulary_path, vocabulary_path)
+
+        reopened = FeatureStore(self.directory)
+        self.assertIsInstance(reopened.shard('shard-00001')['values'], np.memmap)
+        sequences = reopened.sequences()
+        self.assertEqual(len(sequences), 23)
+        self.assertEqual([sequences[i].tolist() for i in range(23)], [s.tolist() for s in self.sequences])
+        self.assertEqual(sequences.lengths.tolist(), [len(s) for s in self.sequences])
+        self.assertEqual(reopened.labels().tolist(), self.labels.tolist())
+        all_rows = np.concatenate([reopened.split_indices(split) for split in ('train', 'val', 'test')])
+        self.assertEqual(sorted(all_rows.tolist()), list(range(23)))
+
+    def test_source_stamp_and_rebuild(self):
+        source_file = os.path.join(self.temp_dir.name, 'data.csv')
+        with open(source_file, 'w') as f:
+            f.write('a,b\n')
+        stamp = source_stamp([source_file, os.path.join(self.temp_dir.name, 'missing.json')])
+        self.assertEqual(stamp[1][1:], [None, None])
+        write_feature_store(self.directory, self.sequences, self.labels, self.hashes, source_stamp=stamp)
+        self.assertTrue(feature_store_exists(self.directory, json.loads(json.dumps(stamp))))
+        with open(source_file, 'a') as f:
+            f.write('c,d\n')
+        self.assertFalse(feature_store_exists(self.directory, source_stamp([source_file, stamp[1][0]])))
+
+        # A rebuild that fails part-way leaves no manifest over the half-written shards.
+        with mock.patch('feature_store.np.save', side_effect=OSError('disk full')), self.assertRaises(OSError):
+            write_feature_store(self.directory, self.sequences, self.labels, self.hashes)
+        self.assertFalse(feature_store_exists(self.directory))
+
+    def test_rejects_unknown_version(self):
+        write_feature_store(self.directory, self.sequences, self.labels, self.hashes)
+        with open(os.path.join(self.directory, MANIFEST_FILE), 'w') as f:
+            f.write('{"version": 99}')
+        with self.assertRaises(ValueError):
+            FeatureStore(self.directory)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import json
+import os
+import tempfile
+from unittest import mock
+from fastapi.testclient import TestClient
+import inference_service
+from inference_service import VulnerabilityClassifier
+from simple_preprocesing import build_model
+from tokenization import Vocabulary
+
+class TestInferenceService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.sources = ['char buf[8]; strcpy(buf, input);', 'query = "SELECT " + name', 'free(p); use(p);']
+        vocabulary = Vocabulary.build(cls.sources)
+        cls.paths = {
+            'MODEL_FILE': os.path.join(cls.temp_dir.name, 'model.keras'),
+            'VOCABULARY_FILE': os.path.join(cls.temp_dir.name, 'vocabulary.json'),
+            'CLASS_MAP_FILE': os.path.join(cls.temp_dir.name, 'class_map.json'),
+        }
+        vocabulary.save(cls.paths['VOCABULARY_FILE'])
+        with open(cls.paths['CLASS_MAP_FILE'], 'w') as f:
+            json.dump(['Buffer Overflow', 'SQL Injection', 'Use After Free'], f)
+        build_model(vocabulary, max_length=None, output_dim=3, sparse_labels=True).save(cls.paths['MODEL_FILE'])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def test_classifier_pads_per_batch(self):
+        classifier = VulnerabilityClassifier.load(
+            self.paths['MODEL_FILE'], self.paths['VOCABULARY_FILE'], self.paths['CLASS_MAP_FILE']
+        )
+        self.assertEqual(classifier.encode(self.sources[1:2]).shape, (1, 3))
+        self.assertEqual(classifier.encode(self.sources).shape, (3, 6))
+        predictions = classifier.predict(self.sources)
+        self.assertEqual(len(predictions), 3)
+        for prediction in predictions:
+            self.assertIn(prediction.label, classifier.class_names)
+            self.assertTrue(0 <= prediction.score <= 1)
+
+    def test_predict_endpoint(self):
+        with mock.patch.multiple(inference_service, **self.paths):
+            with TestClient(inference_service.app) as client:
+                response = client.post('/predict', json={"sources": self.sources})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()["predictions"]), 3)
+                self.assertEqual(client.post('/predict', json={"sources": []}).status_code, 422)
+        self.assertFalse(inference_service.BATCHER.running)
+
+if __name__ == '__main__':
+    unittest.main()
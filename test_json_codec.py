@@ -0,0 +1,64 @@
+import unittest
+import json
+import os
+import tempfile
+import json_codec
+from json_codec import get_codec
+import dataset_analyzer
+from dataset_analyzer import AnnotationSample, CharRange, EnhancedAnnotations
+
+class TestJsonCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.value = {"file.c": {"5": {"context": ["int x;", "naïve"], "char_ranges": [[0, 3]], "is_vulnerable": 1}}}
+
+    def test_backends_agree(self):
+        stdlib = get_codec("json")
+        for backend in ("orjson", "msgspec"):
+            try:
+                codec = get_codec(backend)
+            except ImportError:
+                continue
+            self.assertEqual(codec.loads(codec.dumps(self.value)), self.value)
+            self.assertEqual(stdlib.loads(codec.dumps(self.value)), self.value)
+            self.assertEqual(codec.loads(stdlib.dumps(self.value).decode('utf-8')), self.value)
+            self.assertEqual(json.loads(codec.dumps(self.value, pretty=True)), self.value)
+            with self.assertRaises(json.JSONDecodeError):
+                codec.loads(b'{"broken": ')
+
+    def test_compact_output_and_backend_selection(self):
+        codec = get_codec("json")
+        self.assertEqual(codec.dumps({"a": [1, 2]}), b'{"a":[1,2]}')
+        self.assertIn(b'\n', codec.dumps({"a": [1, 2]}, pretty=True))
+        self.assertIn(get_codec().name, json_codec.BACKENDS)
+        with self.assertRaises(ValueError):
+            get_codec("yaml")
+
+    def test_analyzer_save_and_trusted_load(self):
+        sample = AnnotationSample.construct(
+            context=["int x;"], char_ranges=[CharRange.construct(start=0, end=3)], is_vulnerable=1
+        )
+        enhanced = EnhancedAnnotations.construct(annotations={"file.c": {"5": sample}})
+        compact_path = os.path.join(self.temp_dir.name, 'compact.json')
+        pretty_path = os.path.join(self.temp_dir.name, 'pretty.json')
+        dataset_analyzer.save_enhanced_annotations(enhanced, compact_path)
+        dataset_analyzer.save_enhanced_annotations(enhanced, pretty_path, pretty=True)
+        with open(compact_path) as f:
+            compact = f.read()
+        self.assertNotIn('\n', compact)
+        with open(pretty_path) as f:
+            self.assertEqual(json.load(f), json.loads(compact))
+        self.assertEqual(EnhancedAnnotations(**json.loads(compact)), enhanced)
+
+        annotations_path = os.path.join(self.temp_dir.name, 'map.json')
+        with open(annotations_path, 'w') as f:
+            json.dump({"file.c": {"5": [{"start": 0, "end": 3}]}}, f)
+        validated = dataset_analyzer.load_json_annotations(annotations_path)
+        trusted = dataset_analyzer.load_json_annotations(annotations_path, validate=False)
+        self.assertEqual(trusted, validated)
+        self.assertIsInstance(trusted.annotations["file.c"]["5"][0], CharRange)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import gzip
+import os
+import tempfile
+from jsonl_io import read_jsonl, write_jsonl
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class TestJsonlIO(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.records = [{"file": "file1.c", "line": str(i), "context": ["a b", "c"], "is_vulnerable": i % 2}
+                        for i in range(5)]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip_plain(self):
+        path = os.path.join(self.temp_dir.name, 'out.jsonl')
+        self.assertEqual(write_jsonl(iter(self.records), path), 5)
+        self.assertEqual(list(read_jsonl(path)), self.records)
+        with open(path) as f:
+            first_line = f.readline()
+        self.assertNotIn(' ', first_line.replace('a b', ''))
+
+    def test_round_trip_gzip(self):
+        path = os.path.join(self.temp_dir.name, 'out.jsonl.gz')
+        write_jsonl(self.records, path)
+        with gzip.open(path, 'rt') as f:
+            self.assertEqual(len(f.readlines()), 5)
+        self.assertEqual(list(read_jsonl(path)), self.records)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_round_trip_zstd(self):
+        path = os.path.join(self.temp_dir.name, 'out.jsonl.zst')
+        write_jsonl(self.records, path)
+        self.assertEqual(list(read_jsonl(path)), self.records)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from line_index import LineIndex, build_line_offsets, default_index_directory
+from dataset_analyzer import get_context_lines
+
+class TestLineIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.index_dir = os.path.join(self.temp_dir.name, 'index')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_build_line_offsets(self):
+        self.assertEqual(list(build_line_offsets(b'')), [0])
+        self.assertEqual(list(build_line_offsets(b'a\nbb\n')), [0, 2, 5])
+        self.assertEqual(list(build_line_offsets(b'a\nbb')), [0, 2, 4])
+        self.assertEqual(list(build_line_offsets(b'\n\n')), [0, 1, 2])
+
+    def test_matches_get_context_lines(self):
+        contents = ['', 'single', 'a\n  b   c \n\td\n', '\n'.join(f'  line {n}\t x' for n in range(1, 30))]
+        for i, content in enumerate(contents):
+            path = self.write(f'file{i}.c', content)
+            with open(path) as f:
+                file_lines = f.readlines()
+            with LineIndex(path) as line_index:
+                self.assertEqual(len(line_index), len(file_lines))
+                for line_number in range(0, len(file_lines) + 3):
+                    for context_range in (0, 2, 5):
+                        self.assertEqual(line_index.context_lines(line_number, context_range),
+                                         get_context_lines(file_lines, line_number, context_range))
+
+    def test_persisted_index(self):
+        path = self.write('file1.c', 'a\nb\nc\n')
+        with LineIndex(path, self.index_dir) as line_index:
+            self.assertEqual(len(line_index), 3)
+        index_path = os.path.join(self.index_dir, 'file1.c.idx')
+        self.assertTrue(os.path.exists(index_path))
+
+        with LineIndex(path, self.index_dir) as line_index:
+            self.assertEqual(list(line_index._load_offsets()), [0, 2, 4, 6])
+
+        self.write('file1.c', 'a\nb\nc\nd\ne\n')
+        with LineIndex(path, self.index_dir) as line_index:
+            self.assertIsNone(line_index._load_offsets())
+            self.assertEqual(len(line_index), 5)
+
+    def test_unwritable_index_directory(self):
+        path = self.write('file.c', 'a\nb\nc\n')
+        with mock.patch('line_index.os.replace', side_effect=PermissionError("read-only")):
+            with LineIndex(path, self.index_dir) as line_index:
+                self.assertEqual(line_index.context_lines(2, 1), ['a', 'b', 'c'])
+        self.assertEqual(os.listdir(self.index_dir), [])
+
+    def test_read_into_memory(self):
+        path = self.write('file1.c', 'a\n  b  c\n')
+        line_index = LineIndex.read(path)
+        self.assertIsInstance(line_index.buffer, bytes)
+        self.assertEqual(line_index.context_lines(1, 1), ['a', 'b c'])
+
+    def test_nbytes_counts_offsets_and_normalized_lines(self):
+        line_index = LineIndex.read(self.write('file1.c', 'a\n  b  c\nd\n'))
+        self.assertEqual(line_index.nbytes, 11)
+        line_index.context_lines(1, 0)
+        with_one_line = line_index.nbytes
+        self.assertGreater(with_one_line, 11 + 4 * 8)
+        line_index.context_lines(1, 0)
+        self.assertEqual(line_index.nbytes, with_one_line)
+        line_index.context_lines(3, 0)
+        self.assertGreater(line_index.nbytes, with_one_line)
+
+    def test_default_index_directory(self):
+        self.assertEqual(default_index_directory('./Dataset_1/'), 'Dataset_1.lineidx')
+
+if __name__ == '__main__':
+    unittest.main()
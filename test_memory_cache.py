@@ -0,0 +1,86 @@
+import unittest
+import os
+import tempfile
+from memory_cache import FileCache
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.loads = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def loader(self, path):
+        self.loads.append(path)
+        with open(path) as f:
+            return f.read()
+
+    def write(self, name, content, mtime_ns=None):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_hit_and_invalidation(self):
+        cache = FileCache(self.loader)
+        path = self.write('a.txt', 'one', mtime_ns=10**18)
+        self.assertEqual(cache.get(path), 'one')
+        self.assertEqual(cache.get(path), 'one')
+        self.assertEqual(len(self.loads), 1)
+
+        self.write('a.txt', 'two', mtime_ns=2 * 10**18)
+        self.assertEqual(cache.get(path), 'two')
+        self.assertEqual(len(self.loads), 2)
+
+        cache.clear()
+        self.assertEqual(cache.get(path), 'two')
+        self.assertEqual(len(self.loads), 3)
+
+    def test_lru_eviction_by_size(self):
+        cache = FileCache(self.loader, max_bytes=10)
+        a = self.write('a.txt', 'aaaa')
+        b = self.write('b.txt', 'bbbb')
+        c = self.write('c.txt', 'cccc')
+        big = self.write('big.txt', 'x' * 11)
+        cache.get(a)
+        cache.get(b)
+        cache.get(a)
+        cache.get(c)
+        self.assertIn(a, cache)
+        self.assertNotIn(b, cache)
+        self.assertIn(c, cache)
+        self.assertEqual(cache.current_bytes, 8)
+
+        self.assertEqual(cache.get(big), 'x' * 11)
+        self.assertNotIn(big, cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_weigher_and_reweighing_on_hit(self):
+        cache = FileCache(lambda path: [self.loader(path)], max_bytes=10, weigher=lambda value: 4 * len(value))
+        a = self.write('a.txt', 'a')
+        b = self.write('b.txt', 'b')
+        first = cache.get(a)
+        cache.get(b)
+        self.assertEqual(cache.current_bytes, 8)
+
+        # The cached value grows; the next hit re-weighs it and evicts the LRU entry.
+        first.append('more')
+        self.assertIs(cache.get(a), first)
+        self.assertEqual(cache.current_bytes, 8)
+        self.assertNotIn(b, cache)
+
+        first.extend(['x', 'y'])
+        cache.get(a)
+        self.assertEqual((len(cache), cache.current_bytes), (0, 0))
+
+    def test_missing_file_raises(self):
+        cache = FileCache(self.loader)
+        with self.assertRaises(FileNotFoundError):
+            cache.get(os.path.join(self.temp_dir.name, 'missing.txt'))
+
+if __name__ == '__main__':
+    unittest.main()
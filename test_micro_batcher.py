@@ -0,0 +1,71 @@
+import unittest
+import asyncio
+from bounded_executor import QueueFullError
+from micro_batcher import MicroBatcher
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_requests_share_batches(self):
+        batches = []
+
+        def double(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        async def run():
+            batcher = MicroBatcher(double, max_batch_size=4, max_delay_ms=50)
+            batcher.start()
+            results = await asyncio.gather(*(batcher.submit([i, i + 100]) for i in range(5)))
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(results, [[2 * i, 2 * (i + 100)] for i in range(5)])
+        self.assertEqual(sorted(len(batch) for batch in batches), [2, 4, 4])
+
+    def test_errors_and_backpressure(self):
+        def fail(items):
+            raise ValueError("bad batch")
+
+        async def run():
+            batcher = MicroBatcher(fail, max_delay_ms=1, max_pending=2)
+            with self.assertRaises(RuntimeError):
+                await batcher.submit([1])
+            batcher.start()
+            with self.assertRaises(QueueFullError):
+                await batcher.submit([1, 2, 3])
+            with self.assertRaises(ValueError):
+                await batcher.submit([1])
+            await batcher.stop()
+
+        asyncio.run(run())
+
+    def test_short_results_and_stop_while_collecting(self):
+        error = ValueError("bad batch")
+
+        def drop_last(items):
+            if items == ['raise']:
+                raise error
+            return [item.upper() for item in items[:-1]]
+
+        async def run():
+            batcher = MicroBatcher(drop_last, max_batch_size=3, max_delay_ms=50)
+            batcher.start()
+            results = await asyncio.gather(*(batcher.submit([item]) for item in 'abc'), return_exceptions=True)
+            self.assertEqual(results[:2], [['A'], ['B']])
+            self.assertIsInstance(results[2], RuntimeError)
+            with self.assertRaises(ValueError) as raised:
+                await batcher.submit(['raise'])
+            self.assertIs(raised.exception, error)
+
+            # The first item is already taken off the queue when the batcher is stopped.
+            pending = asyncio.ensure_future(batcher.submit(['x']))
+            await asyncio.sleep(0.01)
+            await batcher.stop()
+            with self.assertRaisesRegex(RuntimeError, 'stopped'):
+                await pending
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import json
+import os
+import random
+import tempfile
+from near_dedup import compute_signatures, find_near_duplicates, normalize_tokens
+
+_CALLS = ('malloc', 'free', 'strcpy', 'strncpy', 'strcat', 'memcpy', 'memset', 'printf', 'scanf', 'fgets', 'strlen', 'atoi')
+_STATEMENTS = (
+    'x = {0}(x, y);', 'if (x > y) {{ {0}(x); }}', 'while (x) {{ x = {0}(y); }}', 'return {0}(x);',
+    'for (int i = 0; i < x; i++) {{ {0}(y[i]); }}', 'char *p = {0}(x, y, z);', 'switch (x) {{ case 1: {0}(y); break; }}',
+)
+
+def _program(rng, statements=30):
+    lines = [rng.choice(_STATEMENTS).format(rng.choice(_CALLS)) for _ in range(statements)]
+    return "int main(int argc, char **argv) {\n" + "\n".join(lines) + "\n}"
+
+class TestNearDedup(unittest.TestCase):
+
+    def test_normalize_tokens(self):
+        a = 'int main() { char buf[10]; strcpy(buf, argv[1]); // copy\n printf("%s", buf); }'
+        b = 'int main(){\n  char data[64];\n  /* renamed */ strcpy(data, input[2]);\n  printf("%d\\n", data);\n}'
+        self.assertEqual(normalize_tokens(a), normalize_tokens(b))
+        self.assertEqual(normalize_tokens('strncpy(x, "a//b", 9);'), ['strncpy', '(', 'ID', ',', 'STR', ',', 'NUM', ')', ';'])
+
+    def test_collapses_near_duplicates_within_label(self):
+        rng = random.Random(0)
+        programs = [_program(rng) for _ in range(50)]
+        renamed = programs[3].replace('argv', 'args').replace('\n', '\n    ')
+        edited = programs[7].split('\n')
+        edited[10] = 'free(tmp);'
+        texts = programs + [renamed, '\n'.join(edited), programs[9]]
+        labels = ['A'] * 50 + ['A', 'A', 'B']
+
+        keep, report = find_near_duplicates(texts, labels, row_ids=[f'r{i}' for i in range(len(texts))])
+        self.assertEqual(keep.tolist(), [True] * 50 + [False, False, True])
+        self.assertEqual((report.rows, report.kept, report.exact_duplicates, report.near_duplicates), (53, 51, 1, 1))
+        self.assertEqual(sorted(cluster['rows'] for cluster in report.clusters), [['r3', 'r50'], ['r7', 'r51']])
+
+    def test_parallel_signatures_match_serial(self):
+        rng = random.Random(1)
+        texts = [_program(rng, statements=5) for _ in range(30)]
+        serial = compute_signatures(texts, chunksize=7)
+        parallel = compute_signatures(texts, workers=2, chunksize=7)
+        self.assertTrue((serial[0] == parallel[0]).all())
+        self.assertTrue((serial[1] == parallel[1]).all())
+
+    def test_report_save(self):
+        keep, report = find_near_duplicates(['int x;', 'int y;', ''])
+        self.assertEqual(keep.tolist(), [True, False, True])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'reports', 'dedup.json')
+            report.save(path)
+            with open(path) as f:
+                saved = json.load(f)
+        self.assertEqual((saved['rows'], saved['removed'], saved['params']['num_perm']), (3, 1, 128))
+        with self.assertRaises(ValueError):
+            find_near_duplicates(['int x;'], num_bands=3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import random
+from negative_sampler import merge_windows, NegativeSampler
+
+class TestNegativeSampler(unittest.TestCase):
+
+    def test_merge_windows(self):
+        self.assertEqual(merge_windows([10, 3, 14], 2, 20), [(1, 5), (8, 16)])
+        self.assertEqual(merge_windows([19], 5, 20), [(14, 20)])
+        self.assertEqual(merge_windows([], 5, 20), [])
+
+    def test_available_lines(self):
+        sampler = NegativeSampler(20, [3, 10, 14], 2)
+        self.assertEqual(sampler.available, 6)
+        self.assertEqual([sampler.line_at(i) for i in range(sampler.available)], [6, 7, 17, 18, 19, 20])
+        with self.assertRaises(IndexError):
+            sampler.line_at(6)
+
+    def test_sample_excludes_all_positive_windows(self):
+        positives = [50, 120, 400, 401, 900]
+        sampler = NegativeSampler(1000, positives, 5)
+        samples = sampler.sample(500, random.Random(0))
+        self.assertEqual(len(samples), len(set(samples)))
+        self.assertEqual(len(samples), 500)
+        for line in samples:
+            self.assertTrue(1 <= line <= 1000)
+            self.assertTrue(all(abs(line - positive) > 5 for positive in positives))
+
+    def test_sample_caps_at_available(self):
+        sampler = NegativeSampler(7, [5], 5)
+        self.assertEqual(sampler.available, 0)
+        self.assertEqual(sampler.sample(3), [])
+        sampler = NegativeSampler(12, [1], 5)
+        self.assertEqual(sorted(sampler.sample(10)), [7, 8, 9, 10, 11, 12])
+
+    def test_sample_is_deterministic_for_seed(self):
+        sampler = NegativeSampler(10000, [100, 5000], 5)
+        self.assertEqual(sampler.sample(20, random.Random(42)), sampler.sample(20, random.Random(42)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import os
+import tempfile
+from fastapi.testclient import TestClient
+import data_prep
+import dataset_analyzer
+from data_prep import Annotation, enhance_annotations_with_negatives
+from prep_metrics import REGISTRY
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+class TestPrepMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        with open(os.path.join(self.temp_dir.name, 'a.c'), 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+
+    def test_registry_is_shared(self):
+        self.assertIs(data_prep.REGISTRY, dataset_analyzer.REGISTRY)
+
+    def test_stage_and_volume_metrics(self):
+        before = {
+            'files': sample_value('data_prep_files_processed_total', module='data_prep'),
+            'positive': sample_value('data_prep_samples_emitted_total', module='data_prep', is_vulnerable='1'),
+            'negative': sample_value('data_prep_samples_emitted_total', module='data_prep', is_vulnerable='0'),
+            'bytes': sample_value('data_prep_bytes_read_total', module='data_prep'),
+            'sampling': sample_value('data_prep_stage_duration_seconds_count', module='data_prep', stage='sample_negatives'),
+            'read_errors': sample_value('data_prep_stage_errors_total', module='data_prep', stage='read_file'),
+        }
+        annotations = {'a.c': {'10': Annotation(char_ranges=[[0, 5]])}, 'missing.c': {'1': Annotation(char_ranges=[])}}
+        enhance_annotations_with_negatives(annotations, self.temp_dir.name, neg_samples_per_positive=2, seed=1)
+
+        self.assertEqual(sample_value('data_prep_files_processed_total', module='data_prep') - before['files'], 1)
+        self.assertEqual(sample_value('data_prep_samples_emitted_total', module='data_prep', is_vulnerable='1') - before['positive'], 1)
+        self.assertEqual(sample_value('data_prep_samples_emitted_total', module='data_prep', is_vulnerable='0') - before['negative'], 2)
+        self.assertEqual(
+            sample_value('data_prep_bytes_read_total', module='data_prep') - before['bytes'],
+            os.path.getsize(os.path.join(self.temp_dir.name, 'a.c'))
+        )
+        self.assertEqual(
+            sample_value('data_prep_stage_duration_seconds_count', module='data_prep', stage='sample_negatives') - before['sampling'], 1
+        )
+        self.assertEqual(sample_value('data_prep_stage_errors_total', module='data_prep', stage='read_file') - before['read_errors'], 1)
+        self.assertEqual(sample_value('data_prep_jobs_in_flight', module='data_prep'), 0)
+
+    def test_api_request_metrics(self):
+        labels = dict(endpoint='api_reload', method='POST', status='200')
+        before = sample_value('data_prep_api_request_duration_seconds_count', **labels)
+        self.assertEqual(TestClient(data_prep.app).post('/reload/').status_code, 200)
+        self.assertEqual(sample_value('data_prep_api_request_duration_seconds_count', **labels) - before, 1)
+        self.assertEqual(sample_value('data_prep_api_requests_in_flight'), 0)
+
+if __name__ == '__main__':
+    unittest.main()
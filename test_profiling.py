@@ -0,0 +1,87 @@
+import unittest
+import json
+import os
+import pstats
+import tempfile
+import tracemalloc
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import data_prep
+from data_prep import Annotation, enhance_annotations_with_negatives
+from profiling import ACTIVE_PROFILER, PROFILE_ID_HEADER, RunProfiler, install_request_profiling, profiled_run
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.dataset_dir = os.path.join(self.temp_dir.name, 'dataset')
+        self.profile_dir = os.path.join(self.temp_dir.name, 'profiles')
+        os.makedirs(self.dataset_dir)
+        with open(os.path.join(self.dataset_dir, 'a.c'), 'w') as f:
+            f.write('\n'.join(f'line{n}' for n in range(1, 41)))
+        self.annotations = {'a.c': {'10': Annotation(char_ranges=[[0, 5]])}}
+
+    def test_disabled_run_writes_nothing(self):
+        with profiled_run(None) as profiler:
+            self.assertIsNone(profiler)
+            self.assertIsNone(ACTIVE_PROFILER.get())
+            enhance_annotations_with_negatives(self.annotations, self.dataset_dir, seed=1)
+        self.assertFalse(os.path.exists(self.profile_dir))
+
+    def test_profiled_run_writes_trace_stats_and_allocations(self):
+        with profiled_run(self.profile_dir, "test") as profiler:
+            enhance_annotations_with_negatives(self.annotations, self.dataset_dir, seed=1)
+        self.assertIsNone(ACTIVE_PROFILER.get())
+        base = os.path.join(self.profile_dir, profiler.name)
+        with open(base + '.trace.json') as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual(
+            sorted(event['name'] for event in events), ['enhance', 'read_file', 'sample_negatives']
+        )
+        self.assertTrue(all(event['ph'] == 'X' and event['cat'] == 'data_prep' for event in events))
+        stats = pstats.Stats(base + '.pstats')
+        self.assertTrue(any(name == 'enhance_file_annotations' for _, _, name in stats.stats))
+        self.assertTrue(os.path.exists(base + '.allocations.txt'))
+
+    def test_overlapping_profiles_share_tracemalloc(self):
+        first = RunProfiler(self.profile_dir, 'first', profile_thread=False).start()
+        second = RunProfiler(self.profile_dir, 'second', profile_thread=False).start()
+        second.stop()
+        first.stop()
+        first.write()
+        self.assertTrue(tracemalloc.is_tracing())
+        second.write()
+        self.assertFalse(tracemalloc.is_tracing())
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        with RunProfiler(self.profile_dir, 'third', profile_thread=False):
+            pass
+        self.assertTrue(tracemalloc.is_tracing())
+
+    def test_request_profiling_header(self):
+        app = FastAPI()
+        install_request_profiling(app, self.profile_dir)
+        app.include_router(data_prep.app.router)
+        client = TestClient(app)
+
+        response = client.post('/reload/')
+        self.assertNotIn(PROFILE_ID_HEADER, response.headers)
+        self.assertFalse(os.path.exists(self.profile_dir))
+
+        payload = {'a.c': {'10': {'char_ranges': [[0, 5]]}}}
+        with mock.patch.object(data_prep, 'DATASET_DIRECTORY', self.dataset_dir):
+            response = client.post('/enhance_annotations/', json=payload, headers={'X-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        base = os.path.join(self.profile_dir, response.headers[PROFILE_ID_HEADER])
+        with open(base + '.trace.json') as f:
+            names = {event['name'] for event in json.load(f)['traceEvents']}
+        self.assertIn('/enhance_annotations/', names)
+        self.assertIn('sample_negatives', names)
+        stats = pstats.Stats(base + '.pstats')
+        self.assertTrue(any(name == 'enhance_annotations_with_negatives' for _, _, name in stats.stats))
+
+if __name__ == '__main__':
+    unittest.main()
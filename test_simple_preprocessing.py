@@ -2,8 +2,11 @@ import unittest
 import pandas as pd
 import numpy as np
 import gzip
+import json
 import os
+import tempfile
 from simple_preprocesing import *
+from tokenization import Vocabulary
 
 class TestSimplePreprocessing(unittest.TestCase):
 
@@ -33,11 +36,51 @@ class TestSimplePreprocessing(unittest.TestCase):
         self.assertIn('Source code', dataset.columns)
         self.assertIn('Vulnerability type', dataset.columns)
 
+    def test_iter_data_chunks(self):
+        data = pd.DataFrame({
+            'Source code': ['a', 'b', 'a', None, 'c', 'b', 'd'],
+            'Vulnerability type': ['X', 'Y', 'X', 'Y', 'Z', 'Y', None],
+            'Unused': range(7)
+        })
+        file_path = 'test_chunks.csv.gz'
+        self.addCleanup(os.remove, file_path)
+        with gzip.open(file_path, 'wt') as f:
+            data.to_csv(f, index=False)
+
+        chunks = list(iter_data_chunks(file_path, chunksize=2))
+        streamed = pd.concat(chunks, ignore_index=True)
+        self.assertEqual(list(streamed.columns), ['Source code', 'Vulnerability type'])
+        self.assertEqual(streamed['Source code'].tolist(), ['a', 'b', 'c'])
+        expected = clean_data(pd.read_csv(file_path)[['Source code', 'Vulnerability type']])
+        self.assertEqual(len(streamed), len(expected))
+
+        dataset = load_and_inspect_data(file_path, chunksize=2)
+        self.assertEqual(dataset['Source code'].tolist(), ['a', 'b', 'c'])
+
     def test_clean_data(self):
         dataset = load_and_inspect_data(self.test_file_path)
         cleaned_data = clean_data(dataset)
         self.assertEqual(len(cleaned_data), len(dataset))  # Assuming no duplicates or NaNs in sample data
 
+    def test_clean_data_near_duplicates(self):
+        dataset = pd.DataFrame({
+            'Source code': [
+                'int main() { char buf[8]; strcpy(buf, argv[1]); return 0; }',
+                'int main() {\n    char dest[16];\n    strcpy(dest, argv[2]); // copy\n    return 0;\n}',
+                'int main() { char buf[8]; strncpy(buf, argv[1], 7); return 0; }',
+                'int main() { char buf[8]; strcpy(buf, argv[1]); return 0; }',
+            ],
+            'Vulnerability type': ['Buffer Overflow', 'Buffer Overflow', 'Buffer Overflow', 'Use After Free']
+        }, index=[10, 11, 12, 13])
+        self.assertEqual(len(clean_data(dataset)), 4)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_path = os.path.join(temp_dir, 'dedup_report.json')
+            cleaned_data = clean_data(dataset, near_duplicates=True, report_path=report_path)
+            with open(report_path) as f:
+                report = json.load(f)
+        self.assertEqual(cleaned_data.index.tolist(), [10, 12, 13])
+        self.assertEqual(report['largest_clusters'], [{'size': 2, 'rows': [10, 11]}])
+
     def test_preprocess_data(self):
         dataset = load_and_inspect_data(self.test_file_path)
         cleaned_data = clean_data(dataset)
@@ -65,6 +108,69 @@ class TestSimplePreprocessing(unittest.TestCase):
         train_and_evaluate_model(model, preprocessed_data)
         # Since we can't easily assert the accuracy, we're just checking that it runs without errors
 
+    def test_train_and_evaluate_model_bucketed(self):
+        dataset = pd.DataFrame({
+            'Source code': [f'int f{i}() {{ return {" + ".join(["x"] * (i + 1))}; }}' for i in range(12)],
+            'Vulnerability type': ['Buffer Overflow', 'SQL Injection', 'Use After Free'] * 4
+        })
+        preprocessed_data, tokenizer = preprocess_data(dataset, pad=False)
+        self.assertNotIn('Code_Tokens_Padded', preprocessed_data.columns)
+        model = build_model(tokenizer, max_length=None, output_dim=len(preprocessed_data['Vulnerability_OHE'][0]))
+        train_and_evaluate_model(model, preprocessed_data, bucketed=True, max_length=8, batch_size=4)
+
+    def test_train_and_evaluate_model_from_feature_store(self):
+        dataset = pd.DataFrame({
+            'Source code': [f'int f{i}() {{ return {" + ".join(["x"] * (i % 9 + 1))}; }}' for i in range(40)],
+            'Vulnerability type': ['Buffer Overflow', 'SQL Injection'] * 20
+        })
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vocabulary_path = os.path.join(temp_dir, 'vocabulary.json')
+            store = build_feature_store(dataset, os.path.join(temp_dir, 'store'), vocabulary_path, rows_per_shard=16)
+            self.assertEqual(store.num_rows, 40)
+            self.assertEqual(store.class_names, ['Buffer Overflow', 'SQL Injection'])
+            self.assertEqual(store.labels().tolist(), [0, 1] * 20)
+            tokenizer = Vocabulary.load(store.vocabulary_path)
+            model = build_model(tokenizer, max_length=None, output_dim=store.num_classes)
+            train_and_evaluate_model_from_shards(model, store.directory, batch_size=8, epochs=1)
+            model = build_model(tokenizer, max_length=None, output_dim=store.num_classes, sparse_labels=True)
+            train_and_evaluate_model_from_shards(model, store.directory, batch_size=8, epochs=1, sparse_labels=True)
+
+    def test_feature_store_rebuild_with_new_label(self):
+        dataset = pd.DataFrame({'Source code': ['int a;', 'int b;'], 'Vulnerability type': ['A', 'A']})
+        with tempfile.TemporaryDirectory() as temp_dir:
+            class_map_path = os.path.join(temp_dir, 'class_map.json')
+            directory = os.path.join(temp_dir, 'store')
+            build_feature_store(dataset, directory, class_map_path=class_map_path)
+            dataset['Vulnerability type'] = ['A', 'B']
+            store = build_feature_store(dataset, directory, class_map_path=class_map_path)
+            self.assertEqual(store.class_names, ['A', 'B'])
+            self.assertEqual(store.labels().tolist(), [0, 1])
+            self.assertEqual(load_or_build_class_map([], class_map_path), ['A', 'B'])
+
+    def test_integer_labels(self):
+        dataset = pd.DataFrame({
+            'Source code': [f'int f{i}() {{ return {" + ".join(["x"] * (i + 1))}; }}' for i in range(12)],
+            'Vulnerability type': ['SQL Injection', 'Buffer Overflow', 'Use After Free'] * 4
+        })
+        with tempfile.TemporaryDirectory() as temp_dir:
+            class_map_path = os.path.join(temp_dir, 'class_map.json')
+            preprocessed_data, tokenizer = preprocess_data(
+                dataset, pad=False, integer_labels=True, class_map_path=class_map_path
+            )
+            self.assertNotIn('Vulnerability_OHE', preprocessed_data.columns)
+            self.assertEqual(preprocessed_data['Vulnerability_Label'].dtype, np.int32)
+            self.assertEqual(preprocessed_data['Vulnerability_Label'].tolist()[:3], [1, 0, 2])
+
+            # The persisted class map is reused, so ids stay stable for a differently ordered dataset.
+            self.assertEqual(load_or_build_class_map(['Use After Free'], class_map_path),
+                             ['Buffer Overflow', 'SQL Injection', 'Use After Free'])
+            with self.assertRaises(KeyError):
+                encode_labels(['Race Condition'], load_or_build_class_map([], class_map_path))
+
+            model = build_model(tokenizer, max_length=None, output_dim=3, sparse_labels=True)
+            self.assertEqual(model.loss, 'sparse_categorical_crossentropy')
+            train_and_evaluate_model(model, preprocessed_data, bucketed=True, max_length=8, batch_size=4)
+
     def test_full_pipeline(self):
         # Test the entire pipeline from loading data to training the model
         dataset = load_and_inspect_data(self.test_file_path)
@@ -2,12 +2,54 @@ import unittest
 from test_simple_preprocessing import TestSimplePreprocessing
 from test_dataset_analyzer import TestDatasetAnalyzer
 from test_data_prep import TestDataPrep
+from test_negative_sampler import TestNegativeSampler
+from test_jsonl_io import TestJsonlIO
+from test_enhancement_cache import TestEnhancementCache
+from test_line_index import TestLineIndex
+from test_bounded_executor import TestBoundedExecutor
+from test_memory_cache import TestFileCache
+from test_dataset_files import TestDatasetFiles
+from test_tokenization import TestTokenization
+from test_bucketing import TestBucketing
+from test_token_shards import TestTokenShards
+from test_feature_store import TestFeatureStore
+from test_micro_batcher import TestMicroBatcher
+from test_inference_service import TestInferenceService
+from test_benchmarks import TestBenchmarks
+from test_prep_metrics import TestPrepMetrics
+from test_profiling import TestProfiling
+from test_json_codec import TestJsonCodec
+from test_cli import TestCli
+from test_near_dedup import TestNearDedup
+from test_annotation_store import TestAnnotationStore
+from test_enhancement_pipeline import TestEnhancementPipeline
 
 def create_test_suite():
     test_suite = unittest.TestSuite()
     test_suite.addTest(unittest.makeSuite(TestSimplePreprocessing))
     test_suite.addTest(unittest.makeSuite(TestDatasetAnalyzer))
     test_suite.addTest(unittest.makeSuite(TestDataPrep))
+    test_suite.addTest(unittest.makeSuite(TestNegativeSampler))
+    test_suite.addTest(unittest.makeSuite(TestJsonlIO))
+    test_suite.addTest(unittest.makeSuite(TestEnhancementCache))
+    test_suite.addTest(unittest.makeSuite(TestLineIndex))
+    test_suite.addTest(unittest.makeSuite(TestBoundedExecutor))
+    test_suite.addTest(unittest.makeSuite(TestFileCache))
+    test_suite.addTest(unittest.makeSuite(TestDatasetFiles))
+    test_suite.addTest(unittest.makeSuite(TestTokenization))
+    test_suite.addTest(unittest.makeSuite(TestBucketing))
+    test_suite.addTest(unittest.makeSuite(TestTokenShards))
+    test_suite.addTest(unittest.makeSuite(TestFeatureStore))
+    test_suite.addTest(unittest.makeSuite(TestMicroBatcher))
+    test_suite.addTest(unittest.makeSuite(TestInferenceService))
+    test_suite.addTest(unittest.makeSuite(TestBenchmarks))
+    test_suite.addTest(unittest.makeSuite(TestPrepMetrics))
+    test_suite.addTest(unittest.makeSuite(TestProfiling))
+    test_suite.addTest(unittest.makeSuite(TestJsonCodec))
+    test_suite.addTest(unittest.makeSuite(TestCli))
+    test_suite.addTest(unittest.makeSuite(TestNearDedup))
+    test_suite.addTest(unittest.makeSuite(TestAnnotationStore))
+    test_suite.addTest(unittest.makeSuite(TestEnhancementPipeline))
     return test_suite
 
 if __name__ == '__main__':
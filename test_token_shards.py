@@ -0,0 +1,59 @@
+import unittest
+import tempfile
+import numpy as np
+from keras.models import Sequential
+from keras.layers import Embedding, LSTM, Dense
+from feature_store import SPLITS, assign_splits, stable_row_hash, write_feature_store
+from token_shards import make_tf_dataset
+
+class TestTokenShards(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.sequences = [rng.integers(1, 30, size=1 + i % 7).astype(np.int32) for i in range(60)]
+        self.hashes = [stable_row_hash(f'program {i}') for i in range(60)]
+        self.store = write_feature_store(self.temp_dir.name, self.sequences, np.arange(60) % 3, self.hashes, rows_per_shard=25)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_stable_hash_and_splits(self):
+        self.assertEqual(stable_row_hash('abc'), stable_row_hash('abc'))
+        self.assertNotEqual(stable_row_hash('abc'), stable_row_hash('abd'))
+        splits = assign_splits(self.hashes)
+        self.assertEqual(splits.tolist(), assign_splits(self.hashes[::-1])[::-1].tolist())
+        self.assertEqual(set(splits.tolist()), {0, 1, 2})
+        self.assertEqual(self.store.splits().tolist(), splits.tolist())
+
+    def test_splits_partition_rows(self):
+        self.assertEqual(len(self.store.shard_names), 3)
+        rows = []
+        for split in SPLITS:
+            for tokens, labels in make_tf_dataset(self.temp_dir.name, split, batch_size=8, seed=1):
+                self.assertEqual(labels.shape[1], 3)
+                for row_tokens in tokens.numpy():
+                    rows.append(tuple(row_tokens[row_tokens > 0]))
+        self.assertEqual(sorted(rows), sorted(tuple(sequence) for sequence in self.sequences))
+
+    def test_sparse_labels(self):
+        labels = []
+        for _, batch_labels in make_tf_dataset(self.temp_dir.name, 'test', batch_size=8, sparse_labels=True):
+            self.assertEqual(batch_labels.shape.rank, 1)
+            labels.extend(batch_labels.numpy().tolist())
+        self.assertTrue(set(labels) <= {0, 1, 2})
+
+    def test_truncation_and_training(self):
+        dataset = make_tf_dataset(self.temp_dir.name, 'train', num_classes=3, batch_size=8, max_length=3, seed=1)
+        for tokens, _ in dataset:
+            self.assertLessEqual(tokens.shape[1], 3)
+        model = Sequential()
+        model.add(Embedding(input_dim=30, output_dim=4, input_length=None))
+        model.add(LSTM(4))
+        model.add(Dense(3, activation='softmax'))
+        model.compile(optimizer='adam', loss='categorical_crossentropy')
+        history = model.fit(dataset, epochs=1, verbose=0)
+        self.assertEqual(len(history.history['loss']), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+from keras.preprocessing.text import Tokenizer
+from tokenization import Vocabulary, load_or_build_vocabulary, text_to_words
+
+class TestTokenization(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.texts = [
+            'int main() { char buf[10]; strcpy(buf, argv[1]); return 0; }',
+            'def hello():\n    print("Hello")',
+            'x = 10\nprint(x)',
+            '',
+            'for (int i = 0; i < n; i++) { buf[i] = argv[1][i]; }',
+        ] * 3
+
+    def test_text_to_words(self):
+        self.assertEqual(text_to_words('Hello, World!\tfoo_bar(x)'), ['hello', 'world', 'foo', 'bar', 'x'])
+
+    def test_matches_keras_tokenizer(self):
+        for num_words in (None, 5):
+            tokenizer = Tokenizer(num_words=num_words)
+            tokenizer.fit_on_texts(self.texts)
+            vocabulary = Vocabulary.build(self.texts, num_words=num_words, workers=2, chunksize=4)
+            self.assertEqual(list(vocabulary.word_index.items()), list(tokenizer.word_index.items()))
+            sequences = vocabulary.encode(self.texts, workers=2, chunksize=4)
+            self.assertEqual([row.tolist() for row in sequences], tokenizer.texts_to_sequences(self.texts))
+
+    def test_ragged_layout(self):
+        sequences = Vocabulary.build(self.texts).encode(self.texts)
+        self.assertEqual(sequences.values.dtype, np.int32)
+        self.assertEqual(len(sequences), len(self.texts))
+        self.assertEqual(sequences.lengths[3], 0)
+        self.assertEqual(sequences.offsets[-1], len(sequences.values))
+        self.assertTrue(np.shares_memory(sequences[0], sequences.values))
+        empty = Vocabulary.build([]).encode([])
+        self.assertEqual(len(empty), 0)
+
+    def test_save_and_reload(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'vocabulary.json')
+            built = load_or_build_vocabulary(self.texts, path, num_words=100)
+            self.assertTrue(os.path.exists(path))
+            with mock.patch.object(Vocabulary, 'build') as build:
+                loaded = load_or_build_vocabulary(self.texts, path, num_words=100)
+                build.assert_not_called()
+            self.assertEqual(loaded.word_index, built.word_index)
+            self.assertEqual(loaded.num_words, 100)
+
+            # A different corpus or num_words rebuilds the saved vocabulary.
+            rebuilt = load_or_build_vocabulary(['completely different words'], path, num_words=100)
+            self.assertEqual(list(rebuilt.word_index), ['completely', 'different', 'words'])
+            self.assertEqual(Vocabulary.load(path).word_index, rebuilt.word_index)
+            self.assertEqual(load_or_build_vocabulary(['completely different words'], path).num_words, None)
+
+if __name__ == '__main__':
+    unittest.main()
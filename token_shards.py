@@ -0,0 +1,63 @@
+import numpy as np
+import tensorflow as tf
+
+from feature_store import SPLITS, FeatureStore
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _shard_rows(directory, shard_name, split):
+    shard = FeatureStore(_decode(directory)).shard(_decode(shard_name))
+    values, offsets, labels = shard['values'], shard['offsets'], shard['labels']
+    for row in np.flatnonzero(shard['splits'] == SPLITS.index(_decode(split))):
+        yield values[offsets[row]:offsets[row + 1]], labels[row]
+
+
+def make_tf_dataset(
+    directory,
+    split,
+    num_classes=None,
+    batch_size=64,
+    max_length=None,
+    shuffle_buffer=10000,
+    seed=None,
+    sparse_labels=False
+):
+    """
+    Stream one split of the feature store in ``directory`` as a tf.data pipeline.
+
+    Memory-mapped shards are read in parallel (interleave), labels are one-hot encoded
+    and tokens truncated in a parallel map, training rows go through a shuffle buffer,
+    and batches are padded to their own longest row and prefetched so the CPU keeps
+    preparing input while the model trains. ``num_classes`` defaults to the manifest's.
+    With ``sparse_labels`` the int class ids are passed through without one-hot encoding.
+    """
+    store = FeatureStore(directory)
+    num_classes = store.num_classes if num_classes is None else num_classes
+    shard_names = store.shard_names
+    training = split == 'train'
+    if training:
+        np.random.default_rng(seed).shuffle(shard_names)
+    signature = (tf.TensorSpec(shape=(None,), dtype=tf.int32), tf.TensorSpec(shape=(), dtype=tf.int32))
+
+    def read_shard(shard_name):
+        return tf.data.Dataset.from_generator(
+            _shard_rows, args=(directory, shard_name, split), output_signature=signature
+        )
+
+    def prepare(tokens, label):
+        if max_length is not None:
+            tokens = tokens[:max_length]
+        return tokens, label if sparse_labels else tf.one_hot(label, num_classes)
+
+    dataset = tf.data.Dataset.from_tensor_slices(tf.constant(shard_names, dtype=tf.string))
+    dataset = dataset.interleave(
+        read_shard, cycle_length=tf.data.AUTOTUNE, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training
+    )
+    dataset = dataset.map(prepare, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    if training:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.padded_batch(batch_size, padded_shapes=([None], [] if sparse_labels else [num_classes]))
+    return dataset.prefetch(tf.data.AUTOTUNE)
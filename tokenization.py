@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Same defaults as keras.preprocessing.text.Tokenizer, so vocabularies and sequences match.
+KERAS_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+_TRANSLATE_FILTERS = str.maketrans(KERAS_FILTERS, ' ' * len(KERAS_FILTERS))
+TOKENIZE_CHUNKSIZE = 2000
+
+
+def text_to_words(text):
+    """
+    Split text into lower-cased words exactly like keras' text_to_word_sequence.
+    """
+    return [word for word in text.lower().translate(_TRANSLATE_FILTERS).split(' ') if word]
+
+
+def _count_words(texts):
+    counts = Counter()
+    for text in texts:
+        counts.update(text_to_words(text))
+    return counts
+
+
+def corpus_fingerprint(texts):
+    """
+    Content hash of a sequence of texts (order included), stored with a saved vocabulary
+    so it is only reused for the corpus it was built from.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        data = text.encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _chunks(texts, chunksize):
+    return [texts[start:start + chunksize] for start in range(0, len(texts), chunksize)]
+
+
+def _map_chunks(fn, texts, workers, chunksize, initializer=None, initargs=()):
+    chunks = _chunks(list(texts), chunksize)
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+            return list(executor.map(fn, chunks))
+    if initializer is not None:
+        initializer(*initargs)
+    return [fn(chunk) for chunk in chunks]
+
+
+# The vocabulary is shipped to each worker once through the pool initializer rather
+# than pickled with every chunk.
+_worker_vocabulary = None
+
+
+def _set_worker_vocabulary(word_index, num_words):
+    global _worker_vocabulary
+    _worker_vocabulary = (word_index, num_words)
+
+
+def _encode_chunk(texts):
+    word_index, limit = _worker_vocabulary
+    values = []
+    lengths = []
+    for text in texts:
+        ids = [word_index[word] for word in text_to_words(text) if word in word_index]
+        if limit:
+            ids = [i for i in ids if i < limit]
+        values.extend(ids)
+        lengths.append(len(ids))
+    return np.asarray(values, dtype=np.int32), np.asarray(lengths, dtype=np.int64)
+
+
+class RaggedSequences:
+    """
+    Variable-length token sequences stored as one flat int32 array plus row offsets.
+
+    Row ``i`` is ``values[offsets[i]:offsets[i + 1]]``; indexing returns a view, so no
+    per-row Python lists are created.
+    """
+
+    def __init__(self, values, offsets):
+        self.values = np.asarray(values, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_lengths(cls, values, lengths):
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(values, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+
+class Vocabulary:
+    """
+    Word index compatible with keras' Tokenizer (``word_index``, ``num_words``) that can
+    be built in parallel, saved to disk and reloaded instead of being refitted.
+    """
+
+    def __init__(self, word_index, num_words=None, fingerprint=None):
+        self.word_index = word_index
+        self.num_words = num_words
+        # corpus_fingerprint of the texts the vocabulary was built from, if known.
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, texts, num_words=None, workers=1, chunksize=TOKENIZE_CHUNKSIZE):
+        """
+        Count words across a process pool and rank them like Tokenizer.fit_on_texts:
+        by descending count, ties broken by first occurrence.
+        """
+        counts = Counter()
+        for chunk_counts in _map_chunks(_count_words, texts, workers, chunksize):
+            counts.update(chunk_counts)
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return cls({word: index for index, (word, _) in enumerate(ranked, start=1)}, num_words)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls(data['word_index'], data['num_words'], data.get('fingerprint'))
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'num_words': self.num_words, 'fingerprint': self.fingerprint, 'word_index': self.word_index},
+                file, separators=(',', ':')
+            )
+
+    def encode(self, texts, workers=1, chunksize=TOKENIZE_CHUNKSIZE):
+        """
+        Encode texts into a RaggedSequences, matching Tokenizer.texts_to_sequences.
+        """
+        results = _map_chunks(
+            _encode_chunk, texts, workers, chunksize,
+            initializer=_set_worker_vocabulary, initargs=(self.word_index, self.num_words)
+        )
+        if not results:
+            return RaggedSequences(np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int64))
+        values = np.concatenate([values for values, _ in results])
+        lengths = np.concatenate([lengths for _, lengths in results])
+        return RaggedSequences.from_lengths(values, lengths)
+
+
+def load_or_build_vocabulary(texts, vocabulary_path=None, num_words=None, workers=1):
+    """
+    Load the vocabulary saved at ``vocabulary_path``, or build it and save it there.
+
+    A saved vocabulary is only reused when it was built from the same texts with the
+    same ``num_words``; otherwise it is rebuilt, so a changed corpus never gets encoded
+    with a stale word index.
+    """
+    texts = list(texts)
+    fingerprint = corpus_fingerprint(texts)
+    if vocabulary_path is not None and os.path.exists(vocabulary_path):
+        vocabulary = Vocabulary.load(vocabulary_path)
+        if vocabulary.num_words == num_words and vocabulary.fingerprint == fingerprint:
+            return vocabulary
+    vocabulary = Vocabulary.build(texts, num_words=num_words, workers=workers)
+    vocabulary.fingerprint = fingerprint
+    if vocabulary_path is not None:
+        vocabulary.save(vocabulary_path)
+    return vocabulary